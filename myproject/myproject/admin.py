@@ -2,13 +2,15 @@
 Custom admin site configuration to restrict access to superusers only.
 This ensures that sysadmin users (who have is_staff=True) cannot access Django admin.
 """
+from django.contrib import admin
 from django.contrib.admin import AdminSite, ModelAdmin
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 
 # Import models from public and sysadmin apps
-from public.models import UserProfile, Appointment
-from sysadmin.models import Timeslot, Notification
+from public.models import UserProfile, Appointment, StudentNotification, OutboxEmail
+from sysadmin.models import Timeslot, DayAvailability, WeeklyAvailability, CounselorProfile, ProfileImage, ProfileImageVariant, Notification
+from sysadmin.utils import invalidate_counselor_directory
 
 
 class SuperuserOnlyAdminSite(AdminSite):
@@ -32,8 +34,33 @@ class SuperuserOnlyAdminSite(AdminSite):
 # Create custom admin site instance
 admin_site = SuperuserOnlyAdminSite(name='admin')
 
+class AppUserAdmin(UserAdmin):
+    """UserAdmin that keeps counselor search and the cached counselor lists in step with user edits."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        profile = CounselorProfile.objects.filter(user=obj).first()
+        if profile is None:
+            return
+        # Names are part of search_document, and is_active/is_staff decide who is listed
+        profile.save(update_fields=['search_document'])
+        invalidate_counselor_directory(profile.assigned_college)
+
+    def delete_model(self, request, obj):
+        college = CounselorProfile.objects.filter(user=obj).values_list('assigned_college', flat=True).first()
+        super().delete_model(request, obj)
+        if college is not None:
+            invalidate_counselor_directory(college)
+
+    def delete_queryset(self, request, queryset):
+        colleges = list(CounselorProfile.objects.filter(user__in=queryset).values_list('assigned_college', flat=True))
+        super().delete_queryset(request, queryset)
+        if colleges:
+            invalidate_counselor_directory(*colleges)
+
+
 # Register default admin models with our custom site
-admin_site.register(User, UserAdmin)
+admin_site.register(User, AppUserAdmin)
 admin_site.register(Group, GroupAdmin)
 
 
@@ -57,16 +84,96 @@ class AppointmentAdmin(ModelAdmin):
     date_hierarchy = 'created_at'
 
 
+class StudentNotificationAdmin(ModelAdmin):
+    list_display = ('id', 'student', 'title', 'notification_type', 'is_read', 'created_at', 'appointment')
+    list_filter = ('notification_type', 'is_read', 'created_at')
+    search_fields = ('student__username', 'student__email', 'student__first_name', 'student__last_name',
+                     'title', 'message')
+    readonly_fields = ('created_at',)
+    ordering = ('-id',)
+    date_hierarchy = 'created_at'
+    list_editable = ('is_read',)
+
+
+class OutboxEmailAdmin(ModelAdmin):
+    list_display = ('id', 'to_email', 'subject', 'kind', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('to_email', 'to_name', 'subject', 'provider_message_id')
+    readonly_fields = ('kind', 'appointment', 'from_email', 'from_name', 'to_email', 'to_name', 'subject', 'text_body',
+                       'html_body', 'status', 'attempts', 'next_attempt_at', 'last_error', 'provider_message_id',
+                       'created_at', 'sent_at')
+    ordering = ('-id',)
+    date_hierarchy = 'created_at'
+    actions = ['retry_emails']
+
+    @admin.action(description='Send selected failed emails again')
+    def retry_emails(self, request, queryset):
+        from django.utils import timezone
+        count = queryset.filter(status='failed').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{count} email(s) queued again.')
+
+
 # Admin classes for Sysadmin app models
 class TimeslotAdmin(ModelAdmin):
-    list_display = ('id', 'user', 'date', 'start_time', 'available', 'created_at')
-    list_filter = ('available', 'date', 'created_at', 'user')
+    list_display = ('id', 'user', 'date', 'start_time', 'created_at')
+    list_filter = ('date', 'created_at', 'user')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-date', 'start_time')
     date_hierarchy = 'date'
 
 
+class DayAvailabilityAdmin(ModelAdmin):
+    list_display = ('id', 'user', 'date', 'slots', 'overridden', 'updated_at')
+    list_filter = ('date', 'overridden', 'user')
+    search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
+    readonly_fields = ('updated_at',)
+    ordering = ('-date',)
+    date_hierarchy = 'date'
+
+
+class WeeklyAvailabilityAdmin(ModelAdmin):
+    list_display = ('id', 'user', 'weekday', 'slots', 'updated_at')
+    list_filter = ('weekday', 'user')
+    search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
+    readonly_fields = ('updated_at',)
+    ordering = ('user', 'weekday')
+
+
+class CounselorProfileAdmin(ModelAdmin):
+    list_display = ('user', 'middle_initial', 'assigned_college', 'title', 'email_digest', 'updated_at')
+    list_filter = ('assigned_college', 'email_digest')
+    search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'assigned_college', 'title')
+    readonly_fields = ('college_key', 'created_at', 'updated_at')
+    ordering = ('user__last_name', 'user__first_name')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Match the indexed search document instead of icontains scans over joined columns
+        for term in search_term.lower().split():
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset, False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_counselor_directory(form.initial.get('assigned_college'), obj.assigned_college)
+
+
+class ProfileImageAdmin(ModelAdmin):
+    list_display = ('user', 'content_type', 'size', 'updated_at')
+    list_filter = ('content_type',)
+    search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
+    readonly_fields = ('content_type', 'size', 'content_hash', 'updated_at')
+    ordering = ('-updated_at',)
+
+
+class ProfileImageVariantAdmin(ModelAdmin):
+    list_display = ('image', 'size_name', 'content_type', 'width', 'height', 'byte_size')
+    list_filter = ('size_name', 'content_type')
+    search_fields = ('image__user__username', 'image__user__email')
+    exclude = ('data',)
+    readonly_fields = ('image', 'size_name', 'content_type', 'width', 'height', 'byte_size', 'file')
+
+
 class NotificationAdmin(ModelAdmin):
     list_display = ('id', 'counselor', 'title', 'notification_type', 'is_read', 'created_at', 'appointment')
     list_filter = ('notification_type', 'is_read', 'created_at', 'counselor')
@@ -81,6 +188,13 @@ class NotificationAdmin(ModelAdmin):
 # Register all models with the admin site
 admin_site.register(UserProfile, UserProfileAdmin)
 admin_site.register(Appointment, AppointmentAdmin)
+admin_site.register(StudentNotification, StudentNotificationAdmin)
+admin_site.register(OutboxEmail, OutboxEmailAdmin)
 admin_site.register(Timeslot, TimeslotAdmin)
+admin_site.register(DayAvailability, DayAvailabilityAdmin)
+admin_site.register(WeeklyAvailability, WeeklyAvailabilityAdmin)
+admin_site.register(CounselorProfile, CounselorProfileAdmin)
+admin_site.register(ProfileImage, ProfileImageAdmin)
+admin_site.register(ProfileImageVariant, ProfileImageVariantAdmin)
 admin_site.register(Notification, NotificationAdmin)
 
@@ -97,11 +97,18 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are closed at the end of each request by default. The web process
+# runs under ASGI (see start.sh), where every request runs in a new thread-sensitive
+# context, so a persistent connection would not be reused by the next request.
+# It would only pile up idle connections, including ones held by open availability
+# streams. Pooling (OPTIONS={'pool': True}) needs psycopg 3, not psycopg2.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '0'))
+
 # Support Render's DATABASE_URL format, fallback to individual env vars
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=DB_CONN_MAX_AGE)
     }
 else:
     DATABASES = {
@@ -112,6 +119,26 @@ else:
             'PASSWORD': os.environ.get('DB_PASSWORD', 'sysadmin'),
             'HOST': os.environ.get('DB_HOST', 'localhost'),
             'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+
+# Cache
+# Each server process keeps its own in-memory cache by default. Set REDIS_URL
+# (requires the redis package) to share cached data, and its invalidation,
+# between processes.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
@@ -145,6 +172,18 @@ AUTH_PASSWORD_VALIDATORS = [
 # Get your API keys from https://app.mailjet.com/account/apikeys
 MAILJET_API_KEY = os.environ.get('MAILJET_API_KEY', '')
 MAILJET_API_SECRET = os.environ.get('MAILJET_API_SECRET', '')
+# Sending client (public/mailjet.py): timeouts in seconds, and the circuit
+# breaker that stops calling Mailjet for a while after repeated failures
+MAILJET_API_URL = os.environ.get('MAILJET_API_URL', 'https://api.mailjet.com/v3.1/send')
+MAILJET_CONNECT_TIMEOUT = float(os.environ.get('MAILJET_CONNECT_TIMEOUT', '5'))
+MAILJET_READ_TIMEOUT = float(os.environ.get('MAILJET_READ_TIMEOUT', '30'))
+MAILJET_BREAKER_THRESHOLD = 5
+MAILJET_BREAKER_RESET_SECONDS = 60
+# send_outbox_emails: sender threads and claimed batches that may wait for one
+EMAIL_SENDER_THREADS = int(os.environ.get('EMAIL_SENDER_THREADS', '4'))
+EMAIL_SENDER_BACKLOG = int(os.environ.get('EMAIL_SENDER_BACKLOG', '8'))
+# Local hour at which daily counselor notification digests are sent (public/digests.py)
+COUNSELOR_DIGEST_HOUR = int(os.environ.get('COUNSELOR_DIGEST_HOUR', '7'))
 DEFAULT_FROM_EMAIL = 'CHMSU Guidance Connect <powerpuffgirls6112@gmail.com>'
 ADMIN_EMAIL = 'powerpuffgirls6112@gmail.com'
 FROM_EMAIL_ADDRESS = 'powerpuffgirls6112@gmail.com'  # Must be verified in Mailjet
@@ -204,6 +243,47 @@ MEDIA_ROOT = BASE_DIR / 'sysadmin' / 'media'
 # Note: On Render free tier, media files are ephemeral and will be lost on redeploy
 # Consider using cloud storage for production
 
+# Uploads above this size are spooled to a temporary file instead of memory,
+# so a request holds at most this much of an upload in RAM
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Profile picture storage (see sysadmin/storage.py)
+# Pictures are kept in the database unless AVATAR_ROOT points at a persistent
+# disk or AVATAR_S3_BUCKET (requires django-storages and boto3) names an
+# S3-compatible object store: on Render the app's own disk is wiped on every
+# redeploy. Run move_avatars_to_storage after setting either.
+AVATAR_ROOT = os.environ.get('AVATAR_ROOT', '')
+AVATAR_S3_BUCKET = os.environ.get('AVATAR_S3_BUCKET', '')
+AVATAR_STORAGE_ENABLED = bool(AVATAR_ROOT or AVATAR_S3_BUCKET)
+if AVATAR_S3_BUCKET:
+    AVATAR_STORAGE = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': AVATAR_S3_BUCKET,
+            'endpoint_url': os.environ.get('AVATAR_S3_ENDPOINT_URL') or None,
+            'access_key': os.environ.get('AVATAR_S3_ACCESS_KEY', ''),
+            'secret_key': os.environ.get('AVATAR_S3_SECRET_KEY', ''),
+            'location': 'avatars',
+            'file_overwrite': False,
+            'querystring_auth': True,
+            'querystring_expire': 3600,
+        },
+    }
+else:
+    AVATAR_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': AVATAR_ROOT or str(MEDIA_ROOT / 'avatars'),
+            'base_url': MEDIA_URL + 'avatars/',
+        },
+    }
+# When a reverse proxy serves AVATAR_ROOT under an internal location (nginx
+# "internal;"), set this to that location so the app only sends an
+# X-Accel-Redirect header and the proxy sends the file. In production use this
+# or AVATAR_S3_BUCKET; otherwise the app streams every picture itself
+# (`manage.py check --deploy` warns about it).
+AVATAR_ACCEL_REDIRECT_PREFIX = os.environ.get('AVATAR_ACCEL_REDIRECT_PREFIX', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -242,7 +322,7 @@ JAZZMIN_SETTINGS = {
     "copyright": "CHMSU Guidance Connect",
     
     # The model admin to search from the search bar, search bar omitted if excluded
-    "search_model": ["auth.User", "public.UserProfile"],
+    "search_model": ["auth.User", "public.UserProfile", "sysadmin.CounselorProfile"],
     
     # Field name on user model that contains the Avatar Image
     "user_avatar": None,
@@ -0,0 +1,143 @@
+"""
+Counselor notification digests.
+
+Counselors who opt in (CounselorProfile.email_digest 'daily' or 'hourly')
+get one email listing their unread Notification rows since the previous
+digest, instead of having to check the dashboard. Daily digests go out at
+COUNSELOR_DIGEST_HOUR (local time), hourly ones on the hour.
+
+queue_counselor_digests() finds every due counselor's notifications with a
+single query across all counselors and writes one OutboxEmail per counselor.
+In the same transaction it moves digest_sent_at of every due counselor, with
+or without notifications, to the scheduled time. A digest only covers
+notifications created up to its scheduled time, so the schedule decides when
+mail goes out, not when a notification happens to arrive. The outbox worker
+calls it every DIGEST_CHECK_SECONDS; `manage.py queue_counselor_digests` runs
+it once, e.g. from cron. Running it again before the next scheduled time
+queues nothing.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.html import escape
+
+from sysadmin.models import CounselorProfile, Notification
+from .models import OutboxEmail
+
+# How often the outbox worker looks for due digests
+DIGEST_CHECK_SECONDS = 60
+# Notifications listed in full in one digest; the rest are only counted
+DIGEST_MAX_ITEMS = 50
+DIGEST_FREQUENCIES = ('hourly', 'daily')
+
+
+def digest_scheduled_at(frequency, now=None):
+    """The latest time at or before now when digests of this frequency were due."""
+    local = timezone.localtime(now or timezone.now())
+    if frequency == 'hourly':
+        return local.replace(minute=0, second=0, microsecond=0)
+    scheduled = local.replace(hour=getattr(settings, 'COUNSELOR_DIGEST_HOUR', 7), minute=0, second=0, microsecond=0)
+    if scheduled > local:
+        scheduled -= timedelta(days=1)
+    return scheduled
+
+
+def _due(frequency, now, prefix=''):
+    """Q matching counselor profiles whose digest of this frequency is due."""
+    return Q(**{f'{prefix}email_digest': frequency}) & (
+        Q(**{f'{prefix}digest_sent_at__isnull': True})
+        | Q(**{f'{prefix}digest_sent_at__lt': digest_scheduled_at(frequency, now)})
+    )
+
+
+def due_notifications(now=None):
+    """
+    Unread notifications to put in digests now, across all counselors, ordered
+    by counselor. A counselor is due when their last digest is older than the
+    latest scheduled time for their frequency; the digest covers notifications
+    after the last one up to that scheduled time.
+    """
+    now = now or timezone.now()
+    profile = 'counselor__counselor_profile__'
+    due = Q()
+    for frequency in DIGEST_FREQUENCIES:
+        due |= _due(frequency, now, profile) & Q(created_at__lte=digest_scheduled_at(frequency, now))
+    notifications = Notification.objects.filter(
+        due,
+        Q(**{f'{profile}digest_sent_at__isnull': True}) | Q(created_at__gt=F(f'{profile}digest_sent_at')),
+        is_read=False,
+        counselor__is_active=True,
+    ).exclude(counselor__email='').select_related(
+        'counselor', 'counselor__counselor_profile',
+    ).order_by('counselor_id', 'created_at', 'id')
+    if connection.features.has_select_for_update_skip_locked and connection.features.has_select_for_update_of:
+        # A second worker skips counselors whose digest is being queued right now
+        notifications = notifications.select_for_update(skip_locked=True, of=('counselor__counselor_profile',))
+    return notifications
+
+
+def build_digest_email(counselor, notifications):
+    """Return an unsaved OutboxEmail listing the counselor's notifications."""
+    profile = counselor.counselor_profile
+    counselor_name = counselor.get_full_name() or counselor.username or 'Counselor'
+    count = len(notifications)
+
+    items = []
+    for notification in notifications[:DIGEST_MAX_ITEMS]:
+        created = timezone.localtime(notification.created_at).strftime('%B %d, %I:%M %p')
+        details = '\n'.join(f'  {line}' for line in notification.message.splitlines() if line.strip())
+        items.append(f'- {notification.title} ({created})\n{details}')
+    if count > DIGEST_MAX_ITEMS:
+        items.append(f'...and {count - DIGEST_MAX_ITEMS} more.')
+
+    message = f"""Hello {counselor_name},
+
+Your {profile.email_digest} summary has {count} unread notification{'s' if count != 1 else ''}:
+
+{chr(10).join(items)}
+
+Sign in to your dashboard to review your appointments.
+You can change or turn off these summaries on your profile page.
+
+Thank you,
+CHMSU Guidance Connect""".strip()
+
+    return OutboxEmail(
+        kind='counselor_digest',
+        from_email=getattr(settings, 'FROM_EMAIL_ADDRESS', 'powerpuffgirls6112@gmail.com'),
+        from_name=getattr(settings, 'FROM_EMAIL_NAME', 'CHMSU Guidance Connect'),
+        to_email=counselor.email,
+        to_name=counselor_name,
+        subject=f'{count} new notification{"s" if count != 1 else ""} - CHMSU Guidance Connect',
+        text_body=message,
+        html_body=escape(message).replace('\n', '<br>'),
+    )
+
+
+def queue_counselor_digests(now=None):
+    """
+    Queue a digest for every due counselor with unread notifications and move
+    every due counselor on to the current scheduled time. Returns the number queued.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = [
+            build_digest_email(notifications[0].counselor, notifications)
+            for notifications in (
+                list(group) for counselor_id, group in groupby(due_notifications(now), key=lambda n: n.counselor_id)
+            )
+        ]
+        OutboxEmail.objects.bulk_create(emails)
+        # Also counselors without notifications, so a quiet period does not make the next one send early
+        for frequency in DIGEST_FREQUENCIES:
+            CounselorProfile.objects.filter(_due(frequency, now)).update(
+                digest_sent_at=digest_scheduled_at(frequency, now),
+            )
+    if not emails:
+        return 0
+    print(f"[DIGEST] Queued notification digests for {len(emails)} counselor(s)")
+    return len(emails)
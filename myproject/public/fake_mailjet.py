@@ -0,0 +1,150 @@
+"""
+Local stand-in for Mailjet's send API v3.1, for load tests and development.
+
+Point the client at it with MAILJET_API_URL=http://127.0.0.1:<port>/v3.1/send
+(any API key and secret are accepted). Nothing is delivered: every message
+gets a made-up MessageID, except that a message to an address without an @
+is rejected like Mailjet rejects an invalid one (status 400 with an error for
+that message only). The server can be made slow (latency, jitter),
+flaky (a share of calls answered 500) and rate limited (429 once more than
+rate_limit calls arrive within one second), like the real API under load.
+
+Run it on its own with `manage.py fake_mailjet`; benchmark_email starts one
+in-process.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEND_PATH = '/v3.1/send'
+
+
+class FakeMailjetHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        server.record_call(self.client_address)
+
+        if self.path.rstrip('/') != SEND_PATH:
+            return self.reply(404, {'ErrorMessage': 'Not found'})
+        if not self.headers.get('Authorization', '').startswith('Basic '):
+            return self.reply(401, {'ErrorMessage': 'API key authentication/authorization failure'})
+        if server.rate_limited():
+            server.count('rate_limited')
+            return self.reply(429, {'ErrorMessage': 'Too many requests'})
+
+        try:
+            messages = json.loads(body)['Messages']
+        except (ValueError, KeyError, TypeError):
+            return self.reply(400, {'ErrorMessage': 'Invalid JSON body'})
+        if not isinstance(messages, list) or not 1 <= len(messages) <= 50:
+            return self.reply(400, {'ErrorMessage': 'Messages must hold between 1 and 50 messages'})
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            server.count('errors')
+            return self.reply(500, {'ErrorMessage': 'Internal server error'})
+
+        results = []
+        for message in messages:
+            recipients = message.get('To') or [{}]
+            invalid = [to.get('Email', '') for to in recipients if '@' not in to.get('Email', '')]
+            if invalid:
+                results.append({
+                    'Status': 'error',
+                    'CustomID': message.get('CustomID', ''),
+                    'Errors': [{'ErrorCode': 'mj-0013', 'StatusCode': 400,
+                                'ErrorMessage': f'"{email}" is an invalid email address.'} for email in invalid],
+                })
+                continue
+            message_id = next(server.message_ids)
+            results.append({
+                'Status': 'success',
+                'CustomID': message.get('CustomID', ''),
+                'To': [{'Email': to.get('Email', ''), 'MessageID': message_id, 'MessageUUID': f'fake-{message_id}'}
+                       for to in recipients],
+            })
+        server.count('messages', len(messages))
+        self.reply(400 if any(result['Status'] == 'error' for result in results) else 200, {'Messages': results})
+
+    def reply(self, status, data):
+        out = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class FakeMailjetServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0,
+                 verbose=False):
+        super().__init__((host, port), FakeMailjetHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.verbose = verbose
+        self.message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._recent_calls = deque()
+        self._connections = set()
+        self.stats = {'calls': 0, 'messages': 0, 'errors': 0, 'rate_limited': 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{SEND_PATH}'
+
+    @property
+    def connections(self):
+        """Distinct client connections seen so far."""
+        return len(self._connections)
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def record_call(self, client_address):
+        with self._lock:
+            self.stats['calls'] += 1
+            self._connections.add(client_address)
+
+    def rate_limited(self):
+        """Whether this call goes over rate_limit calls in the last second."""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent_calls and now - self._recent_calls[0] >= 1:
+                self._recent_calls.popleft()
+            if len(self._recent_calls) >= self.rate_limit:
+                return True
+            self._recent_calls.append(now)
+            return False
+
+    def start(self):
+        """Serve on a background thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-mailjet', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,220 @@
+"""
+Sending the email outbox.
+
+Requests never talk to Mailjet. They write OutboxEmail rows in the same
+transaction as the change being reported (see queue_appointment_email in
+public/utils.py), and `manage.py send_outbox_emails` sends them. Each
+batch claims up to MAX_BATCH due rows, sends them as the Messages of one
+Mailjet v3.1 call and records every message's outcome.
+
+Calls go through the process-wide client in public/mailjet.py (pooled
+session, timeouts, circuit breaker). If the call as a whole fails (network
+error, timeout, 5xx, 429, bad credentials) the batch is retried with
+exponential backoff; while the circuit is open nothing is claimed. A message
+Mailjet rejects is marked failed. Delivery is at least once: a worker that dies after Mailjet
+accepted a batch but before recording it sends that batch again once the
+claim expires.
+
+The worker sends with a SenderPool: a fixed number of threads and a bounded
+backlog of claimed batches. A batch is only claimed once the pool has room
+for it, so when sending falls behind, emails wait in the outbox table rather
+than in memory, and threads and memory stay flat however many are queued.
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .mailjet import CircuitOpen, MailjetUnavailable, circuit_open, get_client
+from .models import OutboxEmail
+
+# Mailjet's send API v3.1 takes at most 50 messages per call
+MAX_BATCH = 50
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# A claimed row not resolved within this time is claimed again (the worker died mid-send)
+CLAIM_SECONDS = 300
+
+
+def retry_delay(attempts):
+    """Backoff before the next try after the given number of attempts, with jitter."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(limit=MAX_BATCH):
+    """
+    Mark up to limit due emails as sending and return them. On PostgreSQL
+    locked rows are skipped, so several workers get disjoint batches.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(
+            status__in=['pending', 'sending'],
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        emails = list(due[:limit])
+        if not emails:
+            return []
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status='sending',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS),
+        )
+    for email in emails:
+        email.status = 'sending'
+        email.attempts += 1
+    return emails
+
+
+def build_message(email):
+    """Mailjet v3.1 message for an OutboxEmail."""
+    message = {
+        'From': {'Email': email.from_email, 'Name': email.from_name},
+        'To': [{'Email': email.to_email, 'Name': email.to_name}],
+        'Subject': email.subject,
+        'TextPart': email.text_body,
+        'CustomID': f'outbox-{email.id}',
+    }
+    if email.html_body:
+        message['HTMLPart'] = email.html_body
+    return message
+
+
+def post_messages(messages):
+    """
+    Send messages in one Mailjet v3.1 call and return Mailjet's result for
+    each, in order. Raises MailjetUnavailable if the call itself failed.
+    """
+    return get_client().send(messages)
+
+
+def _retry_or_fail(email, error, now):
+    email.last_error = error[:2000]
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+
+def send_batch(emails):
+    """Send claimed emails in one call and save each one's outcome. Returns counts by outcome."""
+    try:
+        results = post_messages([build_message(email) for email in emails])
+    except CircuitOpen as e:
+        # Never reached Mailjet, so the attempt does not count
+        print(f"[OUTBOX] {e}; {len(emails)} email(s) deferred")
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status='pending',
+            attempts=F('attempts') - 1,
+            next_attempt_at=timezone.now() + timedelta(seconds=e.retry_in),
+        )
+        return {'sent': 0, 'retry': len(emails), 'failed': 0}
+    except MailjetUnavailable as e:
+        print(f"[OUTBOX] Send call failed for {len(emails)} email(s): {e}")
+        results = None
+        error = str(e)
+
+    now = timezone.now()
+    counts = {'sent': 0, 'retry': 0, 'failed': 0}
+    for index, email in enumerate(emails):
+        result = results[index] if results is not None else None
+        if result is not None and result.get('Status') == 'success':
+            to = (result.get('To') or [{}])[0]
+            email.status = 'sent'
+            email.sent_at = now
+            email.provider_message_id = str(to.get('MessageID') or to.get('MessageUUID') or '')
+            email.last_error = ''
+        elif result is None:
+            _retry_or_fail(email, error, now)
+        else:
+            errors = result.get('Errors') or []
+            message_error = '; '.join(
+                f"{item.get('ErrorCode', '')} {item.get('ErrorMessage', '')}".strip() for item in errors
+            ) or str(result)
+            if any(int(item.get('StatusCode') or 0) >= 500 for item in errors):
+                _retry_or_fail(email, message_error, now)
+            else:
+                # Mailjet rejected this message (bad address, invalid content); retrying will not help
+                email.status = 'failed'
+                email.last_error = message_error[:2000]
+        counts['retry' if email.status == 'pending' else email.status] += 1
+
+    OutboxEmail.objects.bulk_update(
+        emails, ['status', 'sent_at', 'provider_message_id', 'last_error', 'next_attempt_at'],
+    )
+    return counts
+
+
+def process_outbox(batch_size=MAX_BATCH):
+    """
+    Claim and send one batch. Returns counts by outcome, or None if nothing
+    was due or Mailjet's circuit is open (due emails then stay queued).
+    """
+    if circuit_open():
+        return None
+    emails = claim_batch(min(batch_size, MAX_BATCH))
+    if not emails:
+        return None
+    return send_batch(emails)
+
+
+class SenderPool:
+    """
+    Sends claimed batches on a fixed number of threads. At most
+    threads + backlog batches are held at once; reserve() a slot before
+    claiming a batch, then submit() it (or release() if nothing was due).
+    """
+
+    def __init__(self, threads=4, backlog=8):
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='outbox-sender')
+        self._slots = threading.BoundedSemaphore(threads + backlog)
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'sent': 0, 'retry': 0, 'failed': 0, 'errors': 0, 'pool_full': 0}
+
+    def reserve(self, timeout):
+        """Wait up to timeout seconds for room for one batch. False (and counted) if the pool stayed full."""
+        if self._slots.acquire(timeout=timeout):
+            return True
+        with self._lock:
+            self.stats['pool_full'] += 1
+        return False
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, emails):
+        """Send a claimed batch on a pool thread; its slot is freed when it finishes."""
+        future = self._executor.submit(self._send, emails)
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def _send(self, emails):
+        try:
+            counts = send_batch(emails)
+        except Exception as e:
+            # Rows stay claimed and are sent again once the claim expires
+            print(f"[OUTBOX] Sending {len(emails)} email(s) failed: {type(e).__name__}: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return None
+        finally:
+            close_old_connections()
+        with self._lock:
+            self.stats['batches'] += 1
+            for outcome, count in counts.items():
+                self.stats[outcome] += count
+        return counts
+
+    def shutdown(self):
+        """Finish every batch already claimed, then stop the threads."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,184 @@
+"""
+Process-wide Mailjet client.
+
+One client per process holds a requests session with a connection pool, so
+consecutive sends reuse kept-alive TLS connections instead of a new handshake
+per call. Every call has connect and read timeouts (MAILJET_CONNECT_TIMEOUT,
+MAILJET_READ_TIMEOUT).
+
+A circuit breaker guards the API. After MAILJET_BREAKER_THRESHOLD failed
+calls in a row it opens. While it is open, sends fail at once with
+CircuitOpen and the outbox worker leaves due emails queued. After
+MAILJET_BREAKER_RESET_SECONDS one trial call is let through; success closes
+the circuit, failure opens it again.
+
+The session does not retry on its own: a retried POST could send a batch
+twice, and the outbox already retries with backoff.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+DEFAULT_API_URL = 'https://api.mailjet.com/v3.1/send'
+
+
+class MailjetUnavailable(Exception):
+    """The send call as a whole failed or was not attempted; every message in it is retried."""
+
+
+class CircuitOpen(MailjetUnavailable):
+    """The call was refused without reaching Mailjet because the circuit is open."""
+
+    def __init__(self, retry_in):
+        super().__init__(f'Mailjet circuit open; next try in {retry_in:.0f}s')
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Counts consecutive failures and refuses calls for a while once there are too many."""
+
+    def __init__(self, failure_threshold=5, reset_seconds=60):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def is_open(self):
+        """Whether calls are refused right now (a trial call in progress also counts)."""
+        with self._lock:
+            state = self._state()
+            return state == 'open' or (state == 'half-open' and self._trial_running)
+
+    def allow(self):
+        """Take permission for one call. In half-open state only one caller gets it."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def seconds_until_retry(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+
+class MailjetClient:
+    """Sends v3.1 message batches over one pooled session."""
+
+    def __init__(self, api_key, api_secret, api_url=DEFAULT_API_URL, connect_timeout=5, read_timeout=30,
+                 pool_size=4, breaker=None):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self.session.auth = (api_key, api_secret)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, messages):
+        """
+        Send messages in one call and return Mailjet's result for each, in
+        order. Raises MailjetUnavailable if the call failed or the circuit
+        is open.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(self.breaker.seconds_until_retry())
+        try:
+            response = self.session.post(self.api_url, json={'Messages': messages}, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise MailjetUnavailable(f'{type(e).__name__}: {e}')
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        results = data.get('Messages') if isinstance(data, dict) else None
+        # 400 still carries a status per message when only some of them are invalid
+        if response.status_code in (200, 400) and isinstance(results, list) and len(results) == len(messages):
+            self.breaker.record_success()
+            return results
+        self.breaker.record_failure()
+        raise MailjetUnavailable(f'Mailjet returned status {response.status_code}: {str(data or response.text)[:500]}')
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process's MailjetClient, created from settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = getattr(settings, 'MAILJET_API_KEY', '')
+            api_secret = getattr(settings, 'MAILJET_API_SECRET', '')
+            if not api_key or not api_secret:
+                raise MailjetUnavailable('Mailjet API credentials not configured')
+            _client = MailjetClient(
+                api_key,
+                api_secret,
+                api_url=getattr(settings, 'MAILJET_API_URL', DEFAULT_API_URL),
+                connect_timeout=getattr(settings, 'MAILJET_CONNECT_TIMEOUT', 5),
+                read_timeout=getattr(settings, 'MAILJET_READ_TIMEOUT', 30),
+                pool_size=getattr(settings, 'EMAIL_SENDER_THREADS', 4),
+                breaker=CircuitBreaker(
+                    failure_threshold=getattr(settings, 'MAILJET_BREAKER_THRESHOLD', 5),
+                    reset_seconds=getattr(settings, 'MAILJET_BREAKER_RESET_SECONDS', 60),
+                ),
+            )
+        return _client
+
+
+def reset_client():
+    """Close and forget the process's client, e.g. after changing the Mailjet settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def circuit_open():
+    """Whether sends would be refused right now without reaching Mailjet."""
+    with _client_lock:
+        return _client is not None and _client.breaker.is_open()
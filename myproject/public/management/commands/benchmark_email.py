@@ -0,0 +1,241 @@
+"""
+Management command to measure email throughput from booking to delivery.
+Usage: python manage.py benchmark_email [--emails 500] [--enqueuers 8] [--threads 4] [--backlog 8] [--latency 0.1] [--error-rate 0] [--rate-limit 0] [--url URL]
+
+Creates a throwaway counselor with open timeslots and one student per email.
+Enqueuer threads book the slots and queue the confirmation emails through
+public.utils, the same way the booking view does, while a SenderPool sends
+the outbox the way send_outbox_emails does. Mailjet is replaced by the local
+fake server (public/fake_mailjet.py) with the given latency, error rate and
+rate limit, or by the server at --url. The command reports messages per
+second, p50/p99 enqueue-to-delivery latency, peak thread count and peak
+memory. Generated users, appointments and emails are deleted afterwards.
+
+Refuses to run while real emails are waiting in the outbox, since they would
+be sent to the fake server.
+"""
+import contextlib
+import os
+import queue
+import resource
+import threading
+import time as time_module
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.test import override_settings
+from django.utils import timezone
+
+from public import mailjet
+from public.fake_mailjet import FakeMailjetServer
+from public.mailer import MAX_BATCH, SenderPool, claim_batch
+from public.models import OutboxEmail
+from public.utils import book_timeslot, queue_appointment_email
+from sysadmin.utils import SLOT_HOURS, open_slots
+
+User = get_user_model()
+
+PREFIX = 'benchmark-email'
+
+
+class Command(BaseCommand):
+    help = 'Books slots, queues confirmation emails and sends them to a fake Mailjet, reporting throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500, help='Number of booking confirmations')
+        parser.add_argument('--enqueuers', type=int, default=8, help='Threads booking and queueing emails')
+        parser.add_argument('--threads', type=int, default=4, help='Sender threads')
+        parser.add_argument('--backlog', type=int, default=8, help='Claimed batches that may wait for a sender thread')
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH, help=f'Emails per Mailjet call (at most {MAX_BATCH})')
+        parser.add_argument('--latency', type=float, default=0.1, help='Seconds every fake send call takes')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake send calls answered with a 500 (0-1)')
+        parser.add_argument('--rate-limit', type=int, default=0, help='Fake send calls per second before 429 (0: no limit)')
+        parser.add_argument('--url', help='Send to this Mailjet stand-in (e.g. one run with fake_mailjet) instead of starting one')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, appointments and emails')
+
+    def handle(self, *args, **options):
+        emails_count = max(1, options['emails'])
+        enqueuers_count = max(1, options['enqueuers'])
+        batch_size = max(1, min(options['batch_size'], MAX_BATCH))
+
+        waiting = OutboxEmail.objects.filter(status__in=['pending', 'sending']).exclude(to_email__startswith=PREFIX).count()
+        if waiting:
+            raise CommandError(f'{waiting} email(s) are waiting in the outbox and would be sent to the fake server; '
+                               f'send them first with send_outbox_emails')
+
+        self._cleanup()
+        server = None
+        try:
+            counselor, jobs = self._setup(emails_count)
+            url = options['url']
+            if not url:
+                server = FakeMailjetServer(
+                    latency=max(0.0, options['latency']),
+                    jitter=max(0.0, options['jitter']),
+                    error_rate=min(max(options['error_rate'], 0.0), 1.0),
+                    rate_limit=max(0, options['rate_limit']),
+                ).start()
+                url = server.url
+
+            errors = []
+            peak = {'threads': threading.active_count()}
+            sampling = threading.Event()
+
+            def sample():
+                while not sampling.wait(0.05):
+                    peak['threads'] = max(peak['threads'], threading.active_count())
+
+            def enqueue():
+                try:
+                    while True:
+                        try:
+                            student, slot_date, hour = jobs.get_nowait()
+                        except queue.Empty:
+                            return
+                        try:
+                            with transaction.atomic():
+                                appointment = book_timeslot(student, counselor.id, slot_date, hour, 'Email Benchmark')
+                                queue_appointment_email(student, appointment)
+                        except Exception as e:
+                            errors.append(f'{type(e).__name__}: {e}')
+                finally:
+                    connection.close()
+
+            start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Fake credentials: a misconfigured --url can never send real mail
+            with override_settings(MAILJET_API_KEY=PREFIX, MAILJET_API_SECRET=PREFIX, MAILJET_API_URL=url):
+                mailjet.reset_client()
+                pool = SenderPool(threads=max(1, options['threads']), backlog=max(0, options['backlog']))
+                enqueuers = [threading.Thread(target=enqueue, name='benchmark-enqueuer') for _ in range(enqueuers_count)]
+                sampler = threading.Thread(target=sample, daemon=True)
+
+                self.stdout.write(f'Sending {emails_count} booking confirmation(s) to {url}...')
+                # queue_appointment_email and the mailer print a line per email and batch
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    started = time_module.perf_counter()
+                    sampler.start()
+                    for thread in enqueuers:
+                        thread.start()
+                    try:
+                        self._dispatch(pool, enqueuers, batch_size)
+                    finally:
+                        pool.shutdown()
+                        # If sending failed, stop handing out bookings; either way no enqueuer may
+                        # still print or write rows once this block ends
+                        self._drain(jobs)
+                        for thread in enqueuers:
+                            thread.join()
+                        sampling.set()
+                    elapsed = time_module.perf_counter() - started
+
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            emails = OutboxEmail.objects.filter(to_email__startswith=PREFIX)
+            statuses = dict(emails.values_list('status').annotate(count=Count('id')))
+            latencies = sorted(
+                (sent_at - created_at).total_seconds()
+                for created_at, sent_at in emails.filter(status='sent').values_list('created_at', 'sent_at')
+            )
+            sent = len(latencies)
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0
+
+            self.stdout.write('=' * 60)
+            self.stdout.write('EMAIL PIPELINE BENCHMARK')
+            self.stdout.write('=' * 60)
+            self.stdout.write(f'Emails: {emails_count}  Enqueuers: {enqueuers_count}  Sender threads: {pool.threads}  '
+                              f'Backlog: {options["backlog"]}  Batch size: {batch_size}')
+            if server is not None:
+                self.stdout.write(f'Fake Mailjet: latency {server.latency}s  jitter {server.jitter}s  '
+                                  f'error rate {server.error_rate}  rate limit {server.rate_limit or "none"}')
+            self.stdout.write(f'Booking errors: {len(errors)}')
+            for error in errors[:5]:
+                self.stderr.write(f'  {error}')
+            self.stdout.write(f'Sent: {sent}  Waiting for retry: {statuses.get("pending", 0) + statuses.get("sending", 0)}  '
+                              f'Failed: {statuses.get("failed", 0)}')
+            self.stdout.write(f'Elapsed: {elapsed:.3f}s')
+            self.stdout.write(f'Messages per second: {sent / elapsed:.1f}' if elapsed else 'Messages per second: n/a')
+            self.stdout.write(f'Enqueue-to-delivery latency p50: {p50:.1f} ms  p99: {p99:.1f} ms')
+            stats = pool.stats
+            self.stdout.write(f'Send calls: {stats["batches"]}  Call errors: {stats["errors"]}  Pool full: {stats["pool_full"]}')
+            if server is not None:
+                self.stdout.write(f'Server calls: {server.stats["calls"]}  connections: {server.connections}  '
+                                  f'500s: {server.stats["errors"]}  429s: {server.stats["rate_limited"]}')
+            self.stdout.write(f'Peak threads: {peak["threads"]}')
+            # ru_maxrss is in kilobytes on Linux
+            self.stdout.write(f'Peak memory (RSS): {peak_rss / 1024:.1f} MB (before run: {start_rss / 1024:.1f} MB)')
+
+        finally:
+            # Forget the client built for the fake server
+            mailjet.reset_client()
+            if server is not None:
+                server.stop()
+            if not options['keep']:
+                self._cleanup()
+
+        if sent < emails_count - len(errors):
+            self.stdout.write(self.style.WARNING(f'{emails_count - len(errors) - sent} email(s) were not delivered'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All queued emails were delivered.'))
+
+    def _dispatch(self, pool, enqueuers, batch_size):
+        """Send the outbox until the enqueuers are done and nothing is due, as send_outbox_emails does."""
+        while True:
+            if mailjet.circuit_open():
+                time_module.sleep(0.1)
+                continue
+            if not pool.reserve(timeout=0.1):
+                continue
+            # Checked before claiming, so emails queued while claiming are not missed
+            enqueued = not any(thread.is_alive() for thread in enqueuers)
+            close_old_connections()
+            emails = claim_batch(batch_size)
+            if emails:
+                pool.submit(emails)
+                continue
+            pool.release()
+            if enqueued:
+                return
+            time_module.sleep(0.01)
+
+    def _drain(self, jobs):
+        while True:
+            try:
+                jobs.get_nowait()
+            except queue.Empty:
+                return
+
+    def _setup(self, emails_count):
+        counselor = User.objects.create_user(
+            username=f'{PREFIX}-counselor@example.com',
+            email=f'{PREFIX}-counselor@example.com',
+            password=None,
+            first_name='BENCHMARK',
+            last_name='COUNSELOR',
+            is_staff=True,
+        )
+        User.objects.bulk_create([
+            User(username=f'{PREFIX}-student-{i}', email=f'{PREFIX}-student-{i}@example.com',
+                 first_name='BENCHMARK', last_name=f'STUDENT {i}')
+            for i in range(emails_count)
+        ])
+        students = list(User.objects.filter(username__startswith=f'{PREFIX}-student-').order_by('id'))
+
+        # One slot per student, far enough ahead not to meet real bookings
+        first_date = timezone.now().date() + timedelta(days=365)
+        days = -(-emails_count // len(SLOT_HOURS))
+        for offset in range(days):
+            open_slots(counselor, first_date + timedelta(days=offset), SLOT_HOURS)
+
+        jobs = queue.Queue()
+        for i, student in enumerate(students):
+            jobs.put((student, first_date + timedelta(days=i // len(SLOT_HOURS)), SLOT_HOURS[i % len(SLOT_HOURS)]))
+        return counselor, jobs
+
+    def _cleanup(self):
+        OutboxEmail.objects.filter(to_email__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
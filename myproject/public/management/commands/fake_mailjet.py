@@ -0,0 +1,47 @@
+"""
+Management command that runs a local stand-in for Mailjet's send API.
+Usage: python manage.py fake_mailjet [--port 8025] [--latency 0.1] [--jitter 0.05] [--error-rate 0.01] [--rate-limit 20]
+
+Nothing is delivered. Point the app at it with
+MAILJET_API_URL=http://127.0.0.1:8025/v3.1/send (any API key and secret
+work) to load-test the outbox without touching Mailjet. Stop it with Ctrl+C.
+"""
+from django.core.management.base import BaseCommand
+
+from public.fake_mailjet import FakeMailjetServer
+
+
+class Command(BaseCommand):
+    help = 'Runs a fake Mailjet v3.1 send API with configurable latency, errors and rate limiting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+        parser.add_argument('--port', type=int, default=8025, help='Port to listen on')
+        parser.add_argument('--latency', type=float, default=0.1, help='Seconds every send call takes')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of send calls answered with a 500 (0-1)')
+        parser.add_argument('--rate-limit', type=int, default=0, help='Send calls per second before answering 429 (0: no limit)')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        server = FakeMailjetServer(
+            host=options['host'],
+            port=options['port'],
+            latency=max(0.0, options['latency']),
+            jitter=max(0.0, options['jitter']),
+            error_rate=min(max(options['error_rate'], 0.0), 1.0),
+            rate_limit=max(0, options['rate_limit']),
+            verbose=options['verbose'],
+        )
+        self.stdout.write(f'Fake Mailjet listening on {server.url}')
+        self.stdout.write(f'Set MAILJET_API_URL={server.url} to send through it. Quit with Ctrl+C.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        stats = server.stats
+        self.stdout.write(
+            f"Calls {stats['calls']}  messages {stats['messages']}  errors {stats['errors']}  rate limited {stats['rate_limited']}"
+        )
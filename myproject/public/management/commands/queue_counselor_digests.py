@@ -0,0 +1,19 @@
+"""
+Management command that queues the notification digest emails that are due.
+Usage: python manage.py queue_counselor_digests
+
+The outbox worker (send_outbox_emails) already does this every minute; run
+this from cron when no worker is running, or to queue due digests right away.
+Counselors opt in to daily or hourly digests on their profile page.
+"""
+from django.core.management.base import BaseCommand
+
+from public.digests import queue_counselor_digests
+
+
+class Command(BaseCommand):
+    help = 'Queues one email per due counselor summarising their unread notifications'
+
+    def handle(self, *args, **options):
+        queued = queue_counselor_digests()
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} digest email(s)'))
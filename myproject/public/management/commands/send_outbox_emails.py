@@ -0,0 +1,110 @@
+"""
+Management command that sends the queued emails in the outbox through Mailjet.
+Usage: python manage.py send_outbox_emails [--threads 4] [--backlog 8] [--batch-size 50] [--poll-interval 5] [--once] [--no-digests]
+
+Runs until stopped. SIGTERM/SIGINT stop claiming new emails and wait for
+every batch already claimed to be sent. Batches of up to --batch-size due
+emails go out on --threads sender threads, one Mailjet call each; at most
+--backlog further batches wait for a thread. When the pool is full or
+nothing is due, emails stay in the outbox table and the command waits up
+to --poll-interval seconds. Several workers can run at once on PostgreSQL.
+With --once it exits when the outbox has nothing due. Every minute it also
+queues the counselor notification digests that are due (public/digests.py);
+--no-digests turns that off.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from public.digests import DIGEST_CHECK_SECONDS, queue_counselor_digests
+from public.mailer import MAX_BATCH, SenderPool, claim_batch
+from public.mailjet import circuit_open
+
+
+class Command(BaseCommand):
+    help = 'Sends queued outbox emails through Mailjet in batches on a bounded pool of threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'EMAIL_SENDER_THREADS', 4),
+                            help='Sender threads')
+        parser.add_argument('--backlog', type=int, default=getattr(settings, 'EMAIL_SENDER_BACKLOG', 8),
+                            help='Claimed batches that may wait for a sender thread')
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH, help=f'Emails per Mailjet call (at most {MAX_BATCH})')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to wait when nothing is due or the pool is full')
+        parser.add_argument('--once', action='store_true', help='Exit when the outbox has nothing due')
+        parser.add_argument('--no-digests', action='store_true', help='Do not queue counselor notification digests')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, min(options['batch_size'], MAX_BATCH))
+        poll_interval = options['poll_interval']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        pool = SenderPool(threads=max(1, options['threads']), backlog=max(0, options['backlog']))
+        self.stdout.write(
+            f"Outbox worker started ({pool.threads} thread(s), backlog {options['backlog']}, batch size {batch_size})"
+        )
+        last_report = time.monotonic()
+        last_digest_check = None
+        try:
+            while not self.stopping:
+                if not options['no_digests'] and (
+                    last_digest_check is None or time.monotonic() - last_digest_check >= DIGEST_CHECK_SECONDS
+                ):
+                    last_digest_check = time.monotonic()
+                    close_old_connections()
+                    try:
+                        queue_counselor_digests()
+                    except Exception as e:
+                        self.stderr.write(f'Queueing digests failed: {type(e).__name__}: {e}')
+
+                if circuit_open():
+                    time.sleep(poll_interval)
+                    continue
+                # Claim only when a thread or backlog slot is free; otherwise emails wait in the table
+                if not pool.reserve(timeout=poll_interval):
+                    continue
+
+                close_old_connections()
+                try:
+                    emails = claim_batch(batch_size)
+                except Exception as e:
+                    pool.release()
+                    self.stderr.write(f'Claiming emails failed: {type(e).__name__}: {e}')
+                    if options['once']:
+                        raise
+                    time.sleep(poll_interval)
+                    continue
+
+                if not emails:
+                    pool.release()
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                pool.submit(emails)
+
+                if time.monotonic() - last_report >= 60:
+                    self.report(pool)
+                    last_report = time.monotonic()
+        finally:
+            self.stdout.write('Waiting for claimed emails to be sent...')
+            pool.shutdown()
+
+        self.report(pool)
+        self.stdout.write(self.style.SUCCESS('Outbox worker stopped'))
+
+    def report(self, pool):
+        stats = pool.stats
+        self.stdout.write(
+            f"  batches {stats['batches']}  sent {stats['sent']}  retry {stats['retry']}  failed {stats['failed']}"
+            f"  errors {stats['errors']}  pool full {stats['pool_full']}"
+        )
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping: no new emails will be claimed')
+        self.stopping = True
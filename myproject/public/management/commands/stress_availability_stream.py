@@ -0,0 +1,211 @@
+"""
+Management command to measure fan-out latency of the live availability stream.
+Usage: python manage.py stress_availability_stream [--subscribers 500] [--rounds 10]
+
+Opens many concurrent Server-Sent Events streams for the same counselor and date
+by calling the ASGI application in-process, then opens and closes one of the
+counselor's slots in turn and measures how long each change takes to reach every open
+stream. Reports p50/p99/max latency and any stream that missed an update.
+"""
+import asyncio
+import time as time_module
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from myproject.asgi import application
+from sysadmin.events import hub
+from sysadmin.utils import set_slots
+
+User = get_user_model()
+
+PREFIX = 'stress-stream'
+
+
+class StreamSubscriber:
+    """One open stream, driven through the raw ASGI interface."""
+
+    def __init__(self, path, query, headers):
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'https',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 443),
+        }
+        self.events = []
+        self.status = None
+        self.disconnect = asyncio.Event()
+        self.updated = asyncio.Event()
+        self._buffer = ''
+        self._requested = False
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self._buffer += message.get('body', b'').decode()
+            while '\n\n' in self._buffer:
+                block, self._buffer = self._buffer.split('\n\n', 1)
+                if block.startswith('event: slots'):
+                    self.events.append(time_module.perf_counter())
+                    self.updated.set()
+
+    async def run(self):
+        await application(self.scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = 'Holds many availability streams open and measures how fast changes reach all of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=500, help='Number of concurrent streams')
+        parser.add_argument('--rounds', type=int, default=10, help='Number of slot changes to publish')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for each change to arrive')
+
+    def handle(self, *args, **options):
+        subscribers_count = max(1, options['subscribers'])
+        rounds = max(1, options['rounds'])
+        timeout = options['timeout']
+        slot_date = timezone.now().date() + timedelta(days=365)
+
+        self._cleanup()
+        counselor, session_cookie = self._setup()
+        try:
+            report = asyncio.run(self._run(counselor, session_cookie, slot_date, subscribers_count, rounds, timeout))
+        finally:
+            self._cleanup(session_cookie)
+
+        latencies = sorted(report['latencies'])
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0
+        worst = latencies[-1] * 1000 if latencies else 0
+
+        self.stdout.write('=' * 60)
+        self.stdout.write('AVAILABILITY STREAM FAN-OUT TEST')
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'Database: {connection.vendor}  Streams: {subscribers_count}  Rounds: {rounds}')
+        self.stdout.write(f'Streams connected: {report["connected"]}  Hub subscribers: {report["registered"]}  Connect time: {report["connect_time"]:.3f}s')
+        self.stdout.write(f'Deliveries: {len(latencies)}/{subscribers_count * rounds}  Missed: {report["missed"]}')
+        self.stdout.write(f'Fan-out latency p50: {p50:.1f} ms  p99: {p99:.1f} ms  max: {worst:.1f} ms')
+
+        if report['connected'] < subscribers_count:
+            raise CommandError(f'Only {report["connected"]} of {subscribers_count} streams connected')
+        if report['missed']:
+            raise CommandError(f'{report["missed"]} update(s) did not reach their stream within {timeout}s')
+
+        self.stdout.write(self.style.SUCCESS('Every stream received every update.'))
+
+    async def _run(self, counselor, session_cookie, slot_date, subscribers_count, rounds, timeout):
+        host = settings.ALLOWED_HOSTS[0].lstrip('.') if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        headers = [
+            (b'host', host.encode()),
+            (b'accept', b'text/event-stream'),
+            (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_cookie}'.encode()),
+        ]
+        path = f'/counselor/{counselor.id}/availability/stream/'
+        query = urlencode({'date': slot_date.strftime('%Y-%m-%d')})
+
+        subscribers = [StreamSubscriber(path, query, headers) for _ in range(subscribers_count)]
+        started = time_module.perf_counter()
+        tasks = [asyncio.create_task(subscriber.run()) for subscriber in subscribers]
+
+        # Connected means the first snapshot arrived, which happens after subscribing
+        deadline = time_module.perf_counter() + max(timeout, 30)
+        while time_module.perf_counter() < deadline:
+            if all(subscriber.events for subscriber in subscribers) or any(task.done() for task in tasks):
+                break
+            await asyncio.sleep(0.05)
+        connect_time = time_module.perf_counter() - started
+        connected = sum(1 for subscriber in subscribers if subscriber.events)
+        registered = hub.subscriber_count()
+
+        latencies = []
+        missed = 0
+        if connected == subscribers_count:
+            for round_number in range(1, rounds + 1):
+                for subscriber in subscribers:
+                    subscriber.updated.clear()
+                published = time_module.perf_counter()
+                # Change the slot from a plain thread, the way a sync view would; it starts closed
+                await asyncio.to_thread(self._set_slot, counselor, slot_date, round_number % 2 == 1)
+
+                expected = round_number + 1
+                waits = [
+                    asyncio.wait_for(self._wait_for(subscriber, expected), timeout)
+                    for subscriber in subscribers
+                ]
+                outcomes = await asyncio.gather(*waits, return_exceptions=True)
+                for subscriber, outcome in zip(subscribers, outcomes):
+                    if isinstance(outcome, Exception):
+                        missed += 1
+                    else:
+                        latencies.append(subscriber.events[expected - 1] - published)
+
+        for subscriber in subscribers:
+            subscriber.disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        return {
+            'connected': connected,
+            'registered': registered,
+            'connect_time': connect_time,
+            'latencies': latencies,
+            'missed': missed,
+        }
+
+    async def _wait_for(self, subscriber, count):
+        while len(subscriber.events) < count:
+            await subscriber.updated.wait()
+            subscriber.updated.clear()
+
+    def _set_slot(self, counselor, slot_date, available):
+        try:
+            set_slots(counselor, [(slot_date, 8, available)])
+        finally:
+            connection.close()
+
+    def _setup(self):
+        counselor = User.objects.create_user(
+            username=f'{PREFIX}-counselor@example.com',
+            email=f'{PREFIX}-counselor@example.com',
+            password=None,
+            first_name='STRESS',
+            last_name='COUNSELOR',
+            is_staff=True,
+        )
+        student = User.objects.create_user(
+            username=f'{PREFIX}-student@example.com',
+            email='',
+            password=None,
+            first_name='STRESS',
+            last_name='STUDENT',
+        )
+        client = Client()
+        client.force_login(student)
+        return counselor, client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def _cleanup(self, session_key=None):
+        if session_key:
+            Session.objects.filter(session_key=session_key).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
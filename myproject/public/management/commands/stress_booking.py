@@ -0,0 +1,144 @@
+"""
+Management command to stress test concurrent appointment booking.
+Usage: python manage.py stress_booking [--students 200] [--slots 8] [--threads 32]
+
+Creates a throwaway counselor with open timeslots and a batch of students who all
+race for those slots at the same time, then reports bookings per second and checks
+that no timeslot ended up with more than one active appointment.
+"""
+import queue
+import random
+import threading
+import time as time_module
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from public.models import Appointment, ACTIVE_STATUSES
+from public.utils import book_timeslot, BookingError
+from sysadmin.utils import open_slots
+
+User = get_user_model()
+
+SLOT_HOURS = [8, 9, 10, 11, 13, 14, 15, 16]
+PREFIX = 'stress-booking'
+
+
+class Command(BaseCommand):
+    help = 'Races many students for the same counselor timeslots and checks for double bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200, help='Number of competing students')
+        parser.add_argument('--slots', type=int, default=8, help='Number of open slots (1-8)')
+        parser.add_argument('--threads', type=int, default=32, help='Number of concurrent booking threads')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and appointments')
+
+    def handle(self, *args, **options):
+        students_count = options['students']
+        slots_count = max(1, min(options['slots'], len(SLOT_HOURS)))
+        threads_count = max(1, options['threads'])
+        slot_date = timezone.now().date() + timedelta(days=365)
+        hours = SLOT_HOURS[:slots_count]
+
+        self._cleanup()
+        counselor, students = self._setup(students_count, slot_date, hours)
+
+        # Every student targets one slot, so each slot has students/slots contenders
+        jobs = queue.Queue()
+        attempts = [(student, hours[i % slots_count]) for i, student in enumerate(students)]
+        random.shuffle(attempts)
+        for attempt in attempts:
+            jobs.put(attempt)
+
+        results = {'booked': 0, 'rejected': 0, 'errors': 0}
+        latencies = []
+        lock = threading.Lock()
+        start_gate = threading.Event()
+
+        def worker():
+            start_gate.wait()
+            try:
+                while True:
+                    try:
+                        student, hour = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    started = time_module.perf_counter()
+                    try:
+                        book_timeslot(student, counselor.id, slot_date, hour, 'Stress Test')
+                        outcome = 'booked'
+                    except BookingError:
+                        outcome = 'rejected'
+                    except Exception as e:
+                        outcome = 'errors'
+                        self.stderr.write(f'Unexpected booking error: {e}')
+                    elapsed = time_module.perf_counter() - started
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+
+        started = time_module.perf_counter()
+        start_gate.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time_module.perf_counter() - started
+
+        double_booked = Appointment.objects.filter(
+            counselor=counselor,
+            status__in=ACTIVE_STATUSES
+        ).values('timeslot').annotate(active=Count('id')).filter(active__gt=1).count()
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0
+
+        self.stdout.write('=' * 60)
+        self.stdout.write('CONCURRENT BOOKING STRESS TEST')
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'Students: {students_count}  Slots: {slots_count}  Threads: {threads_count}')
+        self.stdout.write(f'Booked: {results["booked"]}  Rejected: {results["rejected"]}  Errors: {results["errors"]}')
+        self.stdout.write(f'Elapsed: {elapsed:.3f}s')
+        self.stdout.write(f'Attempts per second: {len(latencies) / elapsed:.1f}' if elapsed else 'Attempts per second: n/a')
+        self.stdout.write(f'Bookings per second: {results["booked"] / elapsed:.1f}' if elapsed else 'Bookings per second: n/a')
+        self.stdout.write(f'Latency p50: {p50:.1f} ms  p99: {p99:.1f} ms')
+        self.stdout.write(f'Double-booked slots: {double_booked}')
+
+        if not options['keep']:
+            self._cleanup()
+
+        if double_booked:
+            raise CommandError(f'{double_booked} timeslot(s) were double booked')
+        if results['booked'] > slots_count:
+            raise CommandError(f'{results["booked"]} bookings for only {slots_count} slots')
+
+        self.stdout.write(self.style.SUCCESS('No double bookings detected.'))
+
+    def _setup(self, students_count, slot_date, hours):
+        counselor = User.objects.create_user(
+            username=f'{PREFIX}-counselor@example.com',
+            email=f'{PREFIX}-counselor@example.com',
+            password=None,
+            first_name='STRESS',
+            last_name='COUNSELOR',
+            is_staff=True,
+        )
+        User.objects.bulk_create([
+            User(username=f'{PREFIX}-student-{i}', email='', first_name='STRESS', last_name=f'STUDENT {i}')
+            for i in range(students_count)
+        ])
+        students = list(User.objects.filter(username__startswith=f'{PREFIX}-student-'))
+        open_slots(counselor, slot_date, hours)
+        return counselor, students
+
+    def _cleanup(self):
+        User.objects.filter(username__startswith=PREFIX).delete()
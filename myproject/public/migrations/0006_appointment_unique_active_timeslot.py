@@ -0,0 +1,43 @@
+# Migration to guarantee at most one active appointment per timeslot
+from django.db import migrations, models
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """Cancel all but the earliest active appointment on each timeslot so the
+    partial unique index can be created on databases that already contain
+    double bookings."""
+    Appointment = apps.get_model('public', 'Appointment')
+    active = Appointment.objects.filter(
+        status__in=['pending', 'confirmed'],
+        timeslot__isnull=False,
+    ).order_by('timeslot_id', 'created_at', 'id').values_list('id', 'timeslot_id')
+
+    seen = set()
+    duplicates = []
+    for appointment_id, timeslot_id in active.iterator():
+        if timeslot_id in seen:
+            duplicates.append(appointment_id)
+        else:
+            seen.add(timeslot_id)
+
+    if duplicates:
+        Appointment.objects.filter(id__in=duplicates).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('public', '0005_userprofile_college_appointment'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(status__in=('pending', 'confirmed')),
+                fields=('timeslot',),
+                name='unique_active_appointment_per_timeslot',
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Migration for stored student notifications, backfilled from existing appointments
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from datetime import timedelta
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Same wording the notifications page used when it built the feed from appointments
+BACKFILL = {
+    'pending': ('appointment_pending', 'Appointment Pending',
+                'Your appointment request with {counselor} ({title}) for {date} at {time} is awaiting confirmation.'),
+    'confirmed': ('appointment_confirmed', 'Appointment Confirmed',
+                  'Your appointment with {counselor} ({title}) has been confirmed for {date} at {time}.'),
+    'cancelled': ('appointment_cancelled', 'Appointment Cancelled',
+                  'Your appointment with {counselor} ({title}) scheduled for {date} at {time} has been cancelled.'),
+    'completed': ('appointment_completed', 'Appointment Completed',
+                  'Your counseling session with {counselor} ({title}) has been completed. Thank you for using our services.'),
+}
+
+
+def backfill_notifications(apps, schema_editor):
+    """Create one notification per existing appointment so current feeds are not emptied."""
+    Appointment = apps.get_model('public', 'Appointment')
+    CounselorProfile = apps.get_model('sysadmin', 'CounselorProfile')
+    StudentNotification = apps.get_model('public', 'StudentNotification')
+
+    titles = dict(CounselorProfile.objects.values_list('user_id', 'title'))
+    recent = timezone.now() - timedelta(days=1)
+    appointments = Appointment.objects.filter(
+        timeslot__isnull=False, status__in=BACKFILL,
+    ).select_related('counselor', 'timeslot').order_by('updated_at', 'id')
+
+    batch = []
+    for appointment in appointments.iterator(chunk_size=500):
+        notification_type, title, message = BACKFILL[appointment.status]
+        counselor = appointment.counselor
+        changed_at = appointment.created_at if appointment.status == 'pending' else appointment.updated_at
+        batch.append(StudentNotification(
+            student_id=appointment.student_id,
+            appointment_id=appointment.id,
+            notification_type=notification_type,
+            title=title,
+            message=message.format(
+                counselor=f"{counselor.first_name} {counselor.last_name}".strip() or counselor.username,
+                title=titles.get(counselor.id) or 'Guidance Counselor',
+                date=appointment.timeslot.date.strftime('%B %d, %Y'),
+                time=appointment.timeslot.start_time.strftime('%I:%M %p'),
+            ),
+            is_read=appointment.status == 'completed' or changed_at < recent,
+            created_at=changed_at,
+        ))
+        if len(batch) >= 500:
+            StudentNotification.objects.bulk_create(batch)
+            batch = []
+    StudentNotification.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('public', '0007_idempotencykey'),
+        ('sysadmin', '0011_counselorprofile_college_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('appointment_pending', 'Appointment Pending'), ('appointment_confirmed', 'Appointment Confirmed'), ('appointment_cancelled', 'Appointment Cancelled'), ('appointment_rescheduled', 'Appointment Rescheduled'), ('appointment_completed', 'Appointment Completed')], max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='student_notifications', to='public.appointment')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [
+                    models.Index(fields=['student', '-id'], name='studentnotif_feed_idx'),
+                    models.Index(condition=models.Q(('is_read', False)), fields=['student'], name='studentnotif_unread_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_notifications, migrations.RunPython.noop),
+    ]
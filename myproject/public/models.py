@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+
+# Appointment statuses that hold on to a timeslot
+ACTIVE_STATUSES = ('pending', 'confirmed')
 
 
 # Profile for public users (students)
@@ -38,8 +43,124 @@ class Appointment(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		constraints = [
+			# At most one pending/confirmed appointment may hold a timeslot
+			models.UniqueConstraint(
+				fields=['timeslot'],
+				condition=models.Q(status__in=ACTIVE_STATUSES),
+				name='unique_active_appointment_per_timeslot',
+			),
+		]
 
 	def __str__(self):
 		if self.timeslot:
 			return f"{self.student.get_full_name()} - {self.counselor.get_full_name()} on {self.timeslot.date} at {self.timeslot.start_time}"
 		return f"{self.student.get_full_name()} - {self.counselor.get_full_name()}"
+
+
+# Stored outcome of a POST sent with an Idempotency-Key, replayed for retries
+class IdempotencyKey(models.Model):
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+	key = models.CharField(max_length=255)
+	path = models.CharField(max_length=255)
+	# Null while the first request is still running
+	status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+	content_type = models.CharField(max_length=100, blank=True)
+	location = models.CharField(max_length=2048, blank=True)
+	body = models.BinaryField(blank=True, default=b'')
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		unique_together = (('user', 'key'),)
+		indexes = [
+			models.Index(fields=['user', 'created_at'], name='idempotency_user_created_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.user} - {self.key} - {self.path}"
+
+
+# Appointment updates shown on the student's notifications page
+class StudentNotification(models.Model):
+	NOTIFICATION_TYPES = [
+		('appointment_pending', 'Appointment Pending'),
+		('appointment_confirmed', 'Appointment Confirmed'),
+		('appointment_cancelled', 'Appointment Cancelled'),
+		('appointment_rescheduled', 'Appointment Rescheduled'),
+		('appointment_completed', 'Appointment Completed'),
+	]
+	ICONS = {
+		'appointment_pending': '⏳',
+		'appointment_confirmed': '✅',
+		'appointment_cancelled': '❌',
+		'appointment_rescheduled': '🔄',
+		'appointment_completed': '🎉',
+	}
+
+	student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='student_notifications')
+	appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, null=True, blank=True, related_name='student_notifications')
+	notification_type = models.CharField(max_length=50, choices=NOTIFICATION_TYPES)
+	title = models.CharField(max_length=255)
+	message = models.TextField()
+	is_read = models.BooleanField(default=False)
+	# Not auto_now_add so notifications backfilled from old appointments keep their time
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		# Newest first; pages are cut with id < last seen id
+		ordering = ['-id']
+		indexes = [
+			models.Index(fields=['student', '-id'], name='studentnotif_feed_idx'),
+			models.Index(fields=['student'], condition=models.Q(is_read=False), name='studentnotif_unread_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.student} - {self.title}"
+
+	@property
+	def icon(self):
+		return self.ICONS.get(self.notification_type, '🔔')
+
+
+# Email waiting to be sent, written in the same transaction as the change it reports
+class OutboxEmail(models.Model):
+	"""One email in the outbox drained by `manage.py send_outbox_emails`.
+
+	Rows are never sent from the request; the worker claims due rows, sends
+	them to Mailjet in batches and records the outcome, so an email survives
+	worker restarts and there is a record of what was sent.
+	"""
+	STATUS_CHOICES = [
+		('pending', 'Pending'),
+		('sending', 'Sending'),
+		('sent', 'Sent'),
+		('failed', 'Failed'),
+	]
+
+	kind = models.CharField(max_length=50)
+	appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+	from_email = models.EmailField()
+	from_name = models.CharField(max_length=255, blank=True)
+	to_email = models.EmailField()
+	to_name = models.CharField(max_length=255, blank=True)
+	subject = models.CharField(max_length=255)
+	text_body = models.TextField()
+	html_body = models.TextField(blank=True)
+
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+	attempts = models.PositiveSmallIntegerField(default=0)
+	# When a pending row is due; for a row being sent, when its claim expires
+	next_attempt_at = models.DateTimeField(default=timezone.now)
+	last_error = models.TextField(blank=True)
+	provider_message_id = models.CharField(max_length=100, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	sent_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['next_attempt_at'], condition=models.Q(status__in=['pending', 'sending']), name='outbox_due_idx'),
+			models.Index(fields=['status', 'created_at'], name='outbox_status_created_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.to_email} - {self.subject} ({self.status})"
@@ -1,4 +1,448 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponseRedirect, JsonResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
+from sysadmin.models import CounselorProfile, Notification, Timeslot
+from sysadmin.utils import close_slots, get_day_mask, open_slots, slot_bit
+from . import mailjet
+from .digests import digest_scheduled_at, queue_counselor_digests
+from .fake_mailjet import FakeMailjetServer
+from .mailer import MAX_ATTEMPTS, RETRY_BASE_SECONDS, claim_batch, send_batch
+from .models import Appointment, IdempotencyKey, OutboxEmail, StudentNotification
+from .utils import (
+    IDEMPOTENCY_IN_FLIGHT_LEASE, BookingError, book_timeslot, build_appointment_email, idempotent, reschedule_day,
+)
+
+
+class IdempotentTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user('student', 'student@example.com')
+        self.calls = 0
+
+    def request(self, key='key-1', xhr=True):
+        headers = {'Idempotency-Key': key}
+        if xhr:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        request = self.factory.post('/book/', {'timeslot_id': '9'}, headers=headers)
+        request.user = self.user
+        SessionMiddleware(lambda r: None).process_request(request)
+        MessageMiddleware(lambda r: None).process_request(request)
+        return request
+
+    def post(self, view, key='key-1'):
+        return view(self.request(key))
+
+    def booking_view(self, success=True):
+        @idempotent
+        def view(request):
+            self.calls += 1
+            return JsonResponse({'success': success, 'call': self.calls})
+        return view
+
+    def test_success_is_replayed(self):
+        view = self.booking_view()
+        first = self.post(view)
+        second = self.post(view)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_failure_is_not_stored(self):
+        view = self.booking_view(success=False)
+        self.post(view)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.post(view)
+        self.assertEqual(self.calls, 2)
+
+    def form_view(self, error=None):
+        @idempotent
+        def view(request):
+            self.calls += 1
+            if error:
+                messages.error(request, error)
+            else:
+                messages.success(request, 'Appointment booked successfully!')
+            return HttpResponseRedirect('/appointments/')
+        return view
+
+    def test_error_message_is_not_stored(self):
+        request = self.request(xhr=False)
+
+        response = self.form_view('This time slot is already booked.')(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # Checking for errors does not use up the message
+        self.assertEqual([str(m) for m in messages.get_messages(request)], ['This time slot is already booked.'])
+
+    def test_earlier_error_message_does_not_block_storing(self):
+        request = self.request(xhr=False)
+        messages.error(request, 'Missing required information. Please try again.')
+
+        self.form_view()(request)
+
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 302)
+
+    def test_request_in_flight_gets_conflict(self):
+        IdempotencyKey.objects.create(user=self.user, key='key-1', path='/book/')
+        view = self.booking_view()
+
+        response = self.post(view)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_lease_is_taken_over(self):
+        record = IdempotencyKey.objects.create(user=self.user, key='key-1', path='/book/')
+        IdempotencyKey.objects.filter(id=record.id).update(
+            created_at=timezone.now() - IDEMPOTENCY_IN_FLIGHT_LEASE - timedelta(seconds=1),
+        )
+        view = self.booking_view()
+
+        response = self.post(view)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(IdempotencyKey.objects.get(id=record.id).status_code, 200)
+
+
+class BookTimeslotTests(TestCase):
+    def setUp(self):
+        self.counselor = User.objects.create_user('counselor', 'counselor@example.com', is_staff=True)
+        self.student = User.objects.create_user('student', 'student@example.com')
+        self.other_student = User.objects.create_user('other', 'other@example.com')
+        self.date = timezone.localdate() + timedelta(days=7)
+        open_slots(self.counselor, self.date, [9, 10])
+
+    def test_booking_claims_the_slot(self):
+        appointment = book_timeslot(self.student, self.counselor.id, self.date, 9, 'BSIT')
+
+        self.assertEqual(appointment.status, 'pending')
+        self.assertEqual(appointment.timeslot.start_time, time(9, 0))
+        self.assertFalse(get_day_mask(self.counselor, self.date) & slot_bit(9))
+        self.assertTrue(get_day_mask(self.counselor, self.date) & slot_bit(10))
+
+    def test_second_booking_of_a_slot_fails(self):
+        book_timeslot(self.student, self.counselor.id, self.date, 9)
+
+        with self.assertRaises(BookingError):
+            book_timeslot(self.other_student, self.counselor.id, self.date, 9)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_closed_slot_cannot_be_booked(self):
+        close_slots(self.counselor, self.date, [10])
+
+        with self.assertRaises(BookingError):
+            book_timeslot(self.student, self.counselor.id, self.date, 10)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_double_booking_past_the_claim_is_a_booking_error(self):
+        # An active appointment whose slot bit is still set, e.g. written by another path
+        timeslot = Timeslot.objects.create(user=self.counselor, date=self.date, start_time=time(9, 0))
+        Appointment.objects.create(student=self.student, counselor=self.counselor, timeslot=timeslot, status='confirmed')
+
+        with self.assertRaises(BookingError):
+            book_timeslot(self.other_student, self.counselor.id, self.date, 9)
+        self.assertEqual(Appointment.objects.count(), 1)
+        # The claim was rolled back with the failed insert
+        self.assertTrue(get_day_mask(self.counselor, self.date) & slot_bit(9))
+
+    def test_cancelled_appointment_frees_the_slot(self):
+        appointment = book_timeslot(self.student, self.counselor.id, self.date, 9)
+        self.client.force_login(self.counselor)
+
+        self.client.post(reverse('sysadmin:cancel_appointment', args=[appointment.id]))
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'cancelled')
+        rebooked = book_timeslot(self.other_student, self.counselor.id, self.date, 9)
+        self.assertEqual(rebooked.timeslot_id, appointment.timeslot_id)
+
+
+class RescheduleDayTests(TestCase):
+    def setUp(self):
+        self.counselor = User.objects.create_user('counselor', 'counselor@example.com', first_name='ANA', last_name='REYES', is_staff=True)
+        self.colleague = User.objects.create_user('colleague', 'colleague@example.com', first_name='BEN', last_name='CRUZ', is_staff=True)
+        self.outsider = User.objects.create_user('outsider', 'outsider@example.com', is_staff=True)
+        CounselorProfile.objects.create(user=self.counselor, assigned_college='College of Computer Studies')
+        CounselorProfile.objects.create(user=self.colleague, assigned_college='college of computer studies ')
+        CounselorProfile.objects.create(user=self.outsider, assigned_college='College of Engineering')
+        self.student = User.objects.create_user('student', 'student@example.com')
+        self.date = timezone.localdate() + timedelta(days=7)
+        open_slots(self.counselor, self.date, [9])
+        self.appointment = book_timeslot(self.student, self.counselor.id, self.date, 9)
+
+    def test_moves_to_next_free_slot(self):
+        open_slots(self.counselor, self.date, [10])
+        open_slots(self.counselor, self.date + timedelta(days=2), [14, 15])
+
+        outcomes = reschedule_day(self.counselor, self.date)
+
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.timeslot.date, self.date + timedelta(days=2))
+        self.assertEqual(self.appointment.timeslot.start_time, time(14, 0))
+        self.assertEqual(self.appointment.status, 'pending')
+        self.assertTrue(outcomes[0]['moved'])
+        # The day the counselor is out is closed, and the new slot is taken
+        self.assertEqual(get_day_mask(self.counselor, self.date), 0)
+        self.assertEqual(get_day_mask(self.counselor, self.date + timedelta(days=2)), slot_bit(15))
+        self.assertTrue(StudentNotification.objects.filter(appointment=self.appointment).exists())
+
+    def test_nothing_free_keeps_the_appointment(self):
+        outcomes = reschedule_day(self.counselor, self.date, search_days=3)
+
+        self.assertEqual(outcomes, [{
+            'appointment_id': self.appointment.id,
+            'student': 'student',
+            'from': f"{self.date.strftime('%Y-%m-%d')} 09:00",
+            'to': None,
+            'moved': False,
+            'reason': 'No free slot in the next 3 days.',
+        }])
+        timeslot = self.appointment.timeslot
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.timeslot, timeslot)
+        self.assertEqual(self.appointment.counselor, self.counselor)
+
+    def reschedule_to(self, target):
+        self.client.force_login(self.counselor)
+        return self.client.post(reverse('sysadmin:reschedule_day'), {
+            'date': self.date.strftime('%Y-%m-%d'),
+            'target_counselor_id': target.id,
+        }).json()
+
+    def test_moves_to_same_college_colleague(self):
+        open_slots(self.colleague, self.date, [8, 11])
+
+        result = self.reschedule_to(self.colleague)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['moved'], 1)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.counselor, self.colleague)
+        # Same day, at or after the original time
+        self.assertEqual((self.appointment.timeslot.date, self.appointment.timeslot.start_time), (self.date, time(11, 0)))
+        self.assertEqual(self.appointment.timeslot.user, self.colleague)
+
+    def test_other_college_is_refused(self):
+        open_slots(self.outsider, self.date, [11])
+
+        result = self.reschedule_to(self.outsider)
+
+        self.assertFalse(result['success'])
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.counselor, self.counselor)
+
+    def test_source_counselor_is_notified(self):
+        open_slots(self.colleague, self.date, [9])
+
+        reschedule_day(self.counselor, self.date, self.colleague)
+
+        source = Notification.objects.get(counselor=self.counselor, notification_type='appointment_rescheduled')
+        self.assertEqual(source.appointment, self.appointment)
+        self.assertTrue(source.message.endswith('Moved to: BEN CRUZ'))
+        self.assertTrue(Notification.objects.filter(counselor=self.colleague, notification_type='appointment_rescheduled').exists())
+
+
+class SendBatchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeMailjetServer().start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        self.server.error_rate = 0.0
+        settings = override_settings(
+            MAILJET_API_KEY='test', MAILJET_API_SECRET='test', MAILJET_API_URL=self.server.url,
+            MAILJET_BREAKER_THRESHOLD=2, MAILJET_BREAKER_RESET_SECONDS=60,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        mailjet.reset_client()
+        self.addCleanup(mailjet.reset_client)
+
+    def queue(self, to_email='student@example.com', attempts=0):
+        return OutboxEmail.objects.create(
+            kind='appointment_confirmation', from_email='guidance@example.com', to_email=to_email,
+            subject='Appointment', text_body='Hello', attempts=attempts,
+        )
+
+    def test_sent(self):
+        email = self.queue()
+
+        counts = send_batch(claim_batch())
+
+        self.assertEqual(counts, {'sent': 1, 'retry': 0, 'failed': 0})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+        self.assertTrue(email.provider_message_id)
+
+    def test_failed_call_is_retried_with_backoff(self):
+        email = self.queue()
+        self.server.error_rate = 1.0
+
+        before = timezone.now()
+        counts = send_batch(claim_batch())
+
+        self.assertEqual(counts, {'sent': 0, 'retry': 1, 'failed': 0})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('500', email.last_error)
+        delay = (email.next_attempt_at - before).total_seconds()
+        self.assertTrue(RETRY_BASE_SECONDS * 0.8 <= delay <= RETRY_BASE_SECONDS * 1.2 + 5, delay)
+        # Not due again until the backoff has passed
+        self.assertEqual(claim_batch(), [])
+
+    def test_failed_at_max_attempts(self):
+        email = self.queue(attempts=MAX_ATTEMPTS - 1)
+        self.server.error_rate = 1.0
+
+        counts = send_batch(claim_batch())
+
+        self.assertEqual(counts, {'sent': 0, 'retry': 0, 'failed': 1})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.attempts, MAX_ATTEMPTS)
+
+    def test_rejected_message_fails_without_retry(self):
+        good = self.queue()
+        bad = self.queue(to_email='not-an-address')
+
+        counts = send_batch(claim_batch())
+
+        self.assertEqual(counts, {'sent': 1, 'retry': 0, 'failed': 1})
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual(good.status, 'sent')
+        self.assertEqual(bad.status, 'failed')
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn('invalid email address', bad.last_error)
+
+    def test_open_circuit_gives_the_attempt_back(self):
+        self.server.error_rate = 1.0
+        for attempt in range(2):
+            self.queue()
+            send_batch(claim_batch())
+        self.assertTrue(mailjet.circuit_open())
+        email = self.queue()
+        emails = claim_batch()
+        self.assertEqual([claimed.id for claimed in emails], [email.id])
+        calls = self.server.stats['calls']
+
+        counts = send_batch(emails)
+
+        self.assertEqual(counts, {'sent': 0, 'retry': 1, 'failed': 0})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 0)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        # Mailjet was not called
+        self.assertEqual(self.server.stats['calls'], calls)
+
+    def test_html_body_is_escaped(self):
+        counselor = User.objects.create_user('counselor', 'counselor@example.com', first_name='<b>ANA</b>', is_staff=True)
+        student = User.objects.create_user('student', 'student@example.com', first_name='Jo & <i>Co</i>')
+        date = timezone.localdate() + timedelta(days=7)
+        open_slots(counselor, date, [9])
+        appointment = book_timeslot(student, counselor.id, date, 9)
+
+        email = build_appointment_email(student, appointment)
+
+        self.assertNotIn('<b>', email.html_body)
+        self.assertNotIn('<i>', email.html_body)
+        self.assertIn('Jo &amp; &lt;i&gt;Co&lt;/i&gt;', email.html_body)
+        self.assertIn('<br>', email.html_body)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+@override_settings(TIME_ZONE='UTC', COUNSELOR_DIGEST_HOUR=7)
+class CounselorDigestTests(TestCase):
+    def setUp(self):
+        self.daily = self.counselor('daily', 'daily', sent_at=utc(2026, 3, 1, 7))
+        self.hourly = self.counselor('hourly', 'hourly', sent_at=utc(2026, 3, 2, 5))
+
+    def counselor(self, name, email_digest, sent_at=None):
+        user = User.objects.create_user(name, f'{name}@example.com', first_name=name.upper(), is_staff=True)
+        CounselorProfile.objects.create(user=user, email_digest=email_digest, digest_sent_at=sent_at)
+        return user
+
+    def notify(self, counselor, title, created_at):
+        notification = Notification.objects.create(counselor=counselor, title=title, message='Details')
+        Notification.objects.filter(id=notification.id).update(created_at=created_at)
+        return notification
+
+    def digests(self, counselor):
+        return list(OutboxEmail.objects.filter(kind='counselor_digest', to_email=counselor.email).values_list('text_body', flat=True))
+
+    def test_scheduled_times(self):
+        self.assertEqual(digest_scheduled_at('hourly', utc(2026, 3, 2, 6, 59)), utc(2026, 3, 2, 6))
+        self.assertEqual(digest_scheduled_at('daily', utc(2026, 3, 2, 6, 59)), utc(2026, 3, 1, 7))
+        self.assertEqual(digest_scheduled_at('daily', utc(2026, 3, 2, 7)), utc(2026, 3, 2, 7))
+
+    def test_hourly_and_daily_around_digest_hour(self):
+        self.notify(self.daily, 'Before the digest hour', utc(2026, 3, 2, 5, 30))
+        self.notify(self.hourly, 'Hourly item', utc(2026, 3, 2, 5, 30))
+
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 2, 6, 59)), 1)
+        self.assertEqual(len(self.digests(self.hourly)), 1)
+        self.assertEqual(self.digests(self.daily), [])
+
+        # After the digest hour the daily one is due; a notification arriving after 07:00 waits for the next day
+        self.notify(self.daily, 'After the digest hour', utc(2026, 3, 2, 7, 0, 30))
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 2, 7, 1)), 1)
+        [body] = self.digests(self.daily)
+        self.assertIn('Before the digest hour', body)
+        self.assertNotIn('After the digest hour', body)
+        self.assertEqual(len(self.digests(self.hourly)), 1)
+
+        # Running again before the next scheduled time queues nothing
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 2, 7, 30)), 0)
+
+    def test_quiet_period_does_not_send_early(self):
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 2, 7, 5)), 0)
+        self.assertEqual(CounselorProfile.objects.get(user=self.daily).digest_sent_at, utc(2026, 3, 2, 7))
+
+        self.notify(self.daily, 'Quiet day ends', utc(2026, 3, 2, 9))
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 2, 10)), 0)
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 3, 6, 59)), 0)
+
+        self.assertEqual(queue_counselor_digests(utc(2026, 3, 3, 7, 1)), 1)
+        self.assertIn('Quiet day ends', self.digests(self.daily)[0])
+
+    def test_opting_in_does_not_replay_old_notifications(self):
+        counselor = self.counselor('newcomer', 'off')
+        now = timezone.now()
+        self.notify(counselor, 'From before opting in', now - timedelta(days=3))
+        self.client.force_login(counselor)
+
+        self.client.post(reverse('sysadmin:profile'), {
+            'email': counselor.email, 'first_name': 'NEW', 'last_name': 'COMER',
+            'assigned_college': 'College of Computer Studies', 'email_digest': 'daily',
+        })
+
+        profile = CounselorProfile.objects.get(user=counselor)
+        self.assertEqual(profile.email_digest, 'daily')
+        self.notify(counselor, 'After opting in', now + timedelta(minutes=1))
+        next_digest = digest_scheduled_at('daily', now) + timedelta(days=1, minutes=1)
+        queue_counselor_digests(next_digest)
+        [body] = self.digests(counselor)
+        self.assertIn('After opting in', body)
+        self.assertNotIn('From before opting in', body)
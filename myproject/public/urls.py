@@ -11,12 +11,19 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('appointments/', views.appointments, name='appointments'),
+    path('counselors/search/', views.counselor_search, name='counselor_search'),
     path('counselor/<int:counselor_id>/availability/', views.counselor_availability, name='counselor_availability'),
+    path('counselor/<int:counselor_id>/calendar/', views.counselor_calendar, name='counselor_calendar'),
+    path('counselor/<int:counselor_id>/availability/stream/', views.counselor_availability_stream, name='counselor_availability_stream'),
     path('book-appointment/', views.book_appointment, name='book_appointment'),
     path('my-appointments/', views.my_appointments, name='my_appointments'),
     path('cancel-appointment/<int:appointment_id>/', views.cancel_appointment, name='cancel_appointment'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/read-all/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('notifications/clear/', views.clear_notifications, name='clear_notifications'),
     path('profile-picture/<int:user_id>/', views.profile_picture, name='profile_picture'),
+    path('profile-picture/<int:user_id>/<slug:version>/', views.profile_picture, name='profile_picture_versioned'),
     path('profile/', views.profile, name='profile'),
     path('login/', views.login_view, name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='public:home'), name='logout'),
@@ -1,171 +1,393 @@
 from django.core.mail import send_mail
 from django.conf import settings
-from sysadmin.models import Notification
-import threading
+from django.contrib.auth.models import User
+from django.db import transaction, IntegrityError
+from django.contrib import messages
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import url_has_allowed_host_and_scheme
+from sysadmin.events import publish_availability_change
+from sysadmin.models import Notification, Timeslot, DayAvailability
+from sysadmin.utils import SLOT_HOURS, slot_bit, claim_slot, materialize_days, get_counselor_profile
+from .models import Appointment, IdempotencyKey, StudentNotification, OutboxEmail, ACTIVE_STATUSES
+from datetime import time, timedelta
+from functools import wraps
+import json
 
 
-def _send_email_sync(user, appointment, subject, message, from_email):
-    """Internal function to send email synchronously using Mailjet API"""
+class BookingError(Exception):
+    """Raised when a timeslot cannot be booked (taken, closed or unknown)."""
+
+
+def book_timeslot(student, counselor_id, slot_date, hour, program=''):
+    """
+    Book a counselor's timeslot for a student in a single transaction.
+
+    The slot is claimed with one conditional UPDATE on the counselor's
+    DayAvailability row that clears its bit only if it is still set, so of
+    several concurrent bookings exactly one wins. The partial unique constraint
+    on Appointment rejects any double booking that slips past the claim.
+    Returns the created Appointment or raises BookingError.
+    """
+    unavailable_msg = 'This time slot is no longer available.'
+    if hour not in SLOT_HOURS:
+        raise BookingError(unavailable_msg)
+
     try:
-        print(f"[EMAIL THREAD] Attempting to send email to {user.email} via Mailjet API")
-        
-        # Check if Mailjet is configured
-        mailjet_api_key = getattr(settings, 'MAILJET_API_KEY', '')
-        mailjet_api_secret = getattr(settings, 'MAILJET_API_SECRET', '')
-        
-        if not mailjet_api_key or not mailjet_api_secret:
-            print(f"[EMAIL THREAD] ERROR: Mailjet API credentials not configured")
-            print(f"[EMAIL THREAD] Please set MAILJET_API_KEY and MAILJET_API_SECRET environment variables")
-            return False
-        
-        # Get from email address and name from settings
-        from_email_address = getattr(settings, 'FROM_EMAIL_ADDRESS', 'powerpuffgirls6112@gmail.com')
-        from_email_name = getattr(settings, 'FROM_EMAIL_NAME', 'CHMSU Guidance Connect')
-        
-        # Extract email from from_email if it has display name format
-        if '<' in from_email and '>' in from_email:
-            from_email_address = from_email.split('<')[1].split('>')[0].strip()
-        elif '@' in from_email:
-            from_email_address = from_email
-        
-        print(f"[EMAIL THREAD] From: {from_email_name} <{from_email_address}>, To: {user.email}, Subject: {subject}")
-        
-        try:
-            from mailjet_rest import Client
-            
-            # Initialize Mailjet client
-            mailjet = Client(auth=(mailjet_api_key, mailjet_api_secret), version='v3.1')
-            
-            # Prepare email data
-            email_data = {
-                'Messages': [{
-                    'From': {
-                        'Email': from_email_address,
-                        'Name': from_email_name
-                    },
-                    'To': [{
-                        'Email': user.email,
-                        'Name': user.get_full_name() or user.username or 'Student'
-                    }],
-                    'Subject': subject,
-                    'TextPart': message,
-                    'HTMLPart': message.replace('\n', '<br>')  # Simple HTML conversion
-                }]
+        counselor = User.objects.get(id=counselor_id, is_staff=True)
+    except User.DoesNotExist:
+        raise BookingError('Counselor not found.')
+
+    try:
+        with transaction.atomic():
+            if not claim_slot(counselor, slot_date, hour):
+                raise BookingError(unavailable_msg)
+
+            timeslot, created = Timeslot.objects.get_or_create(
+                user=counselor,
+                date=slot_date,
+                start_time=time(hour, 0),
+            )
+
+            appointment = Appointment.objects.create(
+                student=student,
+                counselor=counselor,
+                timeslot=timeslot,
+                program=program,
+                status='pending'
+            )
+    except IntegrityError:
+        # Another transaction holds an active appointment on this timeslot
+        raise BookingError(unavailable_msg)
+
+    return appointment
+
+
+# How many days ahead reschedule_day looks for free slots
+RESCHEDULE_SEARCH_DAYS = 14
+
+
+def reschedule_day(counselor, the_date, target_counselor=None, search_days=RESCHEDULE_SEARCH_DAYS):
+    """
+    Move all of a counselor's active appointments on a date and close that date.
+
+    Without a target, each appointment goes to the counselor's earliest free
+    slot from the next day on. With a target counselor, it goes to the target's
+    earliest free slot at or after its original time. Everything happens in
+    one transaction. The affected day rows are locked and written with
+    bulk_update, the appointments are written with bulk_update, and the
+    notifications and the students' emails are written with bulk_create.
+    The student and the counselor who now has the appointment are notified;
+    with a target counselor, so is the counselor who lost it.
+
+    Returns one dict per appointment with appointment_id, student, from, to
+    and moved. Unmoved appointments keep their slot and carry a reason.
+    """
+    target = target_counselor or counselor
+    now = timezone.localtime()
+    if target.pk == counselor.pk:
+        earliest = (the_date + timedelta(days=1), 0)
+    else:
+        earliest = None
+    search_start = max(the_date if earliest is None else earliest[0], now.date())
+    search_dates = [search_start + timedelta(days=offset) for offset in range(search_days)]
+
+    with transaction.atomic():
+        appointments = list(
+            Appointment.objects.select_for_update(of=('self',)).filter(
+                counselor=counselor,
+                timeslot__date=the_date,
+                status__in=ACTIVE_STATUSES,
+            ).select_related('timeslot', 'student').order_by('timeslot__start_time')
+        )
+
+        # The counselor is out on this date: close it
+        materialize_days(counselor, [the_date])
+        materialize_days(target, search_dates)
+        days = {
+            (day.user_id, day.date): day
+            for day in DayAvailability.objects.select_for_update().filter(
+                user__in={counselor.pk, target.pk},
+                date__in=set(search_dates) | {the_date},
+            )
+        }
+        source_day = days[(counselor.pk, the_date)]
+        source_day.slots = 0
+        source_day.overridden = True
+        changed_days = {source_day.pk: source_day}
+
+        moves = []
+        outcomes = []
+        for appointment in appointments:
+            old_slot = appointment.timeslot
+            outcome = {
+                'appointment_id': appointment.id,
+                'student': appointment.student.get_full_name() or appointment.student.username,
+                'from': f"{old_slot.date.strftime('%Y-%m-%d')} {old_slot.start_time.strftime('%H:%M')}",
+                'to': None,
+                'moved': False,
             }
-            
-            print(f"[EMAIL THREAD] Sending email via Mailjet API...")
-            result = mailjet.send.create(data=email_data)
-            
-            # Check response
-            if result.status_code == 200:
-                response_data = result.json()
-                print(f"[EMAIL THREAD] Mailjet API response: {response_data}")
-                
-                # Mailjet v3.1 API returns messages in 'Messages' array
-                if 'Messages' in response_data and len(response_data['Messages']) > 0:
-                    message_status = response_data['Messages'][0]
-                    
-                    # Check if message was sent successfully
-                    # Mailjet returns 'To' array with message details
-                    if 'To' in message_status and len(message_status['To']) > 0:
-                        to_status = message_status['To'][0]
-                        if 'MessageID' in to_status or 'MessageUUID' in to_status:
-                            message_id = to_status.get('MessageID') or to_status.get('MessageUUID', 'N/A')
-                            print(f"SUCCESS: Email sent successfully to {user.email} via Mailjet")
-                            print(f"[EMAIL THREAD] Mailjet MessageID: {message_id}")
-                            return True
-                        else:
-                            # Check for errors in the To array
-                            if 'Errors' in to_status:
-                                print(f"WARNING: Mailjet returned errors: {to_status['Errors']}")
-                                return False
-                    
-                    # Fallback: check for errors at message level
-                    if 'Errors' in message_status and len(message_status['Errors']) > 0:
-                        print(f"WARNING: Mailjet returned errors: {message_status['Errors']}")
-                        return False
-                    
-                    # If we have Messages but no clear success indicator, assume success
-                    print(f"SUCCESS: Email sent successfully to {user.email} via Mailjet (status code 200)")
-                    return True
-                else:
-                    print(f"WARNING: Unexpected Mailjet response format: {response_data}")
-                    return False
+            start = earliest or (the_date, old_slot.start_time.hour)
+            new_slot = None
+            for slot_date in search_dates:
+                day = days[(target.pk, slot_date)]
+                for hour in SLOT_HOURS:
+                    if (slot_date, hour) < start or (slot_date == now.date() and hour <= now.hour):
+                        continue
+                    if day.slots & slot_bit(hour):
+                        new_slot = (slot_date, hour)
+                        day.slots &= ~slot_bit(hour)
+                        changed_days[day.pk] = day
+                        break
+                if new_slot:
+                    break
+
+            if new_slot is None:
+                outcome['reason'] = f'No free slot in the next {search_days} days.'
             else:
-                print(f"ERROR: Mailjet API returned status code {result.status_code}")
-                try:
-                    error_data = result.json()
-                    print(f"[EMAIL THREAD] Error response: {error_data}")
-                except:
-                    print(f"[EMAIL THREAD] Response text: {result.text}")
-                return False
-                
-        except ImportError:
-            print(f"[EMAIL THREAD] ERROR: mailjet-rest package not installed")
-            print(f"[EMAIL THREAD] Please install it: pip install mailjet-rest")
-            return False
-        except Exception as mailjet_error:
-            error_msg = str(mailjet_error)
-            print(f"[EMAIL THREAD] EXCEPTION during Mailjet API call: {error_msg}")
-            import traceback
-            print(f"[EMAIL THREAD] Traceback: {traceback.format_exc()}")
-            return False
-        
-    except Exception as send_error:
-        print(f"[EMAIL THREAD] EXCEPTION in _send_email_sync: {str(send_error)}")
-        import traceback
-        print(f"[EMAIL THREAD] Traceback: {traceback.format_exc()}")
-        return False
+                moves.append((appointment, new_slot))
+                outcome['to'] = f"{new_slot[0].strftime('%Y-%m-%d')} {new_slot[1]:02d}:00"
+                outcome['moved'] = True
+            outcomes.append(outcome)
+
+        updated_at = timezone.now()
+        for day in changed_days.values():
+            day.updated_at = updated_at
+        DayAvailability.objects.bulk_update(list(changed_days.values()), ['slots', 'overridden', 'updated_at'])
+
+        if moves:
+            # Anchor rows for the new slots: one read, one insert for the missing ones
+            wanted = {(slot_date, time(hour, 0)) for appointment, (slot_date, hour) in moves}
+            existing = {
+                (timeslot.date, timeslot.start_time): timeslot
+                for timeslot in Timeslot.objects.filter(user=target, date__in={d for d, t in wanted})
+            }
+            Timeslot.objects.bulk_create([
+                Timeslot(user=target, date=slot_date, start_time=start_time)
+                for slot_date, start_time in wanted if (slot_date, start_time) not in existing
+            ], ignore_conflicts=True)
+            timeslots = {
+                (timeslot.date, timeslot.start_time): timeslot
+                for timeslot in Timeslot.objects.filter(user=target, date__in={d for d, t in wanted})
+            }
+
+            # When the appointments go to another counselor, tell the counselor who loses them,
+            # with the date and time they had in that counselor's calendar
+            source_notifications = []
+            if target.pk != counselor.pk:
+                target_name = target.get_full_name() or target.username
+                for appointment, new_slot in moves:
+                    notification = build_counselor_notification(counselor, appointment, 'appointment_rescheduled')
+                    notification.message += f'\nMoved to: {target_name}'
+                    source_notifications.append(notification)
+
+            for appointment, (slot_date, hour) in moves:
+                appointment.timeslot = timeslots[(slot_date, time(hour, 0))]
+                appointment.counselor = target
+                appointment.status = 'pending'  # Reset to pending for confirmation
+                appointment.updated_at = updated_at
+            moved = [appointment for appointment, new_slot in moves]
+            Appointment.objects.bulk_update(moved, ['timeslot', 'counselor', 'status', 'updated_at'])
+
+            Notification.objects.bulk_create(source_notifications + [
+                build_counselor_notification(target, appointment, 'appointment_rescheduled')
+                for appointment in moved
+            ])
+            StudentNotification.objects.bulk_create([
+                build_student_notification(appointment, 'appointment_rescheduled')
+                for appointment in moved
+            ])
+            queue_appointment_emails(moved, rescheduled=True)
+
+        publish_availability_change(counselor, [the_date])
+        publish_availability_change(target, search_dates)
+
+    return outcomes
+
+
+# How long a stored response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# How long a running request holds its key; after that (worker crash, timeout) a repeat may take it over
+IDEMPOTENCY_IN_FLIGHT_LEASE = timedelta(seconds=60)
+
 
+def _replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type or None)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
 
-def send_appointment_confirmation_email(user, appointment, async_send=True):
+
+def idempotent(view):
     """
-    Send a confirmation email to the user about their appointment.
-    If async_send=True, sends email in background thread (non-blocking).
-    Returns True if email sending was initiated, False if validation fails.
+    Make a POST view safe to retry by sending an Idempotency-Key header or an
+    idempotency_key form field.
+
+    The first request with a key runs the view and, if it succeeded, stores
+    its response; a repeat from the same user within IDEMPOTENCY_KEY_TTL gets
+    the stored response back after a single indexed lookup. Failures (4xx/5xx,
+    {"success": false}, or an error message added by the view) are not
+    stored, so the request can be retried with the same key. A repeat that arrives while the first is
+    still running gets 409, unless the first has held the key for longer than
+    IDEMPOTENCY_IN_FLIGHT_LEASE; then the repeat takes the key over and runs.
+    Callers that are not XHR get a redirect with a message instead of JSON.
     """
-    try:
-        # Validate user has email
-        if not user.email:
-            print(f"ERROR: User {user.username} (ID: {user.id}) does not have an email address")
-            print(f"       Cannot send appointment confirmation email")
-            return False
-        
-        print(f"Attempting to send email to {user.email} for user {user.username}")
-        
-        # Get appointment details safely
-        counselor_name = appointment.counselor.get_full_name() or appointment.counselor.username or 'Counselor'
-        
-        # Safely get timeslot details
-        if appointment.timeslot:
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return _key_error(request, 'Idempotency key is too long.', 400)
+
+        cutoff = timezone.now() - IDEMPOTENCY_KEY_TTL
+        record = IdempotencyKey.objects.filter(user=request.user, key=key, created_at__gte=cutoff).first()
+        if record is None:
             try:
-                date_str = appointment.timeslot.date.strftime('%B %d, %Y')
-                time_str = appointment.timeslot.start_time.strftime('%I:%M %p')
-            except Exception as e:
-                print(f"Error formatting timeslot: {str(e)}")
-                date_str = 'TBD'
-                time_str = 'TBD'
-        else:
+                with transaction.atomic():
+                    # Expired keys of this user are dropped so they can be reused
+                    IdempotencyKey.objects.filter(user=request.user, created_at__lt=cutoff).delete()
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, path=request.path)
+            except IntegrityError:
+                # A concurrent request with the same key got there first
+                record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+                if record is None:
+                    return view(request, *args, **kwargs)
+            else:
+                return _run_and_store(record, view, request, *args, **kwargs)
+
+        if record.path != request.path:
+            return _key_error(request, 'Idempotency key was already used for another request.', 422)
+        if record.status_code is None:
+            now = timezone.now()
+            if record.created_at < now - IDEMPOTENCY_IN_FLIGHT_LEASE:
+                # The first request died or timed out; only one repeat wins the takeover
+                taken = IdempotencyKey.objects.filter(
+                    id=record.id, status_code__isnull=True, created_at=record.created_at,
+                ).update(created_at=now)
+                if taken:
+                    record.created_at = now
+                    return _run_and_store(record, view, request, *args, **kwargs)
+            return _key_error(request, 'Your previous request is still being processed. Please wait a moment.', 409)
+        return _replay(record)
+
+    return wrapper
+
+
+def _is_xhr(request):
+    return (
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.content_type == 'application/json'
+        or 'application/json' in request.headers.get('Accept', '')
+    )
+
+
+def _key_error(request, message, status):
+    """JSON error for scripts; a plain form post goes back to its page with the message."""
+    if _is_xhr(request):
+        return JsonResponse({'success': False, 'error': message}, status=status)
+    messages.warning(request, message)
+    referer = request.headers.get('Referer', '')
+    if not url_has_allowed_host_and_scheme(referer, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        referer = '/'
+    return HttpResponseRedirect(referer)
+
+
+def _error_message_count(request):
+    """Error messages waiting for the user, read without marking them as shown."""
+    storage = messages.get_messages(request)
+    levels = [message.level for message in storage]
+    if hasattr(storage, 'used'):
+        storage.used = False
+    return sum(1 for level in levels if level >= messages.ERROR)
+
+
+def _succeeded(request, response, errors_before=0):
+    """Whether a response is a success worth replaying, rather than an error the caller may retry."""
+    if response.status_code >= 400 or response.streaming:
+        return False
+    if 'application/json' in response.get('Content-Type', ''):
+        try:
+            if json.loads(response.content).get('success') is False:
+                return False
+        except (ValueError, AttributeError):
+            pass
+    # Form views report errors with messages.error and a redirect
+    return _error_message_count(request) <= errors_before
+
+
+def _run_and_store(record, view, request, *args, **kwargs):
+    errors_before = _error_message_count(request)
+    try:
+        response = view(request, *args, **kwargs)
+    except Exception:
+        record.delete()
+        raise
+
+    if not _succeeded(request, response, errors_before):
+        record.delete()
+        return response
+
+    record.status_code = response.status_code
+    record.content_type = response.get('Content-Type', '')
+    record.location = response.get('Location', '')
+    record.body = response.content
+    record.save(update_fields=['status_code', 'content_type', 'location', 'body'])
+    return response
+
+
+def build_appointment_email(user, appointment, rescheduled=False):
+    """
+    Return an unsaved OutboxEmail telling the student about their appointment,
+    or None if they have no email address. rescheduled=True tells the student
+    their appointment was moved.
+    """
+    if not user.email:
+        print(f"ERROR: User {user.username} (ID: {user.id}) does not have an email address")
+        print(f"       Cannot send appointment confirmation email")
+        return None
+
+    # Get appointment details safely
+    counselor_name = appointment.counselor.get_full_name() or appointment.counselor.username or 'Counselor'
+
+    # Safely get timeslot details
+    if appointment.timeslot:
+        try:
+            date_str = appointment.timeslot.date.strftime('%B %d, %Y')
+            time_str = appointment.timeslot.start_time.strftime('%I:%M %p')
+        except Exception as e:
+            print(f"Error formatting timeslot: {str(e)}")
             date_str = 'TBD'
             time_str = 'TBD'
-        
-        # Get status display safely
-        try:
-            status_display = appointment.get_status_display()
-        except Exception:
-            status_display = appointment.status.title()
-        
-        # Different subject and message based on appointment status
-        if appointment.status == 'confirmed':
-            subject = f'Appointment Confirmed - {counselor_name}'
-            status_message = 'Your appointment has been confirmed by your counselor!'
-        else:
-            subject = f'Appointment Booking - {counselor_name}'
-            status_message = 'Your appointment has been booked successfully!'
-        
-        user_name = user.get_full_name() or user.username or 'Student'
-        
-        message = f"""Hello {user_name},
+    else:
+        date_str = 'TBD'
+        time_str = 'TBD'
+
+    # Get status display safely
+    try:
+        status_display = appointment.get_status_display()
+    except Exception:
+        status_display = appointment.status.title()
+
+    # Different subject and message based on appointment status
+    if rescheduled:
+        kind = 'appointment_rescheduled'
+        subject = f'Appointment Rescheduled - {counselor_name}'
+        status_message = 'Your appointment has been moved to a new time.'
+    elif appointment.status == 'confirmed':
+        kind = 'appointment_confirmed'
+        subject = f'Appointment Confirmed - {counselor_name}'
+        status_message = 'Your appointment has been confirmed by your counselor!'
+    else:
+        kind = 'appointment_booked'
+        subject = f'Appointment Booking - {counselor_name}'
+        status_message = 'Your appointment has been booked successfully!'
+
+    user_name = user.get_full_name() or user.username or 'Student'
+
+    message = f"""Hello {user_name},
 
 {status_message}
 
@@ -178,47 +400,78 @@ Please check your appointments page for more details.
 
 Thank you,
 CHMSU Guidance Connect""".strip()
-        
-        # Extract email address from DEFAULT_FROM_EMAIL if it has display name format
-        from_email = getattr(settings, 'EMAIL_HOST_USER', 'powerpuffgirls6112@gmail.com')
-        if hasattr(settings, 'DEFAULT_FROM_EMAIL'):
-            # Extract email from format like "Name <email@example.com>" or just "email@example.com"
-            default_from = settings.DEFAULT_FROM_EMAIL
-            if '<' in default_from and '>' in default_from:
-                # Extract email from "Name <email@example.com>"
-                from_email = default_from.split('<')[1].split('>')[0].strip()
-            elif '@' in default_from:
-                # It's already just an email address
-                from_email = default_from
-        
-        # Send email (asynchronously to avoid blocking the request)
-        print(f"Sending email - From: {from_email}, To: {user.email}, Subject: {subject}")
-        print(f"Using Mailjet API for email delivery")
-        
-        if async_send:
-            # Send email in background thread to avoid blocking
-            print(f"Starting email send in background thread for {user.email}")
-            email_thread = threading.Thread(
-                target=_send_email_sync,
-                args=(user, appointment, subject, message, from_email),
-                daemon=True  # Daemon thread so it doesn't prevent app shutdown
-            )
-            email_thread.start()
-            print(f"Email thread started for {user.email} (non-blocking)")
-            return True  # Return True immediately since we started the thread
-        else:
-            # Send synchronously (for testing)
-            return _send_email_sync(user, appointment, subject, message, from_email)
-            
-    except Exception as e:
-        # Log error but don't break the flow
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"ERROR sending email to {user.email if hasattr(user, 'email') and user.email else 'unknown'}: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Full traceback:")
-        print(f"{error_details}")
-        return False
+
+    return OutboxEmail(
+        kind=kind,
+        appointment=appointment,
+        from_email=getattr(settings, 'FROM_EMAIL_ADDRESS', 'powerpuffgirls6112@gmail.com'),
+        from_name=getattr(settings, 'FROM_EMAIL_NAME', 'CHMSU Guidance Connect'),
+        to_email=user.email,
+        to_name=user_name,
+        subject=subject,
+        text_body=message,
+        html_body=escape(message).replace('\n', '<br>'),
+    )
+
+
+def queue_appointment_email(user, appointment, rescheduled=False):
+    """
+    Put an appointment email in the outbox; send_outbox_emails sends it.
+    Call it inside the transaction that changes the appointment, so the email
+    exists if and only if the change does. Returns the OutboxEmail or None.
+    """
+    email = build_appointment_email(user, appointment, rescheduled=rescheduled)
+    if email is None:
+        return None
+    email.save()
+    print(f"Email queued for {email.to_email}: {email.subject}")
+    return email
+
+
+def queue_appointment_emails(appointments, rescheduled=False):
+    """Put one email per appointment's student in the outbox with a single INSERT."""
+    emails = [build_appointment_email(appointment.student, appointment, rescheduled=rescheduled) for appointment in appointments]
+    emails = OutboxEmail.objects.bulk_create([email for email in emails if email is not None])
+    print(f"Emails queued for {len(emails)} appointment(s)")
+    return emails
+
+
+def build_counselor_notification(counselor, appointment, notification_type):
+    """Return an unsaved Notification for the counselor about an appointment event."""
+    # Map notification types to titles and messages
+    notification_titles = {
+        'appointment_booked': 'New Appointment Booked',
+        'appointment_confirmed': 'Appointment Confirmed',
+        'appointment_cancelled': 'Appointment Cancelled',
+        'appointment_rescheduled': 'Appointment Rescheduled',
+        'appointment_reminder': 'Appointment Reminder',
+    }
+    
+    notification_messages = {
+        'appointment_booked': f'Student {appointment.student.get_full_name() or appointment.student.username} has booked an appointment with you.',
+        'appointment_confirmed': f'Your appointment with {appointment.student.get_full_name() or appointment.student.username} has been confirmed.',
+        'appointment_cancelled': f'Appointment with {appointment.student.get_full_name() or appointment.student.username} has been cancelled.',
+        'appointment_rescheduled': f'Appointment with {appointment.student.get_full_name() or appointment.student.username} has been rescheduled.',
+        'appointment_reminder': f'Reminder: You have an appointment with {appointment.student.get_full_name() or appointment.student.username} coming up.',
+    }
+    
+    title = notification_titles.get(notification_type, 'Appointment Update')
+    message = notification_messages.get(notification_type, 'You have an appointment update.')
+    
+    # Add appointment details to message if timeslot exists
+    if appointment.timeslot:
+        date_str = appointment.timeslot.date.strftime('%B %d, %Y')
+        time_str = appointment.timeslot.start_time.strftime('%I:%M %p')
+        message += f'\n\nDate: {date_str}\nTime: {time_str}'
+    
+    return Notification(
+        counselor=counselor,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        appointment=appointment,
+        is_read=False
+    )
 
 
 def create_counselor_notification(counselor, appointment, notification_type):
@@ -227,45 +480,52 @@ def create_counselor_notification(counselor, appointment, notification_type):
     Returns the created Notification object or None if creation fails.
     """
     try:
-        # Map notification types to titles and messages
-        notification_titles = {
-            'appointment_booked': 'New Appointment Booked',
-            'appointment_confirmed': 'Appointment Confirmed',
-            'appointment_cancelled': 'Appointment Cancelled',
-            'appointment_rescheduled': 'Appointment Rescheduled',
-            'appointment_reminder': 'Appointment Reminder',
-        }
-        
-        notification_messages = {
-            'appointment_booked': f'Student {appointment.student.get_full_name() or appointment.student.username} has booked an appointment with you.',
-            'appointment_confirmed': f'Your appointment with {appointment.student.get_full_name() or appointment.student.username} has been confirmed.',
-            'appointment_cancelled': f'Appointment with {appointment.student.get_full_name() or appointment.student.username} has been cancelled.',
-            'appointment_rescheduled': f'Appointment with {appointment.student.get_full_name() or appointment.student.username} has been rescheduled.',
-            'appointment_reminder': f'Reminder: You have an appointment with {appointment.student.get_full_name() or appointment.student.username} coming up.',
-        }
-        
-        title = notification_titles.get(notification_type, 'Appointment Update')
-        message = notification_messages.get(notification_type, 'You have an appointment update.')
-        
-        # Add appointment details to message if timeslot exists
-        if appointment.timeslot:
-            date_str = appointment.timeslot.date.strftime('%B %d, %Y')
-            time_str = appointment.timeslot.start_time.strftime('%I:%M %p')
-            message += f'\n\nDate: {date_str}\nTime: {time_str}'
-        
-        # Create notification
-        notification = Notification.objects.create(
-            counselor=counselor,
-            title=title,
-            message=message,
-            notification_type=notification_type,
-            appointment=appointment,
-            is_read=False
-        )
-        
+        notification = build_counselor_notification(counselor, appointment, notification_type)
+        notification.save()
         return notification
     except Exception as e:
         # Log error but don't break the flow
         print(f"Error creating notification: {str(e)}")
         return None
 
+
+def build_student_notification(appointment, notification_type):
+    """Return an unsaved StudentNotification about an event on one of the student's appointments."""
+    counselor = appointment.counselor
+    counselor_name = counselor.get_full_name() or counselor.username
+    counselor_title = get_counselor_profile(counselor).title or 'Guidance Counselor'
+    date_str = appointment.timeslot.date.strftime('%B %d, %Y') if appointment.timeslot else 'a date to be set'
+    time_str = appointment.timeslot.start_time.strftime('%I:%M %p') if appointment.timeslot else 'a time to be set'
+    with_counselor = f'{counselor_name} ({counselor_title})'
+
+    notification_messages = {
+        'appointment_pending': f'Your appointment request with {with_counselor} for {date_str} at {time_str} is awaiting confirmation.',
+        'appointment_confirmed': f'Your appointment with {with_counselor} has been confirmed for {date_str} at {time_str}.',
+        'appointment_cancelled': f'Your appointment with {with_counselor} scheduled for {date_str} at {time_str} has been cancelled.',
+        'appointment_rescheduled': f'Your appointment has been moved to {date_str} at {time_str} with {with_counselor} and is awaiting confirmation.',
+        'appointment_completed': f'Your counseling session with {with_counselor} has been completed. Thank you for using our services.',
+    }
+
+    return StudentNotification(
+        student=appointment.student,
+        appointment=appointment,
+        notification_type=notification_type,
+        title=dict(StudentNotification.NOTIFICATION_TYPES).get(notification_type, 'Appointment Update'),
+        message=notification_messages.get(notification_type, 'You have an appointment update.'),
+        is_read=False,
+    )
+
+
+def create_student_notification(appointment, notification_type):
+    """
+    Create a notification for the student about an appointment event.
+    Returns the created StudentNotification object or None if creation fails.
+    """
+    try:
+        notification = build_student_notification(appointment, notification_type)
+        notification.save()
+        return notification
+    except Exception as e:
+        # Log error but don't break the flow
+        print(f"Error creating student notification: {str(e)}")
+        return None
@@ -3,11 +3,22 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest, Http404
 from django.utils import timezone
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
 from datetime import datetime, date, time
-from .models import UserProfile, Appointment
+import asyncio
+import json
+from .models import UserProfile, Appointment, StudentNotification
+from .utils import idempotent
 from sysadmin.models import Timeslot
+from sysadmin.events import hub
+from sysadmin.utils import (
+    get_day_slots, get_calendar_slots, release_timeslot, get_counselor_directory, search_counselors,
+    get_counselor_profile,
+)
+from sysadmin.avatars import save_profile_image, serve_profile_image, profile_image_url, validate_profile_image, InvalidImageError
 
 
 def home(request):
@@ -99,13 +110,13 @@ def signup(request):
             context['error'] = 'You must agree to the Terms of Services and Privacy Policy to continue.'
             return render(request, 'public/registration.html', context)
 
-        # Validate profile picture size (2 MB limit)
+        # Validate profile picture (size, type and dimensions) before reading it
         if profile_picture:
-            max_size = 2 * 1024 * 1024  # 2 MB in bytes
-            if profile_picture.size > max_size:
-                size_mb = profile_picture.size / (1024 * 1024)
-                context['error'] = f'Profile picture is too large ({size_mb:.2f} MB). Maximum allowed size is 2 MB.'
-            return render(request, 'public/registration.html', context)
+            try:
+                validate_profile_image(profile_picture)
+            except InvalidImageError as e:
+                context['error'] = str(e)
+                return render(request, 'public/registration.html', context)
 
         # Check uniqueness
         if User.objects.filter(username=studentid).exists():
@@ -136,14 +147,7 @@ def signup(request):
 
             # Process profile picture if uploaded
             if profile_picture:
-                image_binary = profile_picture.read()
-                from django.db import connection
-                from psycopg2 import Binary
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE auth_user SET image_data = %s WHERE id = %s",
-                        [Binary(image_binary), user.id]
-            )
+                save_profile_image(user, profile_picture)
 
             # Create profile
             profile = UserProfile.objects.create(
@@ -192,64 +196,42 @@ def appointments(request):
     except UserProfile.DoesNotExist:
         student_college = None
     
-    counselors = User.objects.filter(is_staff=True, is_active=True)
-    
-    # Add counselor information from User model using raw SQL and filter by college
-    from django.db import connection
-    counselors_with_profiles = []
-    for counselor in counselors:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT middle_initial, assigned_college, title, bio FROM auth_user WHERE id = %s", [counselor.id])
-            row = cursor.fetchone()
-            middle_initial = row[0] if row[0] else ''
-            assigned_college = row[1] if row[1] else ''
-            title = row[2] if row[2] else ''
-            bio = row[3] if row[3] else ''
-        
-        # Filter counselors by college:
-        # - Only show counselors who have an assigned_college set
-        # - If student has a college, show only counselors with matching assigned_college
-        # - If student has no college, show all counselors with assigned_college
-        # - Exclude counselors without assigned_college (empty/null)
-        assigned_college = assigned_college.strip() if assigned_college else ''
-        
-        if not assigned_college:
-            # Skip counselors without assigned_college
-            continue
-        
-        if student_college:
-            # Student has a college - only show counselors with matching assigned_college
-            # Compare case-insensitively and trim whitespace
-            student_college_clean = student_college.strip() if student_college else ''
-            if assigned_college.lower() != student_college_clean.lower():
-                continue
-        
-        # Helper function to get full name with middle initial
-        def get_full_name_with_mi(user, mi):
-            if mi:
-                return f"{user.first_name} {mi}. {user.last_name}"
-            return f"{user.first_name} {user.last_name}"
-        
-        counselor_data = {
-            'id': counselor.id,
-            'username': counselor.username,
-            'name': get_full_name_with_mi(counselor, middle_initial),
-            'title': title,
-            'assigned_college': assigned_college,
-            'has_profile': bool(title or bio)
-        }
-        counselors_with_profiles.append(counselor_data)
-    
     context = {
-        'counselors': counselors_with_profiles,
+        'counselors': get_counselor_directory(student_college),
     }
     return render(request, 'public/appointment.html', context)
 
 
+@login_required
+def counselor_search(request):
+    """Search the counselors the student can book by name, title, college or bio"""
+    query = request.GET.get('q', '').strip()[:100]
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    
+    # Same scope as the booking page: a student with a college only finds its counselors
+    student_college = UserProfile.objects.filter(user=request.user).values_list('college', flat=True).first()
+    results, has_more = search_counselors(query, student_college, page)
+    
+    return JsonResponse({
+        'query': query,
+        'page': page,
+        'results': results,
+        'has_more': has_more,
+    })
+
+
 @login_required
 def counselor_availability(request, counselor_id):
     """Display counselor availability for a specific date"""
-    counselor = get_object_or_404(User, id=counselor_id, is_staff=True)
+    # Profile and picture metadata come in the same query; the image bytes live in another table
+    counselor = get_object_or_404(
+        User.objects.select_related('counselor_profile', 'profile_image'),
+        id=counselor_id,
+        is_staff=True,
+    )
     
     # Parse the date parameter
     date_str = request.GET.get('date')
@@ -261,61 +243,19 @@ def counselor_availability(request, counselor_id):
     else:
         selected_date = timezone.now().date()
     
-    # Define only the 8 specific timeslots
-    time_slots = [
-        (8, '8:00 AM - 9:00 AM'),
-        (9, '9:00 AM - 10:00 AM'),
-        (10, '10:00 AM - 11:00 AM'),
-        (11, '11:00 AM - 12:00 PM'),
-        (13, '1:00 PM - 2:00 PM'),
-        (14, '2:00 PM - 3:00 PM'),
-        (15, '3:00 PM - 4:00 PM'),
-        (16, '4:00 PM - 5:00 PM'),
-    ]
+    # Read existing timeslots in one query; missing hours are not available
+    slots = get_day_slots(counselor, selected_date)
     
-    slots = []
-    for hour, label in time_slots:
-        slot_time = time(hour=hour, minute=0)
-        ts, created = Timeslot.objects.get_or_create(
-            user=counselor, 
-            date=selected_date, 
-            start_time=slot_time, 
-            defaults={'available': False}
-        )
-        slots.append({
-            'hour': hour,
-            'label': label,
-            'available': ts.available,
-        })
+    profile = get_counselor_profile(counselor)
     
-    # Get counselor information from User model using raw SQL
-    from django.db import connection
-    from django.urls import reverse
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT middle_initial, assigned_college, title, bio, image_data FROM auth_user WHERE id = %s", [counselor.id])
-        row = cursor.fetchone()
-        middle_initial = row[0] if row[0] else ''
-        assigned_college = row[1] if row[1] else ''
-        title = row[2] if row[2] else ''
-        bio = row[3] if row[3] else ''
-        has_image = row[4] is not None
-    
-    # Helper function to get full name with middle initial
-    def get_full_name_with_mi(user, mi):
-        if mi:
-            return f"{user.first_name} {mi}. {user.last_name}"
-        return f"{user.first_name} {user.last_name}"
-    
-    # Generate profile picture URL if image exists
-    profile_picture_url = None
-    if has_image:
-        profile_picture_url = reverse('public:profile_picture', args=[counselor.id])
+    # None if the counselor has no picture; the page shows initials instead
+    profile_picture_url = profile_image_url(counselor.id, 'medium', 'public')
     
     counselor_info = {
         'id': counselor.id,
-        'name': get_full_name_with_mi(counselor, middle_initial),
-        'title': title,
-        'bio': bio,
+        'name': profile.full_name,
+        'title': profile.title,
+        'bio': profile.bio,
         'profile_picture': profile_picture_url,
     }
     
@@ -327,9 +267,98 @@ def counselor_availability(request, counselor_id):
     })
 
 
+# Longest date range the calendar endpoint returns in one response
+CALENDAR_MAX_DAYS = 31
+
+
 @login_required
+def counselor_calendar(request, counselor_id):
+    """Return a counselor's slot availability for a range of dates in one response"""
+    counselor = get_object_or_404(User.objects.only('id'), id=counselor_id, is_staff=True)
+    
+    # Parse the start date and number of days (default: two weeks from today)
+    start_str = request.GET.get('start')
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else timezone.now().date()
+    except ValueError:
+        start_date = timezone.now().date()
+    
+    try:
+        days = int(request.GET.get('days', 14))
+    except ValueError:
+        days = 14
+    days = max(1, min(days, CALENDAR_MAX_DAYS))
+    
+    calendar = get_calendar_slots(counselor, start_date, days)
+    
+    return JsonResponse({
+        'counselor_id': counselor.id,
+        'start': calendar[0]['date'],
+        'end': calendar[-1]['date'],
+        'days': calendar,
+    })
+
+
+# How long one availability stream stays open before the browser reconnects,
+# and how often a keep-alive comment is sent while nothing changes
+STREAM_MAX_SECONDS = 300
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@login_required
+async def counselor_availability_stream(request, counselor_id):
+    """Push a counselor's slots for one date as Server-Sent Events whenever they change.
+
+    Served by the ASGI entry point, where an open stream only costs an idle
+    coroutine instead of a whole worker.
+    """
+    date_str = request.GET.get('date', '')
+    try:
+        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date')
+    date_str = selected_date.strftime('%Y-%m-%d')
+
+    if not await User.objects.filter(id=counselor_id, is_staff=True).aexists():
+        raise Http404('Counselor not found')
+
+    async def events():
+        # Subscribe before the first read so no change between the two is missed
+        queue = hub.subscribe(counselor_id, date_str)
+        try:
+            yield "retry: 3000\n\n"
+            slots = await sync_to_async(get_day_slots)(counselor_id, selected_date)
+            yield _sse_event('slots', {'date': date_str, 'slots': slots})
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + STREAM_MAX_SECONDS
+            while loop.time() < deadline:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event('slots', snapshot)
+        finally:
+            hub.unsubscribe(counselor_id, date_str, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@idempotent
 def book_appointment(request):
     """Handle appointment booking"""
+    from django.db import transaction
+    from .utils import book_timeslot, BookingError, queue_appointment_email
+
     # Check if this is an AJAX/fetch request
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.content_type == 'application/json'
     
@@ -349,6 +378,18 @@ def book_appointment(request):
         
         print(f"📥 Received booking request - Student: {request.user.username}, Timeslot: {timeslot_hour}, Counselor: {counselor_id}, Date: {selected_date}")
         
+        # Convert hour, counselor and date strings
+        try:
+            hour = int(timeslot_hour)
+            counselor_id = int(counselor_id)
+            selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+        except ValueError:
+            error_msg = 'Invalid booking information. Please try again.'
+            if is_ajax:
+                return JsonResponse({'success': False, 'error': error_msg})
+            messages.error(request, error_msg)
+            return redirect('public:appointments')
+        
         # Get program from user's profile
         try:
             user_profile = UserProfile.objects.get(user=request.user)
@@ -357,156 +398,54 @@ def book_appointment(request):
             program = 'Not Specified'
         
         try:
-            counselor = get_object_or_404(User, id=counselor_id, is_staff=True)
-            
-            # Convert hour to time
-            hour = int(timeslot_hour)
-            start_time = time(hour, 0)
-            
-            # Convert selected_date string to date object
-            if isinstance(selected_date, str):
-                from datetime import datetime
-                selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            
-            print(f"Booking appointment - Student: {request.user.username}, Counselor: {counselor.username}, Date: {selected_date}, Time: {start_time}")
-            
-            # Get or create timeslot
-            timeslot, created = Timeslot.objects.get_or_create(
-                user=counselor,
-                date=selected_date,
-                start_time=start_time,
-                defaults={'available': True}
-            )
-            print(f"Timeslot {'created' if created else 'retrieved'}: ID={timeslot.id}, Date={timeslot.date}, Time={timeslot.start_time}, Available={timeslot.available}")
-            
-            # Reset timeslot availability if needed (fix data inconsistencies)
-            timeslot_taken = Appointment.objects.filter(
-                timeslot=timeslot,
-                status__in=['pending', 'confirmed']
-            ).exists()
-            
-            if not timeslot_taken and not timeslot.available:
-                print(f"ℹ️ Timeslot {timeslot.id} is marked unavailable but has no appointment - resetting to available")
-                timeslot.available = True
-                timeslot.save()
-            
-            # Check if timeslot is available
-            if not timeslot.available:
-                error_msg = 'This time slot is no longer available.'
-                print(f"❌ {error_msg}")
-                if is_ajax:
-                    return JsonResponse({'success': False, 'error': error_msg})
-                messages.error(request, error_msg)
-                return redirect('public:appointments')
-            
-            # Create appointment - SIMPLIFIED - just save it directly
-            from django.db import transaction
-            appointment = None
-            appointment_id = None
-            
-            try:
-                # Use atomic transaction to ensure data consistency
-                with transaction.atomic():
-                    # Create and save appointment
-                    appointment = Appointment.objects.create(
-                        student=request.user,
-                        counselor=counselor,
-                        timeslot=timeslot,
-                        program=program,
-                        status='pending'
-                    )
-                    appointment_id = appointment.id
-                    print(f"✅ Appointment CREATED in transaction: ID={appointment_id}, Student={appointment.student.username}, Counselor={appointment.counselor.username}, Status={appointment.status}")
-                    
-                    # Mark timeslot as unavailable
-                    timeslot.available = False
-                    timeslot.save(update_fields=['available'])
-                    print(f"✅ Timeslot {timeslot.id} marked as unavailable")
-                
-                # Transaction committed - now verify appointment exists in database
-                verify_appointment = Appointment.objects.filter(id=appointment_id).first()
-                if not verify_appointment:
-                    raise Exception(f"Appointment {appointment_id} not found in database after transaction commit")
-                
-                appointment = verify_appointment
-                print(f"✅ Appointment VERIFIED after commit: ID={appointment.id}, Student={appointment.student.username}, Status={appointment.status}")
-                
-            except Appointment.DoesNotExist:
-                error_msg = 'Appointment was not saved to database.'
-                print(f"❌ CRITICAL: {error_msg} - Appointment ID {appointment_id} not found!")
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Appointment {appointment_id} not found after creation")
-                if is_ajax:
-                    return JsonResponse({'success': False, 'error': error_msg})
-                messages.error(request, error_msg)
-                return redirect('public:appointments')
-            except Exception as create_error:
-                import traceback
-                error_trace = traceback.format_exc()
-                error_msg = f'Error creating appointment: {str(create_error)}'
-                print(f"❌ {error_msg}")
-                print(f"Error type: {type(create_error).__name__}")
-                print(f"Traceback: {error_trace}")
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Appointment creation failed: {str(create_error)}", exc_info=True)
-                if is_ajax:
-                    return JsonResponse({'success': False, 'error': error_msg, 'details': str(create_error)})
-                messages.error(request, error_msg)
-                return redirect('public:appointments')
-            
-            # Final verification
-            if not appointment or not appointment.id:
-                error_msg = 'Failed to create appointment. Please try again.'
-                print(f"❌ CRITICAL: {error_msg}")
-                if is_ajax:
-                    return JsonResponse({'success': False, 'error': error_msg})
-                messages.error(request, error_msg)
-                return redirect('public:appointments')
-            
-            print(f"✅ FINAL CHECK: Appointment ID={appointment.id} exists in database")
-            
-            # Send email notification to student
-            try:
-                from .utils import send_appointment_confirmation_email, create_counselor_notification
-                email_sent = send_appointment_confirmation_email(request.user, appointment)
-                print(f"Email sent: {email_sent}")
-            except Exception as email_error:
-                print(f"Email error (non-fatal): {str(email_error)}")
-            
-            # Create notification for counselor
-            try:
-                from .utils import create_counselor_notification
-                notification_created = create_counselor_notification(counselor, appointment, 'appointment_booked')
-                print(f"Notification created: {notification_created is not None}")
-            except Exception as notif_error:
-                print(f"Notification error (non-fatal): {str(notif_error)}")
-            
-            # Always show success message regardless of email status
-            success_msg = 'Appointment booked successfully! Check your appointments page.'
-            print(f"✅ SUCCESS: {success_msg}")
-            
+            # Lock the timeslot, create the appointment and close the slot in one transaction,
+            # together with the confirmation email so it is sent exactly when the booking exists
+            with transaction.atomic():
+                appointment = book_timeslot(request.user, counselor_id, selected_date, hour, program)
+                queue_appointment_email(request.user, appointment)
+            print(f"✅ Appointment CREATED: ID={appointment.id}, Student={request.user.username}, Timeslot={appointment.timeslot_id}")
+        except BookingError as booking_error:
+            error_msg = str(booking_error)
+            print(f"❌ {error_msg}")
             if is_ajax:
-                return JsonResponse({
-                    'success': True, 
-                    'message': success_msg,
-                    'appointment_id': appointment.id
-                })
-            
-            messages.success(request, success_msg)
-            return redirect('public:my_appointments')
-            
+                return JsonResponse({'success': False, 'error': error_msg})
+            messages.error(request, error_msg)
+            return redirect('public:appointments')
         except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f"Appointment creation failed: {str(e)}", exc_info=True)
             error_msg = f'Error booking appointment: {str(e)}'
             print(f"❌ ERROR in book_appointment: {error_msg}")
-            print(f"Traceback: {error_trace}")
             if is_ajax:
                 return JsonResponse({'success': False, 'error': error_msg, 'details': str(e)})
             messages.error(request, error_msg)
             return redirect('public:appointments')
+        
+        counselor = appointment.counselor
+        
+        # Create notifications for counselor and student
+        try:
+            from .utils import create_counselor_notification, create_student_notification
+            notification_created = create_counselor_notification(counselor, appointment, 'appointment_booked')
+            create_student_notification(appointment, 'appointment_pending')
+            print(f"Notification created: {notification_created is not None}")
+        except Exception as notif_error:
+            print(f"Notification error (non-fatal): {str(notif_error)}")
+        
+        # Always show success message regardless of email status
+        success_msg = 'Appointment booked successfully! Check your appointments page.'
+        print(f"✅ SUCCESS: {success_msg}")
+        
+        if is_ajax:
+            return JsonResponse({
+                'success': True, 
+                'message': success_msg,
+                'appointment_id': appointment.id
+            })
+        
+        messages.success(request, success_msg)
+        return redirect('public:my_appointments')
     
     if is_ajax:
         return JsonResponse({'success': False, 'error': 'Invalid request method'})
@@ -516,14 +455,13 @@ def book_appointment(request):
 @login_required
 def my_appointments(request):
     """Display user's appointments (past and upcoming)"""
-    from django.db import connection
     now = timezone.now()
     today = now.date()
     
     # Get all appointments for the student first
     all_appointments = Appointment.objects.filter(
         student=request.user
-    ).select_related('timeslot', 'counselor')
+    ).select_related('timeslot', 'counselor', 'counselor__counselor_profile')
     
     # Separate into upcoming and past based on timeslot date
     upcoming_appointments = []
@@ -551,16 +489,11 @@ def my_appointments(request):
         x.timeslot.start_time if x.timeslot and x.timeslot.start_time else time.min
     ), reverse=True)
     
-    # Fetch counselor titles for all appointments
+    # Counselor titles come from the profiles loaded with the appointments
     def add_counselor_info(appointments):
-        appointments_with_info = []
         for appointment in appointments:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT title FROM auth_user WHERE id = %s", [appointment.counselor.id])
-                row = cursor.fetchone()
-                appointment.counselor_title = row[0] if row and row[0] else 'Guidance Counselor'
-            appointments_with_info.append(appointment)
-        return appointments_with_info
+            appointment.counselor_title = get_counselor_profile(appointment.counselor).title or 'Guidance Counselor'
+        return appointments
     
     context = {
         'upcoming_appointments': add_counselor_info(list(upcoming_appointments)),
@@ -575,17 +508,20 @@ def cancel_appointment(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id, student=request.user)
     
     if appointment.status in ['pending', 'confirmed']:
-            # Mark timeslot as available again
-            appointment.timeslot.available = True
-            appointment.timeslot.save()
-            
-            # Cancel appointment
-            appointment.status = 'cancelled'
-            appointment.save()
+            from django.db import transaction
+            with transaction.atomic():
+                # Cancel appointment
+                appointment.status = 'cancelled'
+                appointment.save()
+                
+                # Mark timeslot as available again
+                if appointment.timeslot:
+                    release_timeslot(appointment.timeslot)
             
             # Create notification for counselor about cancellation
-            from .utils import create_counselor_notification
+            from .utils import create_counselor_notification, create_student_notification
             create_counselor_notification(appointment.counselor, appointment, 'appointment_cancelled')
+            create_student_notification(appointment, 'appointment_cancelled')
             
             messages.success(request, 'Appointment cancelled successfully.')
     else:
@@ -594,70 +530,62 @@ def cancel_appointment(request, appointment_id):
     return redirect('public:my_appointments')
 
 
+# Notifications shown per page on the student notifications page
+NOTIFICATIONS_PAGE_SIZE = 20
+
+
 @login_required
 def notifications(request):
-    """Display notifications page"""
-    from django.db import connection
-    from datetime import timedelta
+    """Display the student's stored notifications, newest first, one page at a time"""
+    feed = StudentNotification.objects.filter(student=request.user)
     
-    # Get all appointments for the student
-    appointments = Appointment.objects.filter(student=request.user).order_by('-created_at')[:20]
+    # Keyset pagination: ?before=<id> shows the page after the last notification seen,
+    # so each page is one index range scan however long the history is
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        feed = feed.filter(id__lt=int(before))
     
-    # Create notification-like data from appointments
-    notifications_list = []
-    for appointment in appointments:
-        # Fetch counselor info
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT title FROM auth_user WHERE id = %s", [appointment.counselor.id])
-            row = cursor.fetchone()
-            counselor_title = row[0] if row and row[0] else 'Guidance Counselor'
-        
-        counselor_name = appointment.counselor.get_full_name() or appointment.counselor.username
-        
-        # Create notification based on appointment status
-        if appointment.status == 'confirmed':
-            notifications_list.append({
-                'icon': '✅',
-                'title': 'Appointment Confirmed',
-                'message': f'Your appointment with {counselor_name} ({counselor_title}) has been confirmed for {appointment.timeslot.date.strftime("%B %d, %Y")} at {appointment.timeslot.start_time.strftime("%I:%M %p")}.',
-                'time_ago': get_time_ago(appointment.updated_at),
-                'is_unread': (timezone.now() - appointment.updated_at).days < 1,
-                'created_at': appointment.updated_at,
-            })
-        elif appointment.status == 'pending':
-            notifications_list.append({
-                'icon': '⏳',
-                'title': 'Appointment Pending',
-                'message': f'Your appointment request with {counselor_name} ({counselor_title}) for {appointment.timeslot.date.strftime("%B %d, %Y")} at {appointment.timeslot.start_time.strftime("%I:%M %p")} is awaiting confirmation.',
-                'time_ago': get_time_ago(appointment.created_at),
-                'is_unread': (timezone.now() - appointment.created_at).days < 1,
-                'created_at': appointment.created_at,
-            })
-        elif appointment.status == 'cancelled':
-            notifications_list.append({
-                'icon': '❌',
-                'title': 'Appointment Cancelled',
-                'message': f'Your appointment with {counselor_name} ({counselor_title}) scheduled for {appointment.timeslot.date.strftime("%B %d, %Y")} at {appointment.timeslot.start_time.strftime("%I:%M %p")} has been cancelled.',
-                'time_ago': get_time_ago(appointment.updated_at),
-                'is_unread': (timezone.now() - appointment.updated_at).days < 1,
-                'created_at': appointment.updated_at,
-            })
-        elif appointment.status == 'completed':
-            notifications_list.append({
-                'icon': '🎉',
-                'title': 'Appointment Completed',
-                'message': f'Your counseling session with {counselor_name} ({counselor_title}) has been completed. Thank you for using our services.',
-                'time_ago': get_time_ago(appointment.updated_at),
-                'is_unread': False,
-                'created_at': appointment.updated_at,
-            })
+    # One extra row tells whether an older page exists
+    page = list(feed.order_by('-id')[:NOTIFICATIONS_PAGE_SIZE + 1])
+    has_older = len(page) > NOTIFICATIONS_PAGE_SIZE
+    page = page[:NOTIFICATIONS_PAGE_SIZE]
+    for notification in page:
+        notification.time_ago = get_time_ago(notification.created_at)
     
     context = {
-        'notifications': notifications_list,
+        'notifications': page,
+        'unread_count': StudentNotification.objects.filter(student=request.user, is_read=False).count(),
+        'older_before': page[-1].id if has_older else None,
+        'is_first_page': not before.isdigit(),
     }
     return render(request, 'public/notifications.html', context)
 
 
+@login_required
+@require_POST
+def mark_notification_read(request, notification_id):
+    """Mark one of the student's notifications as read"""
+    StudentNotification.objects.filter(id=notification_id, student=request.user, is_read=False).update(is_read=True)
+    unread_count = StudentNotification.objects.filter(student=request.user, is_read=False).count()
+    return JsonResponse({'success': True, 'unread_count': unread_count})
+
+
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    """Mark every notification of the student as read"""
+    StudentNotification.objects.filter(student=request.user, is_read=False).update(is_read=True)
+    return JsonResponse({'success': True, 'unread_count': 0})
+
+
+@login_required
+@require_POST
+def clear_notifications(request):
+    """Delete all of the student's notifications"""
+    deleted, _ = StudentNotification.objects.filter(student=request.user).delete()
+    return JsonResponse({'success': True, 'deleted': deleted, 'unread_count': 0})
+
+
 def get_time_ago(dt):
     """Convert datetime to human-readable time ago format"""
     now = timezone.now()
@@ -681,32 +609,13 @@ def get_time_ago(dt):
         return "Just now"
 
 
-def profile_picture(request, user_id):
-    """Serve profile picture from database"""
-    from django.db import connection
-    from django.http import HttpResponse, HttpResponseNotFound
-    
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT image_data FROM auth_user WHERE id = %s", [user_id])
-        row = cursor.fetchone()
-        
-        if row and row[0]:
-            image_data = bytes(row[0])
-            # Try to determine content type from image data
-            content_type = 'image/jpeg'  # default
-            if image_data.startswith(b'\x89PNG'):
-                content_type = 'image/png'
-            elif image_data.startswith(b'GIF'):
-                content_type = 'image/gif'
-            elif image_data.startswith(b'\xff\xd8\xff'):
-                content_type = 'image/jpeg'
-            
-            response = HttpResponse(image_data, content_type=content_type)
-            response['Cache-Control'] = 'public, max-age=86400'  # Cache for 1 day
-            return response
-    
-    # Return a default placeholder image or 404
-    return HttpResponseNotFound('No profile picture found')
+def profile_picture(request, user_id, version=None):
+    """Serve profile picture from database; ?size=small|medium|original picks a resized variant.
+
+    The versioned URL (with the picture's hash) is cached by browsers for good;
+    both answer conditional requests with 304 without reading the image.
+    """
+    return serve_profile_image(request, user_id, version)
 
 
 @login_required
@@ -771,12 +680,12 @@ def profile(request):
             context['error'] = 'This student ID is already taken by another user.'
             return render(request, 'public/profile.html', context)
         
-        # Validate profile picture size (2 MB limit)
+        # Validate profile picture (size, type and dimensions) before reading it
         if profile_picture:
-            max_size = 2 * 1024 * 1024  # 2 MB in bytes
-            if profile_picture.size > max_size:
-                size_mb = profile_picture.size / (1024 * 1024)
-                context['error'] = f'Profile picture is too large ({size_mb:.2f} MB). Maximum allowed size is 2 MB.'
+            try:
+                validate_profile_image(profile_picture)
+            except InvalidImageError as e:
+                context['error'] = str(e)
                 return render(request, 'public/profile.html', context)
         
         # Handle password change
@@ -813,14 +722,7 @@ def profile(request):
             
             # Process profile picture if uploaded
             if profile_picture:
-                image_binary = profile_picture.read()
-                from django.db import connection
-                from psycopg2 import Binary
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE auth_user SET image_data = %s WHERE id = %s",
-                        [Binary(image_binary), user.id]
-                    )
+                save_profile_image(user, profile_picture)
             
             # Update profile information
             user_profile.student_id = student_id
@@ -19,5 +19,11 @@ python manage.py create_admin 2>&1 || {
 }
 
 echo "=== Starting server ==="
-exec gunicorn myproject.wsgi --bind 0.0.0.0:$PORT
+# Emails are queued in the database and sent by the separate `worker` process
+# (Procfile, a Render Background Worker); run exactly one of it, not from here
+# Serve through the ASGI entry point so open availability streams (Server-Sent
+# Events) wait on the event loop instead of holding a worker each. Under ASGI
+# database connections are not reused between requests, so settings.py keeps
+# CONN_MAX_AGE at 0 (DB_CONN_MAX_AGE) rather than holding idle connections open
+exec gunicorn myproject.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:$PORT
 
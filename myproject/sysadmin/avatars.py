@@ -0,0 +1,478 @@
+"""
+Profile pictures.
+
+An upload is kept as received and re-encoded with Pillow into a few sizes
+(ProfileImageVariant), each as WebP plus a JPEG or PNG fallback. When the
+avatar storage is enabled (sysadmin/storage.py) the bytes live there under
+content-addressed names, so identical pictures are stored once and the
+database only records where; otherwise they stay in the database. The profile-picture views serve the smallest variant that fits the
+page, so a 40-pixel avatar costs a few kilobytes instead of the full upload.
+
+Uploads are checked (size, magic bytes, dimensions) and hashed in chunks;
+only the resize step decodes the picture, and JPEGs are decoded at reduced
+scale.
+
+Templates link to versioned URLs (profile_image_url) that carry the picture's
+hash, so browsers may cache them for good; a new upload gets a new URL.
+Conditional requests are answered from cached metadata without touching the
+image tables.
+"""
+import asyncio
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import ProfileImage, ProfileImageData, ProfileImageVariant
+from .storage import avatar_storage, storage_enabled
+
+# Longest side in pixels of each variant. small and medium are cropped square
+# (avatars are round) and cover 40-50 px and 150 px avatars on 2x screens.
+VARIANT_SIZES = {
+    'small': 96,
+    'medium': 320,
+    'original': 1024,
+}
+SQUARE_VARIANTS = ('small', 'medium')
+DEFAULT_SIZE = 'original'
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+# Uploads larger than this, or in another format, are rejected
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024
+ALLOWED_TYPES = tuple(EXTENSIONS)
+# Caps what decoding a picture can cost; 2 MB of PNG can hold a huge image
+MAX_DIMENSION = 6000
+MAX_PIXELS = 24_000_000
+
+# How long a user's picture hash is cached; uploads invalidate it sooner.
+# "No picture" is cached for less, since with a per-process cache only the
+# process handling an upload sees the invalidation.
+META_CACHE_SECONDS = 3600
+NO_IMAGE_CACHE_SECONDS = 300
+# Versioned URLs never change content, unversioned ones are revalidated soon
+VERSIONED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+UNVERSIONED_CACHE_CONTROL = 'public, max-age=300'
+VERSION_LENGTH = 16
+
+
+class InvalidImageError(ValueError):
+    """An upload that is not a usable profile picture; the message is shown to the user."""
+
+
+def detect_image_type(data):
+    """Content type of an image from its first 12 bytes, or None if it is not one we accept."""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def validate_profile_image(upload):
+    """
+    Check an uploaded picture's size, type and dimensions without reading
+    it whole, and return its content type. Raises InvalidImageError.
+    """
+    from PIL import Image
+
+    if upload.size > MAX_UPLOAD_BYTES:
+        size_mb = upload.size / (1024 * 1024)
+        raise InvalidImageError(f'Profile picture is too large ({size_mb:.2f} MB). Maximum allowed size is 2 MB.')
+
+    upload.seek(0)
+    content_type = detect_image_type(upload.read(12))
+    if content_type not in ALLOWED_TYPES:
+        raise InvalidImageError('Profile picture must be a JPEG, PNG, GIF or WebP image.')
+
+    # Image.open only parses the header; pixels are not decoded here
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+    except Exception:
+        raise InvalidImageError('Profile picture could not be read. Please upload another image.')
+    finally:
+        upload.seek(0)
+
+    if max(width, height) > MAX_DIMENSION or width * height > MAX_PIXELS:
+        raise InvalidImageError(
+            f'Profile picture is too large ({width}x{height} pixels). '
+            f'Maximum allowed is {MAX_DIMENSION} pixels per side.'
+        )
+    return content_type
+
+
+def accepts_webp(request):
+    return 'image/webp' in request.META.get('HTTP_ACCEPT', '')
+
+
+def build_variants(image_file):
+    """
+    Decode an upload (bytes or a file) and return its variants as dicts with
+    size_name, content_type, width, height and data. Returns [] if Pillow
+    cannot read it.
+    """
+    from PIL import Image, ImageOps
+
+    if isinstance(image_file, (bytes, bytearray)):
+        image_file = BytesIO(image_file)
+    image_file.seek(0)
+    largest = max(VARIANT_SIZES.values())
+    try:
+        with Image.open(image_file) as source:
+            # JPEGs can be decoded at 1/2-1/8 scale, still at least the largest variant
+            source.draft('RGB', (largest, largest))
+            source = ImageOps.exif_transpose(source)
+            has_alpha = source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info)
+            source = source.convert('RGBA' if has_alpha else 'RGB')
+    except Exception as e:
+        print(f"Could not decode profile picture: {str(e)}")
+        return []
+
+    variants = []
+    for size_name, side in VARIANT_SIZES.items():
+        if size_name in SQUARE_VARIANTS:
+            edge = min(side, source.width, source.height)
+            resized = ImageOps.fit(source, (edge, edge), Image.LANCZOS)
+        else:
+            resized = source.copy()
+            resized.thumbnail((side, side), Image.LANCZOS)
+
+        encodings = [('image/webp', 'WEBP', {'quality': WEBP_QUALITY, 'method': 4})]
+        if has_alpha:
+            encodings.append(('image/png', 'PNG', {'optimize': True}))
+        else:
+            encodings.append(('image/jpeg', 'JPEG', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}))
+
+        for content_type, image_format, options in encodings:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            variants.append({
+                'size_name': size_name,
+                'content_type': content_type,
+                'width': resized.width,
+                'height': resized.height,
+                'data': buffer.getvalue(),
+            })
+    return variants
+
+
+def hash_file(content):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(content, content_type, digest=None):
+    """
+    Write bytes or a file to the avatar storage under a name made from their
+    SHA-256 and return the name. Identical content ends up in one file.
+    Files are copied in chunks.
+    """
+    if isinstance(content, (bytes, bytearray)):
+        content = ContentFile(bytes(content))
+    elif not isinstance(content, File):
+        content = File(content)
+    digest = digest or hash_file(content)
+    name = f'{digest[:2]}/{digest}{EXTENSIONS.get(content_type, "")}'
+    if not avatar_storage.exists(name):
+        content.seek(0)
+        name = avatar_storage.save(name, content)
+    return name
+
+
+def delete_unreferenced_files(names):
+    """Delete stored files that no picture or variant points at any more."""
+    names = {name for name in names if name}
+    if not names:
+        return
+    used = set(ProfileImageData.objects.filter(file__in=names).values_list('file', flat=True))
+    used.update(ProfileImageVariant.objects.filter(file__in=names).values_list('file', flat=True))
+    for name in names - used:
+        avatar_storage.delete(name)
+
+
+def store_variants(image, image_file):
+    """Replace the stored variants of a ProfileImage with ones made from image_file (bytes or a file)."""
+    to_storage = storage_enabled()
+    variants = []
+    for variant in build_variants(image_file):
+        data = variant.pop('data')
+        variants.append(ProfileImageVariant(
+            image=image,
+            byte_size=len(data),
+            file=store_file(data, variant['content_type']) if to_storage else '',
+            data=None if to_storage else data,
+            **variant
+        ))
+    return _replace_variants(image, variants)
+
+
+def _replace_variants(image, variants):
+    old_files = list(ProfileImageVariant.objects.filter(image=image).values_list('file', flat=True))
+    ProfileImageVariant.objects.filter(image=image).delete()
+    ProfileImageVariant.objects.bulk_create(variants)
+    transaction.on_commit(lambda: delete_unreferenced_files(old_files))
+    return len(variants)
+
+
+def read_profile_image(image_id):
+    """Return the uploaded bytes of a ProfileImage, wherever they are stored, or None."""
+    row = ProfileImageData.objects.filter(image_id=image_id).values_list('file', flat=True).first()
+    if row:
+        with avatar_storage.open(row, 'rb') as stored:
+            return stored.read()
+    data = ProfileImageData.objects.filter(image_id=image_id).values_list('data', flat=True).first()
+    return bytes(data) if data else None
+
+
+# Bytes read per chunk when the app streams a picture itself
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def _stream_file(stored):
+    """Read an open file in chunks on a worker thread, so the event loop never holds more than one chunk."""
+    try:
+        while chunk := await asyncio.to_thread(stored.read, STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await asyncio.to_thread(stored.close)
+
+
+def _file_response(name, content_type):
+    """
+    Response for a stored file. In production the app should not send the
+    bytes: the proxy sends them (X-Accel-Redirect) or the browser fetches them
+    from the object store (see the sysadmin.W001 deploy check). Otherwise the
+    file is streamed in chunks through an async iterator. The server runs under
+    ASGI, where a FileResponse would be read into memory whole.
+    """
+    prefix = settings.AVATAR_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{name}"
+        return response
+    try:
+        avatar_storage.path(name)
+    except NotImplementedError:
+        return HttpResponseRedirect(avatar_storage.url(name))
+    stored = avatar_storage.open(name, 'rb')
+    response = StreamingHttpResponse(_stream_file(stored), content_type=content_type)
+    response['Content-Length'] = str(stored.size)
+    return response
+
+
+def profile_image_response(user_id, size=DEFAULT_SIZE, webp=False):
+    """
+    Return a response with a user's profile picture at the given size, or
+    None. WebP is preferred when webp is true. Pictures without variants
+    (e.g. ones Pillow could not read) fall back to the upload; pictures not
+    yet moved out of the database are still served from it.
+    """
+    if size not in VARIANT_SIZES:
+        size = DEFAULT_SIZE
+
+    variants = ProfileImageVariant.objects.filter(image__user_id=user_id, size_name=size)
+    if webp:
+        variants = variants.order_by('-content_type')  # image/webp sorts after image/jpeg and image/png
+    else:
+        variants = variants.exclude(content_type='image/webp')
+    row = variants.values_list('file', 'content_type', 'id').first()
+    if row:
+        name, content_type, variant_id = row
+        legacy = ProfileImageVariant.objects.filter(id=variant_id)
+    else:
+        row = ProfileImageData.objects.filter(image__user_id=user_id).values_list('file', 'image__content_type', 'image_id').first()
+        if not row:
+            return None
+        name, content_type, image_id = row
+        legacy = ProfileImageData.objects.filter(image_id=image_id)
+
+    try:
+        if name:
+            return _file_response(name, content_type)
+    except FileNotFoundError:
+        print(f"Profile picture file missing from storage: {name}")
+        return None
+
+    data = legacy.values_list('data', flat=True).first()
+    if not data:
+        return None
+    return HttpResponse(bytes(data), content_type=content_type)
+
+
+def _meta_cache_key(user_id):
+    return f'avatar-meta:{user_id}'
+
+
+def get_profile_image_meta(user_id):
+    """
+    Return (content_hash, updated_at) of a user's picture, or None if they
+    have none. Cached, so serving a 304 or building a URL needs no query.
+    """
+    key = _meta_cache_key(user_id)
+    meta = cache.get(key)
+    if meta is None:
+        row = ProfileImage.objects.filter(user_id=user_id).values_list('content_hash', 'updated_at').first()
+        meta = tuple(row) if row else ()
+        cache.set(key, meta, META_CACHE_SECONDS if meta else NO_IMAGE_CACHE_SECONDS)
+    return meta or None
+
+
+def invalidate_profile_image_meta(user_id):
+    cache.delete(_meta_cache_key(user_id))
+
+
+def image_version(content_hash, updated_at):
+    # Rows saved before hashes existed fall back to their modification time
+    return content_hash[:VERSION_LENGTH] if content_hash else f'{int(updated_at.timestamp()):x}'
+
+
+def profile_image_url(user_id, size=DEFAULT_SIZE, namespace='sysadmin'):
+    """
+    Versioned URL of a user's picture at the given size, or None when they
+    have no picture, so pages can render initials instead of an image that
+    would 404.
+    """
+    meta = get_profile_image_meta(user_id)
+    if not meta:
+        return None
+    url = reverse(f'{namespace}:profile_picture_versioned', args=[user_id, image_version(*meta)])
+    return f'{url}?size={size}'
+
+
+def serve_profile_image(request, user_id, version=None):
+    """
+    Build the profile-picture response shared by both apps. Answers
+    If-None-Match/If-Modified-Since with 304 before any image bytes are read.
+    """
+    meta = get_profile_image_meta(user_id)
+    if not meta:
+        return HttpResponseNotFound('No profile picture found')
+
+    content_hash, updated_at = meta
+    size = request.GET.get('size', DEFAULT_SIZE)
+    if size not in VARIANT_SIZES:
+        size = DEFAULT_SIZE
+    webp = accepts_webp(request)
+    etag = f'"{image_version(content_hash, updated_at)}-{int(updated_at.timestamp()):x}-{size}-{"webp" if webp else "std"}"'
+    last_modified = int(updated_at.timestamp())
+
+    # A stale version in the URL still gets the current picture, just not cached for long
+    current = version is not None and version == image_version(content_hash, updated_at)
+    cache_control = VERSIONED_CACHE_CONTROL if current else UNVERSIONED_CACHE_CONTROL
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = profile_image_response(user_id, size, webp=webp)
+        if response is None:
+            invalidate_profile_image_meta(user_id)
+            return HttpResponseNotFound('No profile picture found')
+        if response.status_code == 302:
+            # Object store links expire, so the redirect must not be kept for good
+            cache_control = UNVERSIONED_CACHE_CONTROL
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept'  # WebP or not depends on the browser
+    return response
+
+
+def has_profile_image(user):
+    """Whether the user has a profile picture, from the metadata row only."""
+    try:
+        return user.profile_image is not None
+    except ProfileImage.DoesNotExist:
+        return False
+
+
+@transaction.atomic
+def save_profile_image(user, upload):
+    """
+    Store a user's profile picture (an uploaded file or bytes), its metadata
+    and its resized variants, replacing any previous one. Raises
+    InvalidImageError for uploads validate_profile_image rejects.
+
+    A picture already stored for anyone, e.g. a shared default photo, reuses
+    that file and its variants instead of being stored and resized again.
+    Without the avatar storage the bytes are kept in the database.
+    """
+    if isinstance(upload, (bytes, bytearray)):
+        upload = ContentFile(bytes(upload))
+    content_type = validate_profile_image(upload)
+    content_hash = hash_file(upload)
+    to_storage = storage_enabled()
+
+    current = ProfileImage.objects.filter(user=user, content_hash=content_hash, blob__isnull=False)
+    if to_storage:
+        # A picture still in the database is moved to storage by uploading it again
+        current = current.exclude(blob__file='')
+    current = current.first()
+    if current:
+        # Same picture uploaded again
+        return current
+
+    image, created = ProfileImage.objects.update_or_create(
+        user=user,
+        defaults={
+            'content_type': content_type,
+            'size': upload.size,
+            'content_hash': content_hash,
+        },
+    )
+    old_file = ProfileImageData.objects.filter(image=image).values_list('file', flat=True).first()
+
+    same = None
+    if to_storage:
+        same = ProfileImageData.objects.filter(image__content_hash=content_hash).exclude(image=image).exclude(file='').only('image_id', 'file').first()
+    if same:
+        ProfileImageData.objects.update_or_create(image=image, defaults={'file': same.file.name, 'data': None})
+        _replace_variants(image, [
+            ProfileImageVariant(
+                image=image,
+                size_name=variant.size_name,
+                content_type=variant.content_type,
+                width=variant.width,
+                height=variant.height,
+                byte_size=variant.byte_size,
+                file=variant.file.name,
+            )
+            for variant in ProfileImageVariant.objects.filter(image_id=same.image_id).exclude(file='').defer('data')
+        ])
+    elif to_storage:
+        # Resize first: saving a temporary upload to local storage moves the file
+        store_variants(image, upload)
+        ProfileImageData.objects.update_or_create(
+            image=image,
+            defaults={'file': store_file(upload, content_type, content_hash), 'data': None},
+        )
+    else:
+        store_variants(image, upload)
+        upload.seek(0)
+        ProfileImageData.objects.update_or_create(image=image, defaults={'file': '', 'data': upload.read()})
+
+    transaction.on_commit(lambda: invalidate_profile_image_meta(user.id))
+    transaction.on_commit(lambda: delete_unreferenced_files([old_file]))
+    return image
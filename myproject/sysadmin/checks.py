@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .storage import storage_enabled
+
+FILE_SYSTEM_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+
+def _avatar_backend():
+    return (getattr(settings, 'AVATAR_STORAGE', None) or {}).get('BACKEND', FILE_SYSTEM_STORAGE)
+
+
+@register(deploy=True)
+def check_avatar_location(app_configs, **kwargs):
+    """Profile pictures must not be written inside the app directory, which Render wipes on every redeploy."""
+    if not storage_enabled() or _avatar_backend() != FILE_SYSTEM_STORAGE:
+        return []
+    location = (settings.AVATAR_STORAGE.get('OPTIONS') or {}).get('location') or settings.MEDIA_ROOT
+    if not Path(location).resolve().is_relative_to(Path(settings.BASE_DIR).resolve()):
+        return []
+    return [Error(
+        f'Profile pictures would be written to {location}, inside the app directory, and lost on redeploy.',
+        hint='Point AVATAR_ROOT at a persistent disk outside the app or set AVATAR_S3_BUCKET, '
+             'or unset both to keep pictures in the database.',
+        id='sysadmin.E001',
+    )]
+
+
+@register(deploy=True)
+def check_avatar_serving(app_configs, **kwargs):
+    """In production profile pictures should be sent by the proxy or the object store, not the app."""
+    if settings.DEBUG or settings.AVATAR_ACCEL_REDIRECT_PREFIX or _avatar_backend() != FILE_SYSTEM_STORAGE:
+        return []
+    return [Warning(
+        'Profile pictures are streamed by the app process.',
+        hint='Set AVATAR_ACCEL_REDIRECT_PREFIX behind nginx or AVATAR_S3_BUCKET for an object store.',
+        id='sysadmin.W001',
+    )]
@@ -0,0 +1,159 @@
+"""
+Live availability change notifications.
+
+Code that changes a counselor's slots calls publish_availability_change().
+Once the transaction commits, the change is sent with PostgreSQL NOTIFY, so
+every server process hears about it whichever process made the change. On
+other databases it only reaches subscribers in the same process.
+
+Streaming views subscribe to one (counselor, date) pair through `hub`. Each
+process keeps one LISTEN connection in a background thread. For every change
+it reads the day's slots once and hands that snapshot to all subscribers of
+the pair.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+from datetime import datetime
+
+from django.db import connection, transaction
+
+CHANNEL = 'availability_changes'
+
+# Seconds between checks of the LISTEN connection, and the wait before reconnecting
+LISTEN_TIMEOUT = 5
+RECONNECT_DELAY = 2
+
+# Beyond this many dates a change is announced as "every date" to keep NOTIFY payloads small
+MAX_PAYLOAD_DATES = 100
+
+
+def publish_availability_change(counselor, dates=None):
+    """
+    Announce that a counselor's slots changed on the given dates, once the
+    current transaction commits. Pass dates=None when every date may have
+    changed (e.g. a new weekly template).
+    """
+    counselor_id = getattr(counselor, 'pk', counselor)
+    if dates is not None:
+        dates = sorted({the_date.strftime('%Y-%m-%d') for the_date in dates})
+        if len(dates) > MAX_PAYLOAD_DATES:
+            dates = None
+    payload = json.dumps({'counselor_id': counselor_id, 'dates': dates})
+    transaction.on_commit(lambda: _send(payload))
+
+
+def _send(payload):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+    else:
+        hub.dispatch(payload)
+
+
+def _offer(queue, message):
+    """Put a snapshot on a subscriber queue, replacing one it has not read yet."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class AvailabilityHub:
+    """Fans availability changes out to the asyncio queues of open streams."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def subscribe(self, counselor_id, date_str):
+        """Return a queue that receives {'date', 'slots'} snapshots for one counselor-day."""
+        queue = asyncio.Queue(maxsize=1)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault((counselor_id, date_str), set()).add(subscriber)
+        self._ensure_listener()
+        return queue
+
+    def unsubscribe(self, counselor_id, date_str, queue):
+        with self._lock:
+            subscribers = self._subscribers.get((counselor_id, date_str), set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop((counselor_id, date_str), None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def dispatch(self, payload):
+        """Read the changed days once and push them to their subscribers. Safe from any thread."""
+        from .utils import get_day_slots
+
+        message = json.loads(payload)
+        counselor_id = message['counselor_id']
+        dates = message['dates']
+        with self._lock:
+            targets = [
+                (date_str, list(subscribers))
+                for (key_counselor, date_str), subscribers in self._subscribers.items()
+                if key_counselor == counselor_id and (dates is None or date_str in dates)
+            ]
+
+        for date_str, subscribers in targets:
+            the_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            snapshot = {
+                'date': date_str,
+                'slots': get_day_slots(counselor_id, the_date),
+            }
+            for loop, queue in subscribers:
+                try:
+                    loop.call_soon_threadsafe(_offer, queue, snapshot)
+                except RuntimeError:
+                    # The subscriber's event loop is gone
+                    pass
+
+    def _ensure_listener(self):
+        if connection.vendor != 'postgresql':
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='availability-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        reconnecting = False
+        while True:
+            try:
+                connection.ensure_connection()
+                raw = connection.connection
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CHANNEL}')
+                if reconnecting:
+                    # Changes may have been missed while disconnected; refresh every stream
+                    self._refresh_all()
+                reconnecting = False
+
+                while True:
+                    if select.select([raw], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.dispatch(raw.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Availability listener error: {str(e)}")
+                connection.close()
+                reconnecting = True
+                time.sleep(RECONNECT_DELAY)
+
+    def _refresh_all(self):
+        with self._lock:
+            counselor_ids = {counselor_id for counselor_id, date_str in self._subscribers}
+        for counselor_id in counselor_ids:
+            self.dispatch(json.dumps({'counselor_id': counselor_id, 'dates': None}))
+
+
+hub = AvailabilityHub()
@@ -0,0 +1,163 @@
+"""
+Management command to compare the per-hour and per-day availability layouts.
+Usage: python manage.py benchmark_availability [--counselors 40] [--days 270] [--lookups 500]
+
+Builds two scratch tables holding the same synthetic availability: the old layout
+(one Timeslot-style row per counselor per hour with an available flag) and the
+bitmask layout (one DayAvailability-style row per counselor-day). It then reports
+row counts, table sizes (PostgreSQL) and the time of single-day and 30-day
+availability lookups against each. The scratch tables are dropped afterwards.
+"""
+import random
+import time as time_module
+from datetime import date, time, timedelta
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+
+from sysadmin.utils import SLOT_HOURS, ALL_SLOTS_MASK, mask_to_hours
+
+# Days covered by one range lookup
+RANGE_DAYS = 30
+
+# Scratch models live in their own registry so they never show up in migrations
+benchmark_apps = Apps()
+
+
+class HourlyAvailability(models.Model):
+    """Old layout: one row per counselor per hour."""
+    user_id = models.IntegerField()
+    date = models.DateField()
+    start_time = models.TimeField()
+    available = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        apps = benchmark_apps
+        app_label = 'sysadmin'
+        db_table = 'sysadmin_benchmark_hourly'
+        unique_together = (('user_id', 'date', 'start_time'),)
+
+
+class DailyAvailability(models.Model):
+    """Bitmask layout: one row per counselor-day."""
+    user_id = models.IntegerField()
+    date = models.DateField()
+    slots = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        apps = benchmark_apps
+        app_label = 'sysadmin'
+        db_table = 'sysadmin_benchmark_daily'
+        unique_together = (('user_id', 'date'),)
+
+
+class Command(BaseCommand):
+    help = 'Compares table size and query time of per-hour vs per-day bitmask availability'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counselors', type=int, default=40, help='Number of synthetic counselors')
+        parser.add_argument('--days', type=int, default=270, help='Number of days per counselor (more than 30)')
+        parser.add_argument('--lookups', type=int, default=500, help='Number of timed lookups per query type')
+        parser.add_argument('--open-ratio', type=float, default=0.25, help='Share of slots that are open')
+
+    def handle(self, *args, **options):
+        counselors = max(1, options['counselors'])
+        days = options['days']
+        # The range lookups read 30 days starting at a random day that must leave room for them
+        if days <= RANGE_DAYS:
+            raise CommandError(f'--days must be more than {RANGE_DAYS}')
+        lookups = max(1, options['lookups'])
+        open_ratio = options['open_ratio']
+        start_date = date.today()
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(HourlyAvailability)
+            schema_editor.create_model(DailyAvailability)
+
+        try:
+            self.stdout.write(f'Generating {counselors} counselors x {days} days...')
+            self._populate(counselors, days, start_date, open_ratio)
+            self._analyze()
+
+            self.stdout.write('=' * 60)
+            self.stdout.write('AVAILABILITY STORAGE BENCHMARK')
+            self.stdout.write('=' * 60)
+            for model in (HourlyAvailability, DailyAvailability):
+                size = self._table_size(model._meta.db_table)
+                size_str = f'{size / 1024:.0f} KiB' if size is not None else 'n/a (PostgreSQL only)'
+                self.stdout.write(f'{model.__name__:<20} rows: {model.objects.count():>9}  size: {size_str}')
+
+            rng = random.Random(42)
+            day_keys = [(rng.randint(1, counselors), start_date + timedelta(days=rng.randrange(days))) for _ in range(lookups)]
+            range_keys = [(rng.randint(1, counselors), start_date + timedelta(days=rng.randrange(days - RANGE_DAYS))) for _ in range(lookups)]
+
+            hourly_day = self._time(day_keys, lambda user_id, day: [
+                start.hour for start, available in HourlyAvailability.objects.filter(
+                    user_id=user_id, date=day
+                ).values_list('start_time', 'available') if available
+            ])
+            daily_day = self._time(day_keys, lambda user_id, day: mask_to_hours(
+                DailyAvailability.objects.filter(user_id=user_id, date=day).values_list('slots', flat=True).first() or 0
+            ))
+            hourly_range = self._time(range_keys, lambda user_id, day: list(
+                HourlyAvailability.objects.filter(
+                    user_id=user_id, date__range=(day, day + timedelta(days=RANGE_DAYS - 1)), available=True
+                ).values_list('date', 'start_time')
+            ))
+            daily_range = self._time(range_keys, lambda user_id, day: [
+                (slot_date, mask_to_hours(mask)) for slot_date, mask in DailyAvailability.objects.filter(
+                    user_id=user_id, date__range=(day, day + timedelta(days=RANGE_DAYS - 1))
+                ).values_list('date', 'slots')
+            ])
+
+            self.stdout.write(f'Single-day lookup   hourly: {hourly_day:.3f} ms  bitmask: {daily_day:.3f} ms')
+            self.stdout.write(f'30-day range lookup hourly: {hourly_range:.3f} ms  bitmask: {daily_range:.3f} ms')
+        finally:
+            with connection.schema_editor() as schema_editor:
+                schema_editor.delete_model(HourlyAvailability)
+                schema_editor.delete_model(DailyAvailability)
+
+    def _populate(self, counselors, days, start_date, open_ratio):
+        rng = random.Random(7)
+        hourly_rows = []
+        daily_rows = []
+        for user_id in range(1, counselors + 1):
+            for offset in range(days):
+                the_date = start_date + timedelta(days=offset)
+                mask = 0
+                for index, hour in enumerate(SLOT_HOURS):
+                    is_open = rng.random() < open_ratio
+                    if is_open:
+                        mask |= 1 << index
+                    hourly_rows.append(HourlyAvailability(
+                        user_id=user_id, date=the_date, start_time=time(hour, 0), available=is_open
+                    ))
+                daily_rows.append(DailyAvailability(user_id=user_id, date=the_date, slots=mask & ALL_SLOTS_MASK))
+        HourlyAvailability.objects.bulk_create(hourly_rows, batch_size=5000)
+        DailyAvailability.objects.bulk_create(daily_rows, batch_size=5000)
+
+    def _analyze(self):
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {HourlyAvailability._meta.db_table}')
+            cursor.execute(f'ANALYZE {DailyAvailability._meta.db_table}')
+
+    def _table_size(self, table):
+        """Total on-disk size of a table and its indexes in bytes, where the database can tell."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            return cursor.fetchone()[0]
+
+    def _time(self, keys, lookup):
+        """Average milliseconds per lookup over the given (user_id, date) keys."""
+        started = time_module.perf_counter()
+        for user_id, day in keys:
+            lookup(user_id, day)
+        return (time_module.perf_counter() - started) * 1000 / len(keys)
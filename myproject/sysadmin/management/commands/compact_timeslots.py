@@ -0,0 +1,46 @@
+"""
+Management command to delete Timeslot rows that no appointment points at.
+Usage: python manage.py compact_timeslots [--batch-size 1000] [--dry-run]
+
+Since migration 0008 counselor availability lives in DayAvailability (one row per
+counselor-day), so Timeslot rows are only needed as the target of an appointment.
+The per-hour rows that older versions created on every page view can be removed.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sysadmin.models import Timeslot
+
+
+class Command(BaseCommand):
+    help = 'Deletes Timeslot rows that are not referenced by any appointment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be deleted')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        unused = Timeslot.objects.filter(appointments__isnull=True)
+
+        total_before = Timeslot.objects.count()
+        unused_count = unused.count()
+        self.stdout.write(f'Timeslot rows: {total_before}  unreferenced: {unused_count}')
+
+        if options['dry_run'] or not unused_count:
+            return
+
+        deleted = 0
+        while True:
+            ids = list(unused.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Re-check the reference inside the delete so a slot booked meanwhile is kept
+                count, _ = Timeslot.objects.filter(id__in=ids, appointments__isnull=True).delete()
+            deleted += count
+            self.stdout.write(f'  deleted {deleted}/{unused_count}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} unreferenced Timeslot rows, {Timeslot.objects.count()} remain.'
+        ))
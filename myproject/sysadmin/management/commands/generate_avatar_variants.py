@@ -0,0 +1,55 @@
+"""
+Management command to build the resized variants of stored profile pictures.
+Usage: python manage.py generate_avatar_variants [--all] [--dry-run]
+
+Pictures uploaded before resized variants existed are served at full size until
+this has run. Only pictures without variants are processed unless --all is
+given (e.g. after changing VARIANT_SIZES or the encoder settings).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from sysadmin.avatars import store_variants, read_profile_image, invalidate_profile_image_meta
+from sysadmin.models import ProfileImage
+
+
+class Command(BaseCommand):
+    help = 'Generates small/medium/original WebP and JPEG/PNG variants of profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate variants of every picture')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many pictures would be processed')
+
+    def handle(self, *args, **options):
+        images = ProfileImage.objects.all()
+        if not options['all']:
+            images = images.filter(variants__isnull=True)
+        image_ids = list(images.order_by('id').values_list('id', flat=True).distinct())
+        self.stdout.write(f'Pictures to process: {len(image_ids)}')
+
+        if options['dry_run'] or not image_ids:
+            return
+
+        processed = 0
+        unreadable = 0
+        for image_id in image_ids:
+            # One picture at a time keeps at most one upload in memory
+            data = read_profile_image(image_id)
+            if not data:
+                continue
+            with transaction.atomic():
+                if not store_variants(ProfileImage(id=image_id), data):
+                    unreadable += 1
+                # New bytes behind the same URL; bump the ETag and Last-Modified
+                image = ProfileImage.objects.filter(id=image_id)
+                image.update(updated_at=timezone.now())
+                user_id = image.values_list('user_id', flat=True).first()
+            invalidate_profile_image_meta(user_id)
+            processed += 1
+            if processed % 50 == 0:
+                self.stdout.write(f'  processed {processed}/{len(image_ids)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} picture(s); {unreadable} could not be decoded and keep serving the upload.'
+        ))
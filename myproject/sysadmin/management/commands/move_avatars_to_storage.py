@@ -0,0 +1,63 @@
+"""
+Management command to move profile picture bytes out of the database into the avatar storage.
+Usage: python manage.py move_avatars_to_storage [--batch-size 50] [--dry-run]
+
+Pictures saved before the avatar storage was enabled keep their bytes in
+ProfileImageData.data / ProfileImageVariant.data and are served from there
+until moved. Each batch is written to storage and then committed, so the
+command can be stopped and re-run at any point. Refuses to run until
+AVATAR_ROOT or AVATAR_S3_BUCKET is set, since the default directory does not
+survive a redeploy.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sysadmin.avatars import store_file
+from sysadmin.models import ProfileImageData, ProfileImageVariant
+from sysadmin.storage import storage_enabled
+
+
+class Command(BaseCommand):
+    help = 'Moves profile picture bytes from the database to the avatar storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Pictures moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be moved')
+
+    def handle(self, *args, **options):
+        if not storage_enabled():
+            raise CommandError('No avatar storage is configured; set AVATAR_ROOT to a persistent disk or '
+                               'AVATAR_S3_BUCKET first, or pictures would be lost on the next redeploy')
+        batch_size = max(1, options['batch_size'])
+        uploads = ProfileImageData.objects.filter(file='', data__isnull=False)
+        variants = ProfileImageVariant.objects.filter(file='', data__isnull=False)
+        self.stdout.write(f'In the database: {uploads.count()} picture(s), {variants.count()} variant(s)')
+
+        if options['dry_run']:
+            return
+
+        moved_uploads = self._move(uploads, 'image_id', 'image__content_type', batch_size)
+        moved_variants = self._move(variants, 'id', 'content_type', batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved_uploads} picture(s) and {moved_variants} variant(s) to the avatar storage.'
+        ))
+
+    def _move(self, queryset, key, content_type_field, batch_size):
+        model = queryset.model
+        moved = 0
+        last_key = None
+        while True:
+            # Only batch_size blobs are in memory at a time
+            batch = queryset.order_by(key)
+            if last_key is not None:
+                batch = batch.filter(**{f'{key}__gt': last_key})
+            rows = list(batch.values_list(key, content_type_field, 'data')[:batch_size])
+            if not rows:
+                return moved
+            with transaction.atomic():
+                for row_key, content_type, data in rows:
+                    name = store_file(bytes(data), content_type)
+                    model.objects.filter(**{key: row_key}).update(file=name, data=None)
+            moved += len(rows)
+            last_key = rows[-1][0]
+            self.stdout.write(f'  {model.__name__}: moved {moved}')
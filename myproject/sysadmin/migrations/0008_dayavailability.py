@@ -0,0 +1,77 @@
+# Migration to store counselor availability as one bitmask row per day
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Hours of the fixed daily schedule; bit i of the mask is SLOT_HOURS[i]
+SLOT_HOURS = [8, 9, 10, 11, 13, 14, 15, 16]
+BATCH_SIZE = 1000
+
+
+def copy_timeslot_availability(apps, schema_editor):
+    """Pack the open Timeslot rows of every counselor-day into a DayAvailability mask."""
+    Timeslot = apps.get_model('sysadmin', 'Timeslot')
+    DayAvailability = apps.get_model('sysadmin', 'DayAvailability')
+
+    masks = {}
+    open_rows = Timeslot.objects.filter(available=True).values_list('user_id', 'date', 'start_time')
+    for user_id, date, start_time in open_rows.iterator():
+        if start_time.hour not in SLOT_HOURS or start_time.minute:
+            continue
+        key = (user_id, date)
+        masks[key] = masks.get(key, 0) | (1 << SLOT_HOURS.index(start_time.hour))
+
+    rows = [
+        DayAvailability(user_id=user_id, date=date, slots=mask)
+        for (user_id, date), mask in masks.items()
+    ]
+    DayAvailability.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def restore_timeslot_availability(apps, schema_editor):
+    """Write the masks back onto Timeslot rows so the old code sees the same availability."""
+    Timeslot = apps.get_model('sysadmin', 'Timeslot')
+    DayAvailability = apps.get_model('sysadmin', 'DayAvailability')
+
+    for day in DayAvailability.objects.iterator():
+        for index, hour in enumerate(SLOT_HOURS):
+            Timeslot.objects.update_or_create(
+                user_id=day.user_id,
+                date=day.date,
+                start_time=datetime.time(hour, 0),
+                defaults={'available': bool(day.slots & (1 << index))},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sysadmin', '0007_fix_timeslot_structure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slots', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('date',),
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(copy_timeslot_availability, restore_timeslot_availability),
+        # Availability now lives in DayAvailability; Timeslot rows only anchor appointments
+        migrations.RemoveField(
+            model_name='timeslot',
+            name='available',
+        ),
+    ]
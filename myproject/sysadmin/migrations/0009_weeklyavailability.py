@@ -0,0 +1,40 @@
+# Migration for recurring weekly availability templates
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sysadmin', '0008_dayavailability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('slots', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_availability', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('weekday',),
+                'unique_together': {('user', 'weekday')},
+            },
+        ),
+        # Existing day rows were all set by hand, so they start out as overrides
+        migrations.AddField(
+            model_name='dayavailability',
+            name='overridden',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='dayavailability',
+            name='overridden',
+            field=models.BooleanField(default=False),
+        ),
+    ]
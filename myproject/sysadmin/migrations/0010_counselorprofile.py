@@ -0,0 +1,97 @@
+# Migration moving the raw-SQL auth_user columns added in 0005 into real models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PROFILE_COLUMNS = ('middle_initial', 'assigned_college', 'title', 'bio')
+
+
+def copy_auth_user_columns(apps, schema_editor):
+    """Copy middle_initial/assigned_college/title/bio and image_data out of auth_user."""
+    CounselorProfile = apps.get_model('sysadmin', 'CounselorProfile')
+    ProfileImage = apps.get_model('sysadmin', 'ProfileImage')
+    connection = schema_editor.connection
+
+    with connection.cursor() as cursor:
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, 'auth_user')}
+    if not set(PROFILE_COLUMNS) <= columns:
+        # Fresh database where 0005 never added the columns; nothing to copy
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, middle_initial, assigned_college, title, bio FROM auth_user "
+            "WHERE is_staff = %s OR COALESCE(assigned_college, '') <> '' OR COALESCE(title, '') <> ''",
+            [True],
+        )
+        profiles = [
+            CounselorProfile(
+                user_id=user_id,
+                middle_initial=(middle_initial or '').strip(),
+                assigned_college=(assigned_college or '').strip(),
+                title=(title or '').strip(),
+                bio=bio or '',
+            )
+            for user_id, middle_initial, assigned_college, title, bio in cursor.fetchall()
+        ]
+    CounselorProfile.objects.bulk_create(profiles, batch_size=500, ignore_conflicts=True)
+    print(f"\n  Copied {len(profiles)} counselor profile(s)")
+
+    if 'image_data' not in columns:
+        return
+
+    # Images can be large, so copy them a batch at a time
+    copied = 0
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, image_data FROM auth_user WHERE image_data IS NOT NULL AND id > %s ORDER BY id LIMIT 100",
+                [last_id],
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        ProfileImage.objects.bulk_create(
+            [ProfileImage(user_id=user_id, data=bytes(image_data)) for user_id, image_data in rows],
+            ignore_conflicts=True,
+        )
+        copied += len(rows)
+        last_id = rows[-1][0]
+    print(f"  Copied {copied} profile image(s)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sysadmin', '0009_weeklyavailability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounselorProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('middle_initial', models.CharField(blank=True, max_length=10)),
+                ('assigned_college', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('bio', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counselor_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile_image', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        # The old auth_user columns are left in place so this can be rolled back
+        migrations.RunPython(copy_auth_user_columns, migrations.RunPython.noop),
+    ]
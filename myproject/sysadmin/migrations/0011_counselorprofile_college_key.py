@@ -0,0 +1,32 @@
+# Migration adding a normalized, indexed college key to counselor profiles
+from django.db import migrations, models
+
+
+def fill_college_key(apps, schema_editor):
+    CounselorProfile = apps.get_model('sysadmin', 'CounselorProfile')
+    profiles = list(CounselorProfile.objects.only('id', 'assigned_college'))
+    for profile in profiles:
+        profile.college_key = ' '.join((profile.assigned_college or '').split()).lower()
+    CounselorProfile.objects.bulk_update(profiles, ['college_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0010_counselorprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counselorprofile',
+            name='college_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.RunPython(fill_college_key, migrations.RunPython.noop),
+        # Lookups go through college_key now, so the display name needs no index
+        migrations.AlterField(
+            model_name='counselorprofile',
+            name='assigned_college',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Migration adding the counselor search document and, on PostgreSQL, its trigram index
+from django.db import migrations, models, transaction
+
+
+def fill_search_document(apps, schema_editor):
+    CounselorProfile = apps.get_model('sysadmin', 'CounselorProfile')
+    profiles = list(CounselorProfile.objects.select_related('user'))
+    for profile in profiles:
+        parts = [
+            profile.user.first_name, profile.middle_initial, profile.user.last_name,
+            profile.title, profile.assigned_college, profile.bio,
+        ]
+        profile.search_document = ' '.join(' '.join(part.split()) for part in parts if part).lower()
+    CounselorProfile.objects.bulk_update(profiles, ['search_document'], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    """Index search_document for LIKE '%term%' lookups. PostgreSQL only; others scan the table."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS counselorprofile_search_trgm_idx '
+                'ON sysadmin_counselorprofile USING gin (search_document gin_trgm_ops)'
+            )
+    except Exception as e:
+        # e.g. the database user may not create extensions; search still works, just unindexed
+        print(f"\n  Could not create the trigram index on counselor search: {str(e)}")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS counselorprofile_search_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0011_counselorprofile_college_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counselorprofile',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
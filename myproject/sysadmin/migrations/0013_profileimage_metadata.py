@@ -0,0 +1,81 @@
+# Migration splitting profile picture bytes from their metadata
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def guess_content_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def move_image_bytes(apps, schema_editor):
+    """Copy each picture into ProfileImageData and fill in its metadata, a batch at a time."""
+    ProfileImage = apps.get_model('sysadmin', 'ProfileImage')
+    ProfileImageData = apps.get_model('sysadmin', 'ProfileImageData')
+
+    last_id = 0
+    while True:
+        images = list(ProfileImage.objects.filter(id__gt=last_id).order_by('id')[:100])
+        if not images:
+            break
+        blobs = []
+        for image in images:
+            data = bytes(image.data or b'')
+            image.content_type = guess_content_type(data)
+            image.size = len(data)
+            image.content_hash = hashlib.sha256(data).hexdigest()
+            blobs.append(ProfileImageData(image_id=image.id, data=data))
+        ProfileImageData.objects.bulk_create(blobs, ignore_conflicts=True)
+        ProfileImage.objects.bulk_update(images, ['content_type', 'size', 'content_hash'])
+        last_id = images[-1].id
+
+
+def restore_image_bytes(apps, schema_editor):
+    ProfileImage = apps.get_model('sysadmin', 'ProfileImage')
+    ProfileImageData = apps.get_model('sysadmin', 'ProfileImageData')
+    for blob in ProfileImageData.objects.iterator(chunk_size=100):
+        ProfileImage.objects.filter(id=blob.image_id).update(data=blob.data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0012_counselorprofile_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profileimage',
+            name='content_type',
+            field=models.CharField(default='image/jpeg', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='profileimage',
+            name='size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profileimage',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ProfileImageData',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blob', serialize=False, to='sysadmin.profileimage')),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(move_image_bytes, restore_image_bytes),
+        migrations.RemoveField(
+            model_name='profileimage',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Migration for resized profile picture variants
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0013_profileimage_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size_name', models.CharField(choices=[('small', 'Small'), ('medium', 'Medium'), ('original', 'Original')], max_length=20)),
+                ('content_type', models.CharField(max_length=100)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('byte_size', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='sysadmin.profileimage')),
+            ],
+            options={
+                'unique_together': {('image', 'size_name', 'content_type')},
+            },
+        ),
+    ]
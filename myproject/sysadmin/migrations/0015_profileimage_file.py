@@ -0,0 +1,34 @@
+# Migration letting profile picture bytes live in the avatar storage instead of the database
+# Existing bytes stay where they are; move them with: python manage.py move_avatars_to_storage
+from django.db import migrations, models
+import sysadmin.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0014_profileimagevariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profileimagedata',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=sysadmin.storage.get_avatar_storage, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='profileimagedata',
+            name='data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profileimagevariant',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=sysadmin.storage.get_avatar_storage, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='profileimagevariant',
+            name='data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Migration for opt-in counselor notification digest emails
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sysadmin', '0015_profileimage_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counselorprofile',
+            name='email_digest',
+            field=models.CharField(choices=[('off', 'Off'), ('daily', 'Daily'), ('hourly', 'Hourly')], default='off', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='counselorprofile',
+            name='digest_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,18 +1,20 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from .storage import get_avatar_storage
 
 
-# Simple timeslot model for availability
+# Simple timeslot model that appointments are booked against
 class Timeslot(models.Model):
 	"""Represents a 1-hour timeslot on a given date for a user (counselor).
 
-	The UI will show timeslots from 8:00 to 17:00 (5 PM). Availability is a boolean.
+	The UI will show timeslots from 8:00 to 17:00 (5 PM). Whether a slot is open
+	for booking is kept in DayAvailability; Timeslot rows are created when a slot
+	is booked so appointments have something to point at.
 	"""
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeslots')
 	date = models.DateField()
 	start_time = models.TimeField()
-	available = models.BooleanField(default=False)
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,7 +23,182 @@ class Timeslot(models.Model):
 		ordering = ('date', 'start_time')
 
 	def __str__(self):
-		return f"{self.user} - {self.date} {self.start_time} - {'Available' if self.available else 'Not Available'}"
+		return f"{self.user} - {self.date} {self.start_time}"
+
+
+# Compact per-day availability for a counselor
+class DayAvailability(models.Model):
+	"""Open slots of a counselor on one date, packed into a bitmask.
+
+	Bit i is set when the i-th slot of the fixed daily schedule
+	(sysadmin.utils.TIME_SLOTS) is open for booking. Dates without a row follow
+	the counselor's WeeklyAvailability; a row is materialized from the template
+	the first time the date is booked or edited. `overridden` marks rows the
+	counselor edited by hand, which later template changes leave alone.
+	"""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='day_availability')
+	date = models.DateField()
+	slots = models.PositiveSmallIntegerField(default=0)
+	overridden = models.BooleanField(default=False)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		unique_together = (('user', 'date'),)
+		ordering = ('date',)
+
+	def __str__(self):
+		return f"{self.user} - {self.date} - {self.slots:08b}"
+
+
+# Recurring weekly availability pattern for a counselor
+class WeeklyAvailability(models.Model):
+	"""Open slots of a counselor on one weekday, packed like DayAvailability.slots."""
+	WEEKDAYS = [
+		(0, 'Monday'),
+		(1, 'Tuesday'),
+		(2, 'Wednesday'),
+		(3, 'Thursday'),
+		(4, 'Friday'),
+		(5, 'Saturday'),
+		(6, 'Sunday'),
+	]
+
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='weekly_availability')
+	weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+	slots = models.PositiveSmallIntegerField(default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		unique_together = (('user', 'weekday'),)
+		ordering = ('weekday',)
+
+	def __str__(self):
+		return f"{self.user} - {self.get_weekday_display()} - {self.slots:08b}"
+
+
+def normalize_college(name):
+	"""Comparison key of a college name: trimmed, inner spaces collapsed, lowercased."""
+	return ' '.join((name or '').split()).lower()
+
+
+# Counselor details shown to students when booking
+class CounselorProfile(models.Model):
+	"""Counselor-only details that used to be extra columns on auth_user.
+
+	The profile picture lives in ProfileImage so that counselor lists, which
+	join this table, never read image bytes.
+	"""
+	EMAIL_DIGEST_CHOICES = [
+		('off', 'Off'),
+		('daily', 'Daily'),
+		('hourly', 'Hourly'),
+	]
+
+	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='counselor_profile')
+	middle_initial = models.CharField(max_length=10, blank=True)
+	assigned_college = models.CharField(max_length=255, blank=True)
+	# normalize_college(assigned_college), kept in sync by save() and used for lookups
+	college_key = models.CharField(max_length=255, blank=True, db_index=True)
+	title = models.CharField(max_length=255, blank=True)
+	bio = models.TextField(blank=True)
+	# Lowercased name, title, college and bio that counselor search matches against.
+	# On PostgreSQL it has a trigram index (migration 0012).
+	search_document = models.TextField(blank=True, editable=False)
+	# Opt-in email summary of unread notifications, sent by public/digests.py
+	email_digest = models.CharField(max_length=10, choices=EMAIL_DIGEST_CHOICES, default='off')
+	# Time of the last digest (or of opting in); the next one covers notifications after it
+	digest_sent_at = models.DateTimeField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.full_name} - {self.assigned_college}"
+
+	def save(self, *args, **kwargs):
+		self.college_key = normalize_college(self.assigned_college)
+		self.search_document = self.build_search_document()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None:
+			kwargs['update_fields'] = set(update_fields) | {'college_key', 'search_document'}
+		super().save(*args, **kwargs)
+
+	def build_search_document(self):
+		parts = [
+			self.user.first_name, self.middle_initial, self.user.last_name,
+			self.title, self.assigned_college, self.bio,
+		]
+		return ' '.join(' '.join(part.split()) for part in parts if part).lower()
+
+	@property
+	def full_name(self):
+		"""First name, middle initial and last name, e.g. 'JUAN D. CRUZ'."""
+		if self.middle_initial:
+			return f"{self.user.first_name} {self.middle_initial}. {self.user.last_name}"
+		return f"{self.user.first_name} {self.user.last_name}"
+
+
+# Profile picture of any user, student or counselor
+class ProfileImage(models.Model):
+	"""Metadata of a user's profile picture; a row exists only if the user has one.
+
+	The bytes live in ProfileImageData so code that only needs to know whether
+	a user has a picture, or its type and size, never reads the image itself.
+	"""
+	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile_image')
+	content_type = models.CharField(max_length=100, default='image/jpeg')
+	size = models.PositiveIntegerField(default=0)
+	# SHA-256 of the bytes, hex encoded
+	content_hash = models.CharField(max_length=64, blank=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.user} - {self.content_type} - {self.size} bytes"
+
+
+# The uploaded picture, kept apart from its metadata
+class ProfileImageData(models.Model):
+	"""Where a profile picture's bytes are.
+
+	With the avatar storage enabled (AVATAR_ROOT or AVATAR_S3_BUCKET) new
+	uploads go there (file); otherwise, and for pictures saved before it was
+	enabled that move_avatars_to_storage has not moved yet, data holds them.
+	"""
+	image = models.OneToOneField(ProfileImage, on_delete=models.CASCADE, primary_key=True, related_name='blob')
+	file = models.FileField(storage=get_avatar_storage, max_length=255, blank=True)
+	data = models.BinaryField(null=True, blank=True)
+
+	def __str__(self):
+		return f"{self.image.user} - {self.file.name or 'in database'}"
+
+
+# Resized, re-encoded copy of a profile picture
+class ProfileImageVariant(models.Model):
+	"""One size of a profile picture in one format, made when the picture is saved.
+
+	Each size is stored as WebP and as JPEG (PNG when the picture has
+	transparency) so browsers without WebP support still get a resized copy.
+	"""
+	SIZES = [
+		('small', 'Small'),
+		('medium', 'Medium'),
+		('original', 'Original'),
+	]
+
+	image = models.ForeignKey(ProfileImage, on_delete=models.CASCADE, related_name='variants')
+	size_name = models.CharField(max_length=20, choices=SIZES)
+	content_type = models.CharField(max_length=100)
+	width = models.PositiveIntegerField()
+	height = models.PositiveIntegerField()
+	byte_size = models.PositiveIntegerField()
+	file = models.FileField(storage=get_avatar_storage, max_length=255, blank=True)
+	# Copy kept in the database; see ProfileImageData
+	data = models.BinaryField(null=True, blank=True)
+
+	class Meta:
+		unique_together = (('image', 'size_name', 'content_type'),)
+
+	def __str__(self):
+		return f"{self.image.user} - {self.size_name} {self.content_type} {self.width}x{self.height}"
 
 
 # Notification model for counselor notifications
@@ -1,5 +1,5 @@
 // availability.js
-// Handles toggling timeslot availability via AJAX (POST to /sysadmin/availability/toggle/)
+// Handles setting timeslot availability via AJAX (batched POST to /sysadmin/availability/bulk/)
 
 function getCSRFToken() {
   const name = 'csrftoken';
@@ -10,13 +10,21 @@ function getCSRFToken() {
 }
 
 document.addEventListener('DOMContentLoaded', function () {
+  // Keep the chosen summary window when moving between dates
+  const summary = document.querySelector('.availability-summary[data-window]');
+  const summaryWindow = summary ? summary.getAttribute('data-window') : '';
+  function availabilityUrl(date) {
+    const windowParam = summaryWindow ? `&window=${summaryWindow}` : '';
+    return `/sysadmin/availability/?date=${date}${windowParam}`;
+  }
+
   // Date picker functionality
   const datePicker = document.getElementById('date-picker');
   if (datePicker) {
     datePicker.addEventListener('change', function() {
       const selectedDate = this.value;
       if (selectedDate) {
-        window.location.href = `/sysadmin/availability/?date=${selectedDate}`;
+        window.location.href = availabilityUrl(selectedDate);
       }
     });
   }
@@ -28,49 +36,138 @@ document.addEventListener('DOMContentLoaded', function () {
     card.addEventListener('click', function() {
       const date = this.getAttribute('data-date');
       if (date) {
-        window.location.href = `/sysadmin/availability/?date=${date}`;
+        window.location.href = availabilityUrl(date);
       }
     });
   });
 
   // Toggle switch functionality
+  // Flips are collected for a moment and sent together to the bulk endpoint.
+  // Each change carries the wanted state, so a resend or a second tab cannot flip it back.
+  const datePickerValue = datePicker ? datePicker.value : '';
+  const pendingChanges = new Map();
+  let flushTimer = null;
+
+  function renderSlot(slotEl, available) {
+    const badge = slotEl.querySelector('.badge');
+    const checkbox = slotEl.querySelector('.switch');
+    if (available) {
+      badge.classList.remove('red');
+      badge.textContent = 'Available';
+      slotEl.classList.remove('disabled');
+      checkbox.checked = true;
+    } else {
+      badge.classList.add('red');
+      badge.textContent = 'Not Available';
+      slotEl.classList.add('disabled');
+      checkbox.checked = false;
+    }
+  }
+
+  function flushChanges() {
+    flushTimer = null;
+    if (!pendingChanges.size) return;
+    const changes = Array.from(pendingChanges.values());
+    pendingChanges.clear();
+
+    fetch('/sysadmin/availability/bulk/', {
+      method: 'POST',
+      headers: {
+        'X-CSRFToken': getCSRFToken(),
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({changes: changes}),
+      credentials: 'same-origin',
+      keepalive: true
+    }).then(res => {
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      return res.json();
+    }).then(data => {
+      // Show the state the server ended up with for each slot
+      const refused = [];
+      data.results.forEach(result => {
+        if (result.date !== datePickerValue) return;
+        const slotEl = document.querySelector(`.slot[data-slot="${result.hour}"]`);
+        if (slotEl) renderSlot(slotEl, result.available);
+        if (result.error) refused.push(result.error);
+      });
+      if (refused.length) alert(refused[0]);
+    }).catch(err => {
+      console.error('Availability update error', err);
+      // revert the switches we could not save
+      changes.forEach(change => {
+        const slotEl = document.querySelector(`.slot[data-slot="${change.hour}"]`);
+        if (slotEl) renderSlot(slotEl, !change.available);
+      });
+    });
+  }
+
   document.querySelectorAll('.switch').forEach(function (input) {
     input.addEventListener('change', function (e) {
-      const slotId = e.target.getAttribute('data-slot-id');
-      if (!slotId) return;
+      const slotEl = e.target.closest('.slot');
+      const hour = e.target.getAttribute('data-hour');
+      if (!hour || !datePickerValue) return;
 
-      const formData = new FormData();
-      formData.append('slot_id', slotId);
+      const available = e.target.checked;
+      if (slotEl) renderSlot(slotEl, available);
+      pendingChanges.set(hour, {date: datePickerValue, hour: parseInt(hour, 10), available: available});
 
-      fetch('/sysadmin/availability/toggle/', {
+      clearTimeout(flushTimer);
+      flushTimer = setTimeout(flushChanges, 400);
+    });
+  });
+
+  // Do not lose queued changes when leaving the page
+  window.addEventListener('pagehide', flushChanges);
+
+  // Move every appointment of the selected date and close it
+  const rescheduleDayForm = document.getElementById('reschedule-day-form');
+  if (rescheduleDayForm) {
+    // One key per page view, so a double submit only moves the appointments once
+    const rescheduleDayKey = window.crypto && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+    rescheduleDayForm.addEventListener('submit', function (e) {
+      e.preventDefault();
+      if (!confirm('Move all active appointments on this date and mark the whole day unavailable?')) return;
+
+      const formData = new FormData(this);
+      const submitBtn = this.querySelector('button[type="submit"]');
+      const results = document.getElementById('reschedule-day-results');
+      submitBtn.disabled = true;
+
+      fetch('/sysadmin/availability/reschedule-day/', {
         method: 'POST',
         headers: {
           'X-CSRFToken': getCSRFToken(),
+          'Idempotency-Key': rescheduleDayKey,
         },
         body: formData,
         credentials: 'same-origin'
       }).then(res => res.json()).then(data => {
-        // Update UI based on response
-        const slotEl = document.querySelector(`.slot[data-slot-id="${data.id}"]`);
-        if (!slotEl) return;
-        const badge = slotEl.querySelector('.badge');
-        const checkbox = slotEl.querySelector('.switch');
-        if (data.available) {
-          badge.classList.remove('red');
-          badge.textContent = 'Available';
-          slotEl.classList.remove('disabled');
-          checkbox.checked = true;
-        } else {
-          badge.classList.add('red');
-          badge.textContent = 'Not Available';
-          slotEl.classList.add('disabled');
-          checkbox.checked = false;
+        if (!data.success) {
+          alert('Error: ' + (data.error || 'Failed to reschedule appointments'));
+          submitBtn.disabled = false;
+          return;
+        }
+        results.innerHTML = '';
+        if (!data.outcomes.length) {
+          results.innerHTML = '<li>No active appointments on this date. The day is now closed.</li>';
         }
+        data.outcomes.forEach(outcome => {
+          const item = document.createElement('li');
+          item.textContent = outcome.moved
+            ? `${outcome.student}: ${outcome.from} → ${outcome.to}`
+            : `${outcome.student}: not moved (${outcome.reason})`;
+          results.appendChild(item);
+        });
+        document.querySelectorAll('.slot').forEach(slotEl => renderSlot(slotEl, false));
       }).catch(err => {
-        console.error('Toggle error', err);
-        // revert checkbox UI state
-        e.target.checked = !e.target.checked;
+        console.error('Reschedule day error', err);
+        alert('Error rescheduling appointments. Please try again.');
+        submitBtn.disabled = false;
       });
     });
-  });
-});
+  }
+});
\ No newline at end of file
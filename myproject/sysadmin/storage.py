@@ -0,0 +1,36 @@
+"""
+Storage for profile picture bytes.
+
+Configured by settings.AVATAR_STORAGE ({'BACKEND': ..., 'OPTIONS': {...}},
+the same shape as an entry of Django's STORAGES). The default is a local
+directory; an S3-compatible store (django-storages) can be swapped in
+without code changes, and the local directory stands in for it in
+development. Until AVATAR_ROOT or AVATAR_S3_BUCKET is set
+(settings.AVATAR_STORAGE_ENABLED), new pictures are kept in the database
+instead, since the default directory is lost on redeploy.
+"""
+from django.conf import settings
+from django.utils.functional import LazyObject
+from django.utils.module_loading import import_string
+
+
+class AvatarStorage(LazyObject):
+    def _setup(self):
+        config = getattr(settings, 'AVATAR_STORAGE', None) or {}
+        backend = config.get('BACKEND', 'django.core.files.storage.FileSystemStorage')
+        options = config.get('OPTIONS', {})
+        self._wrapped = import_string(backend)(**options)
+
+
+avatar_storage = AvatarStorage()
+
+
+def get_avatar_storage():
+    # Callable for FileField(storage=...), so migrations do not record the backend
+    return avatar_storage
+
+
+
+def storage_enabled():
+    """Whether new pictures are written to the avatar storage rather than the database."""
+    return getattr(settings, 'AVATAR_STORAGE_ENABLED', False)
@@ -0,0 +1,14 @@
+from django import template
+
+from sysadmin.avatars import profile_image_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user_id, size='original', namespace='sysadmin'):
+    """
+    Versioned profile picture URL, or '' when the user has none:
+    {% avatar_url request.user.id 'small' 'public' as avatar %}{% if avatar %}...
+    """
+    return profile_image_url(user_id, size, namespace) or ''
@@ -1,4 +1,143 @@
-from django.test import TestCase
+from datetime import time, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
 
+from public.models import Appointment
+
+from .models import CounselorProfile, DayAvailability, Timeslot
+from .utils import get_counselor_directory, search_counselors, set_slots, slot_bit
+from .avatars import (
+    UNVERSIONED_CACHE_CONTROL, VERSIONED_CACHE_CONTROL, get_profile_image_meta, image_version, save_profile_image,
+    serve_profile_image,
+)
+
+
+def png_bytes(color='red'):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (200, 150), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ServeProfileImageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('counselor', 'counselor@example.com', is_staff=True)
+        save_profile_image(self.user, png_bytes())
+        self.version = image_version(*get_profile_image_meta(self.user.id))
+        self.url = reverse('sysadmin:profile_picture_versioned', args=[self.user.id, self.version])
+
+    def test_current_version_is_cached_for_good(self):
+        response = self.client.get(self.url, {'size': 'small'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], VERSIONED_CACHE_CONTROL)
+        self.assertTrue(response['ETag'])
+
+    def test_matching_etag_is_answered_without_reading_the_picture(self):
+        etag = self.client.get(self.url, {'size': 'small'})['ETag']
+        request = RequestFactory().get(self.url, {'size': 'small'}, headers={'If-None-Match': etag})
+
+        with mock.patch('sysadmin.avatars.profile_image_response') as read_picture, \
+                mock.patch('sysadmin.avatars.avatar_storage') as storage, \
+                self.assertNumQueries(0):
+            response = serve_profile_image(request, self.user.id, self.version)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        read_picture.assert_not_called()
+        self.assertEqual(storage.mock_calls, [])
+
+    def test_stale_version_gets_short_cache(self):
+        stale_url = reverse('sysadmin:profile_picture_versioned', args=[self.user.id, self.version])
+        with self.captureOnCommitCallbacks(execute=True):
+            save_profile_image(self.user, png_bytes('blue'))
+
+        response = self.client.get(stale_url, {'size': 'small'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], UNVERSIONED_CACHE_CONTROL)
+        self.assertNotEqual(image_version(*get_profile_image_meta(self.user.id)), self.version)
+
+
+class UserAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.counselor = User.objects.create_user(
+            'counselor', 'counselor@example.com', first_name='ANA', last_name='REYES', is_staff=True,
+        )
+        CounselorProfile.objects.create(user=self.counselor, assigned_college='College of Computer Studies')
+        self.client.force_login(self.admin)
+
+    def change(self, **fields):
+        data = {
+            'username': self.counselor.username,
+            'email': self.counselor.email,
+            'first_name': self.counselor.first_name,
+            'last_name': self.counselor.last_name,
+            'is_active': 'on',
+            'is_staff': 'on',
+            'date_joined_0': self.counselor.date_joined.strftime('%Y-%m-%d'),
+            'date_joined_1': self.counselor.date_joined.strftime('%H:%M:%S'),
+        }
+        data.update(fields)
+        data = {name: value for name, value in data.items() if value is not None}
+        response = self.client.post(reverse('admin:auth_user_change', args=[self.counselor.id]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_rename_updates_search_and_directory(self):
+        self.assertEqual(get_counselor_directory('College of Computer Studies')[0]['name'], 'ANA REYES')
+
+        self.change(first_name='MARIA')
+
+        self.assertEqual(get_counselor_directory('College of Computer Studies')[0]['name'], 'MARIA REYES')
+        self.assertIn('maria', CounselorProfile.objects.get(user=self.counselor).search_document)
+        results, has_more = search_counselors('maria')
+        self.assertEqual([result['id'] for result in results], [self.counselor.id])
+
+    def test_deactivating_removes_from_directory(self):
+        self.assertEqual(len(get_counselor_directory()), 1)
+
+        self.change(is_active=None)
+
+        self.assertEqual(get_counselor_directory(), [])
+
+
+class SetSlotsTests(TestCase):
+    def setUp(self):
+        self.counselor = User.objects.create_user('counselor', 'counselor@example.com', is_staff=True)
+        self.student = User.objects.create_user('student', 'student@example.com')
+        self.date = timezone.localdate() + timedelta(days=7)
+        timeslot = Timeslot.objects.create(user=self.counselor, date=self.date, start_time=time(9, 0))
+        Appointment.objects.create(student=self.student, counselor=self.counselor, timeslot=timeslot, status='confirmed')
+
+    def day(self):
+        return DayAvailability.objects.get(user=self.counselor, date=self.date)
+
+    def test_refused_change_does_not_override_the_day(self):
+        [result] = set_slots(self.counselor, [(self.date, 9, True)])
+
+        self.assertEqual(result['error'], 'This slot has an active appointment.')
+        self.assertFalse(result['available'])
+        self.assertFalse(self.day().overridden)
+
+    def test_unchanged_slot_does_not_override_the_day(self):
+        set_slots(self.counselor, [(self.date, 10, False)])
+
+        self.assertFalse(self.day().overridden)
+
+    def test_change_overrides_the_day(self):
+        results = set_slots(self.counselor, [(self.date, 9, True), (self.date, 10, True)])
+
+        self.assertEqual([result['available'] for result in results], [False, True])
+        day = self.day()
+        self.assertTrue(day.overridden)
+        self.assertEqual(day.slots, slot_bit(10))
@@ -15,6 +15,9 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('availability/', views.availability, name='availability'),
     path('availability/toggle/', views.toggle_availability, name='toggle_availability'),
+    path('availability/bulk/', views.bulk_availability, name='bulk_availability'),
+    path('availability/weekly/', views.weekly_availability, name='weekly_availability'),
+    path('availability/reschedule-day/', views.reschedule_day_appointments, name='reschedule_day'),
     path('notifications/', views.notifications, name='notifications'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('appointments/<int:appointment_id>/confirm/', views.confirm_appointment, name='confirm_appointment'),
@@ -26,6 +29,7 @@ urlpatterns = [
     path('reports/', views.reports, name='reports'),
     path('reports/export-pdf/', views.export_report_pdf, name='export_report_pdf'),
     path('profile-picture/<int:user_id>/', views.profile_picture, name='profile_picture'),
+    path('profile-picture/<int:user_id>/<slug:version>/', views.profile_picture, name='profile_picture_versioned'),
     path('profile/', views.profile, name='profile'),
 ]
 
@@ -0,0 +1,460 @@
+import hashlib
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField
+from django.utils import timezone
+
+from .events import publish_availability_change
+from .models import Timeslot, DayAvailability, WeeklyAvailability, CounselorProfile, normalize_college
+from public.models import ACTIVE_STATUSES
+
+
+# The fixed daily schedule shown to counselors and students: (hour, label)
+TIME_SLOTS = [
+    (8, '8:00 AM - 9:00 AM'),
+    (9, '9:00 AM - 10:00 AM'),
+    (10, '10:00 AM - 11:00 AM'),
+    (11, '11:00 AM - 12:00 PM'),
+    (13, '1:00 PM - 2:00 PM'),
+    (14, '2:00 PM - 3:00 PM'),
+    (15, '3:00 PM - 4:00 PM'),
+    (16, '4:00 PM - 5:00 PM'),
+]
+
+# Bit i of a DayAvailability mask is the slot starting at SLOT_HOURS[i]
+SLOT_HOURS = [hour for hour, label in TIME_SLOTS]
+ALL_SLOTS_MASK = (1 << len(SLOT_HOURS)) - 1
+
+
+def slot_bit(hour):
+    """Return the mask bit of the slot starting at `hour` (ValueError if not a slot)."""
+    return 1 << SLOT_HOURS.index(hour)
+
+
+def hours_to_mask(hours):
+    """Pack slot start hours into a mask."""
+    mask = 0
+    for hour in hours:
+        mask |= slot_bit(hour)
+    return mask
+
+
+def mask_to_hours(mask):
+    """Unpack a mask into the list of slot start hours it contains."""
+    return [hour for index, hour in enumerate(SLOT_HOURS) if mask & (1 << index)]
+
+
+def get_weekly_masks(counselor):
+    """Return a counselor's weekly template as 7 masks indexed by weekday (Monday is 0)."""
+    masks = [0] * 7
+    for weekday, mask in WeeklyAvailability.objects.filter(user=counselor).values_list('weekday', 'slots'):
+        masks[weekday] = mask
+    return masks
+
+
+def get_template_mask(counselor, the_date):
+    """Return the weekly template mask that applies to a date."""
+    mask = WeeklyAvailability.objects.filter(
+        user=counselor, weekday=the_date.weekday()
+    ).values_list('slots', flat=True).first()
+    return mask or 0
+
+
+def get_day_mask(counselor, the_date):
+    """Return the open-slot mask of a counselor for one date.
+
+    A materialized DayAvailability row wins; otherwise the weekly template applies.
+    """
+    mask = DayAvailability.objects.filter(user=counselor, date=the_date).values_list('slots', flat=True).first()
+    if mask is not None:
+        return mask
+    return get_template_mask(counselor, the_date)
+
+
+def materialize_day(counselor, the_date):
+    """
+    Create a date's DayAvailability row from the weekly template if it is missing.
+
+    Must run before any UPDATE on the day's mask. The insert ignores conflicts,
+    so a row created concurrently by another request is kept as it is.
+    """
+    user_id = getattr(counselor, 'pk', counselor)
+    if DayAvailability.objects.filter(user_id=user_id, date=the_date).exists():
+        return
+    DayAvailability.objects.bulk_create(
+        [DayAvailability(user_id=user_id, date=the_date, slots=get_template_mask(user_id, the_date))],
+        ignore_conflicts=True,
+    )
+
+
+def materialize_days(counselor, dates):
+    """Batch version of materialize_day: one lookup, one template read and one insert."""
+    user_id = getattr(counselor, 'pk', counselor)
+    existing = set(DayAvailability.objects.filter(user_id=user_id, date__in=dates).values_list('date', flat=True))
+    missing = [the_date for the_date in set(dates) if the_date not in existing]
+    if not missing:
+        return
+    weekly_masks = get_weekly_masks(user_id)
+    DayAvailability.objects.bulk_create(
+        [DayAvailability(user_id=user_id, date=the_date, slots=weekly_masks[the_date.weekday()]) for the_date in missing],
+        ignore_conflicts=True,
+    )
+
+
+def get_booked_masks(counselor, dates):
+    """Return {date: mask} of the slots held by pending/confirmed appointments on the given dates."""
+    booked = {}
+    for slot_date, start_time in Timeslot.objects.filter(
+        user=counselor,
+        date__in=dates,
+        appointments__status__in=ACTIVE_STATUSES,
+    ).values_list('date', 'start_time'):
+        if start_time.hour in SLOT_HOURS:
+            booked[slot_date] = booked.get(slot_date, 0) | slot_bit(start_time.hour)
+    return booked
+
+
+def is_slot_open(counselor, the_date, hour):
+    """Test whether a counselor's slot is open for booking."""
+    return bool(get_day_mask(counselor, the_date) & slot_bit(hour))
+
+
+def _update_day(counselor, the_date, **changes):
+    """Apply an UPDATE to a day's mask, materializing the row from the template first if needed."""
+    day = DayAvailability.objects.filter(user=counselor, date=the_date)
+    changes['updated_at'] = timezone.now()
+    if not day.update(**changes):
+        materialize_day(counselor, the_date)
+        day.update(**changes)
+
+
+def open_slots(counselor, the_date, hours, override=False):
+    """
+    Atomically open slots for a counselor on a date.
+
+    The bits are OR-ed into the stored mask in a single UPDATE, so concurrent
+    changes to other slots of the same day are never lost. Pass override=True
+    for changes made by the counselor, so template edits no longer touch the day.
+    """
+    changes = {'slots': F('slots').bitor(hours_to_mask(hours))}
+    if override:
+        changes['overridden'] = True
+    with transaction.atomic():
+        _update_day(counselor, the_date, **changes)
+        publish_availability_change(counselor, [the_date])
+
+
+def close_slots(counselor, the_date, hours, override=False):
+    """Atomically close slots for a counselor on a date."""
+    changes = {'slots': F('slots').bitand(ALL_SLOTS_MASK ^ hours_to_mask(hours))}
+    if override:
+        changes['overridden'] = True
+    with transaction.atomic():
+        _update_day(counselor, the_date, **changes)
+        publish_availability_change(counselor, [the_date])
+
+
+def claim_slot(counselor, the_date, hour):
+    """
+    Atomically test-and-close one open slot.
+
+    Runs a single conditional UPDATE that clears the bit only if it is set, so
+    when several requests race for the same slot exactly one of them gets True.
+    """
+    bit = slot_bit(hour)
+    open_day = DayAvailability.objects.alias(
+        open_bit=F('slots').bitand(bit),
+    ).filter(user=counselor, date=the_date, open_bit=bit)
+    changes = {'slots': F('slots').bitand(ALL_SLOTS_MASK ^ bit), 'updated_at': timezone.now()}
+
+    claimed = open_day.update(**changes)
+    if not claimed:
+        # The date may still be following the weekly template
+        materialize_day(counselor, the_date)
+        claimed = open_day.update(**changes)
+    if claimed:
+        publish_availability_change(counselor, [the_date])
+    return claimed == 1
+
+
+def set_slots(counselor, changes):
+    """
+    Set many slots of a counselor open or closed in one transaction.
+
+    `changes` is a list of (date, hour, available); a later change to the same
+    slot wins. Setting is idempotent, so two tabs sending the same state agree
+    instead of flipping each other. The affected day rows are materialized
+    and locked; days whose slots actually change are marked as overridden and
+    written with one bulk_update. A slot held by a pending/confirmed
+    appointment is never reopened.
+
+    Returns one dict per distinct slot with date, hour, available and, for
+    refused changes, error.
+    """
+    user_id = getattr(counselor, 'pk', counselor)
+    wanted = {}
+    for the_date, hour, available in changes:
+        slot_bit(hour)
+        wanted[(the_date, hour)] = bool(available)
+    if not wanted:
+        return []
+
+    dates = {the_date for the_date, hour in wanted}
+    with transaction.atomic():
+        materialize_days(user_id, dates)
+        # Lock the rows so concurrent claims wait and nothing is lost in the bulk_update
+        days = {
+            day.date: day
+            for day in DayAvailability.objects.select_for_update().filter(user_id=user_id, date__in=dates)
+        }
+        booked = get_booked_masks(user_id, dates)
+
+        refused = set()
+        before = {the_date: day.slots for the_date, day in days.items()}
+        for (the_date, hour), available in wanted.items():
+            bit = slot_bit(hour)
+            if available and booked.get(the_date, 0) & bit:
+                refused.add((the_date, hour))
+                continue
+            day = days[the_date]
+            day.slots = day.slots | bit if available else day.slots & (ALL_SLOTS_MASK ^ bit)
+
+        # Refused and no-op changes leave the day following the weekly template
+        changed = [day for the_date, day in days.items() if day.slots != before[the_date]]
+        if changed:
+            now = timezone.now()
+            for day in changed:
+                day.overridden = True
+                day.updated_at = now
+            DayAvailability.objects.bulk_update(changed, ['slots', 'overridden', 'updated_at'])
+            publish_availability_change(user_id, [day.date for day in changed])
+
+    results = []
+    for (the_date, hour), available in wanted.items():
+        result = {
+            'date': the_date.strftime('%Y-%m-%d'),
+            'hour': hour,
+            'available': bool(days[the_date].slots & slot_bit(hour)),
+        }
+        if (the_date, hour) in refused:
+            result['error'] = 'This slot has an active appointment.'
+        results.append(result)
+    return results
+
+
+def set_weekly_template(counselor, masks):
+    """
+    Replace a counselor's weekly template with 7 masks indexed by weekday.
+
+    Future dates already materialized only by bookings are re-derived from the
+    new template, keeping their booked slots closed. Dates the counselor
+    edited by hand keep their overrides.
+    """
+    user_id = getattr(counselor, 'pk', counselor)
+    masks = [mask & ALL_SLOTS_MASK for mask in masks]
+    today = timezone.localdate()
+    with transaction.atomic():
+        old_masks = get_weekly_masks(user_id)
+        for weekday, mask in enumerate(masks):
+            WeeklyAvailability.objects.update_or_create(
+                user_id=user_id, weekday=weekday, defaults={'slots': mask}
+            )
+
+        changed = [weekday for weekday in range(7) if old_masks[weekday] != masks[weekday]]
+        if not changed:
+            return
+        # Every date that follows the template may have changed
+        publish_availability_change(user_id)
+
+        # Lock the rows first so concurrent claims wait until they are re-derived
+        days = [
+            day for day in DayAvailability.objects.select_for_update().filter(
+                user_id=user_id, date__gte=today, overridden=False
+            )
+            if day.date.weekday() in changed
+        ]
+        if not days:
+            return
+
+        booked = get_booked_masks(user_id, [day.date for day in days])
+        now = timezone.now()
+        for day in days:
+            day.slots = masks[day.date.weekday()] & ~booked.get(day.date, 0)
+            day.updated_at = now
+        DayAvailability.objects.bulk_update(days, ['slots', 'updated_at'])
+
+
+def release_timeslot(timeslot):
+    """Reopen the slot of a booked Timeslot, e.g. after its appointment is cancelled or moved."""
+    open_slots(timeslot.user_id, timeslot.date, [timeslot.start_time.hour])
+
+
+def get_day_slots(counselor, the_date):
+    """
+    Return the fixed daily schedule of a counselor for one date.
+
+    The day's mask is read in a single query and unpacked in memory, so viewing
+    a day never writes to the database. Each slot is a dict with hour, label
+    and available.
+    """
+    mask = get_day_mask(counselor, the_date)
+    return [
+        {'hour': hour, 'label': label, 'available': bool(mask & (1 << index))}
+        for index, (hour, label) in enumerate(TIME_SLOTS)
+    ]
+
+
+def get_calendar_slots(counselor, start_date, days):
+    """
+    Return a counselor's slot availability for `days` consecutive dates.
+
+    One range query reads the materialized day masks and one more the weekly
+    template for the remaining dates. Booking clears a slot's bit, so the masks
+    already exclude slots held by pending/confirmed appointments.
+    Each day is a dict with date, available_count and slots.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    masks = dict(
+        DayAvailability.objects.filter(
+            user=counselor,
+            date__range=(start_date, end_date),
+        ).order_by().values_list('date', 'slots')
+    )
+    weekly_masks = get_weekly_masks(counselor)
+
+    calendar = []
+    for offset in range(days):
+        the_date = start_date + timedelta(days=offset)
+        mask = masks.get(the_date, weekly_masks[the_date.weekday()])
+        slots = [
+            {'hour': hour, 'label': label, 'available': bool(mask & (1 << index))}
+            for index, (hour, label) in enumerate(TIME_SLOTS)
+        ]
+        calendar.append({
+            'date': the_date.strftime('%Y-%m-%d'),
+            'available_count': bin(mask).count('1'),
+            'slots': slots,
+        })
+    return calendar
+
+
+def get_counselor_profile(user):
+    """Return the user's CounselorProfile, or an unsaved blank one if they have none yet."""
+    try:
+        return user.counselor_profile
+    except CounselorProfile.DoesNotExist:
+        return CounselorProfile(user=user)
+
+
+# Seconds a college's counselor list stays cached; edits invalidate it sooner
+DIRECTORY_CACHE_SECONDS = 300
+
+
+def _directory_cache_key(college_key):
+    # College names contain spaces, which some cache backends reject in keys
+    return 'counselor_directory:' + hashlib.md5(college_key.encode()).hexdigest()
+
+
+def get_counselor_directory(college=None):
+    """
+    Return the active counselors students can book, as dicts with id, username,
+    name, title, assigned_college and has_profile.
+
+    With a college, only counselors of that college are listed (matched on the
+    normalized college_key in SQL); without one, every counselor with an
+    assigned college is. Each list is cached per college.
+    """
+    college_key = normalize_college(college)
+    cache_key = _directory_cache_key(college_key)
+    directory = cache.get(cache_key)
+    if directory is not None:
+        return directory
+
+    counselors = User.objects.filter(is_staff=True, is_active=True).select_related('counselor_profile')
+    if college_key:
+        counselors = counselors.filter(counselor_profile__college_key=college_key)
+    else:
+        counselors = counselors.filter(counselor_profile__college_key__gt='')
+
+    directory = [
+        {
+            'id': counselor.id,
+            'username': counselor.username,
+            'name': counselor.counselor_profile.full_name,
+            'title': counselor.counselor_profile.title,
+            'assigned_college': counselor.counselor_profile.assigned_college,
+            'has_profile': bool(counselor.counselor_profile.title or counselor.counselor_profile.bio),
+        }
+        for counselor in counselors.order_by('last_name', 'first_name')
+    ]
+    cache.set(cache_key, directory, DIRECTORY_CACHE_SECONDS)
+    return directory
+
+
+def invalidate_counselor_directory(*colleges):
+    """Drop the cached counselor lists of the given colleges and the all-colleges list."""
+    keys = {_directory_cache_key('')}
+    keys.update(_directory_cache_key(normalize_college(college)) for college in colleges if college)
+    cache.delete_many(list(keys))
+
+
+# Counselor search: results per page, and how many words of a query are used
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_TERMS = 5
+
+
+def search_counselors(query, college=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Find active counselors whose name, title, college or bio contain every
+    word of `query`, best matches first.
+
+    Words are matched against CounselorProfile.search_document, which has a
+    trigram index on PostgreSQL. Each word scores by where it matched: start
+    of a name 8, inside a name 4, title 3, college 2, bio 1. With a college,
+    only that college's counselors are searched. Returns (results, has_more);
+    results are dicts like get_counselor_directory() plus rank.
+    """
+    terms = query.lower().split()[:SEARCH_MAX_TERMS]
+    if not terms:
+        return [], False
+
+    profiles = CounselorProfile.objects.filter(user__is_staff=True, user__is_active=True).select_related('user')
+    college_key = normalize_college(college)
+    if college_key:
+        profiles = profiles.filter(college_key=college_key)
+    else:
+        profiles = profiles.filter(college_key__gt='')
+    for term in terms:
+        profiles = profiles.filter(search_document__contains=term)
+
+    rank = Value(0)
+    for term in terms:
+        rank = rank + Case(
+            When(Q(user__first_name__istartswith=term) | Q(user__last_name__istartswith=term), then=Value(8)),
+            When(Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term), then=Value(4)),
+            When(title__icontains=term, then=Value(3)),
+            When(assigned_college__icontains=term, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    profiles = profiles.annotate(rank=rank).order_by('-rank', 'user__last_name', 'user__first_name', 'id')
+
+    # Fetch one extra row to tell whether another page follows, instead of counting
+    offset = (max(1, page) - 1) * page_size
+    matches = list(profiles[offset:offset + page_size + 1])
+    results = [
+        {
+            'id': profile.user_id,
+            'username': profile.user.username,
+            'name': profile.full_name,
+            'title': profile.title,
+            'assigned_college': profile.assigned_college,
+            'has_profile': bool(profile.title or profile.bio),
+            'rank': profile.rank,
+        }
+        for profile in matches[:page_size]
+    ]
+    return results, len(matches) > page_size
@@ -2,14 +2,25 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from datetime import date, time, datetime, timedelta
 from django.utils import timezone
+import json
+import uuid
 
-from .models import Timeslot, Notification
+from .models import Timeslot, Notification, WeeklyAvailability, CounselorProfile
+from .utils import (
+    TIME_SLOTS, SLOT_HOURS, get_day_slots, mask_to_hours, hours_to_mask,
+    get_weekly_masks, get_calendar_slots, set_weekly_template, set_slots,
+    claim_slot, release_timeslot,
+    get_counselor_profile, invalidate_counselor_directory,
+)
+from .avatars import save_profile_image, serve_profile_image, validate_profile_image, InvalidImageError
 from public.models import Appointment
+from public.utils import idempotent, reschedule_day
 
 @login_required
 def dashboard(request):
@@ -47,6 +58,8 @@ def dashboard(request):
         'past_appointments': past_appointments,
         'today_appointments': today_appointments,
         'today': today,
+        # Per-render token for the idempotency_key of the action forms
+        'form_token': uuid.uuid4().hex,
     }
     return render(request, 'sysadmin/dashboard.html', context)
 
@@ -84,6 +97,10 @@ def login_view(request):
     return render(request, 'sysadmin/login.html', {'form': None})
 
 
+# Lengths (in days) offered for the availability summary; the first is the default
+SUMMARY_WINDOWS = (7, 14, 28)
+
+
 @login_required
 def availability(request):
     # Accept a date parameter (YYYY-MM-DD) or default to today
@@ -96,75 +113,189 @@ def availability(request):
     except Exception:
         the_date = date.today()
 
-    # Define only the 8 specific timeslots
-    time_slots = [
-        (8, '8:00 AM - 9:00 AM'),
-        (9, '9:00 AM - 10:00 AM'),
-        (10, '10:00 AM - 11:00 AM'),
-        (11, '11:00 AM - 12:00 PM'),
-        (13, '1:00 PM - 2:00 PM'),
-        (14, '2:00 PM - 3:00 PM'),
-        (15, '3:00 PM - 4:00 PM'),
-        (16, '4:00 PM - 5:00 PM'),
-    ]
-    
-    slots = []
     user = request.user
 
-    for hour, label in time_slots:
-        slot_time = time(hour=hour, minute=0)
-        ts, created = Timeslot.objects.get_or_create(
-            user=user, 
-            date=the_date, 
-            start_time=slot_time, 
-            defaults={'available': False}
-        )
-        slots.append({
-            'id': ts.id,
-            'hour': hour,
-            'label': label,
-            'available': ts.available,
-        })
+    # Read existing timeslots in one query; missing hours are not available
+    slots = get_day_slots(user, the_date)
+
+    # Availability summary for the next 7, 14 or 28 days; the whole window is
+    # read with one range query plus the weekly template, whatever its length
+    try:
+        summary_days = int(request.GET.get('window', SUMMARY_WINDOWS[0]))
+    except ValueError:
+        summary_days = SUMMARY_WINDOWS[0]
+    if summary_days not in SUMMARY_WINDOWS:
+        summary_days = SUMMARY_WINDOWS[0]
 
-    # Get availability summary for next 7 days
-    from datetime import timedelta
     summary_dates = []
-    for i in range(7):
-        summary_date = the_date + timedelta(days=i)
-        date_slots = Timeslot.objects.filter(user=user, date=summary_date)
-        available_count = date_slots.filter(available=True).count()
+    for day in get_calendar_slots(user, the_date, summary_days):
         summary_dates.append({
-            'date': summary_date,
-            'date_str': summary_date.strftime('%Y-%m-%d'),
-            'available_count': available_count,
-            'total_slots': 8,
+            'date': datetime.strptime(day['date'], '%Y-%m-%d').date(),
+            'date_str': day['date'],
+            'available_count': day['available_count'],
+            'total_slots': len(TIME_SLOTS),
+        })
+
+    # Weekly template grid: one row per weekday with the 8 slots
+    weekly_masks = get_weekly_masks(user)
+    weekly = []
+    for weekday, name in WeeklyAvailability.WEEKDAYS:
+        weekly.append({
+            'weekday': weekday,
+            'name': name,
+            'slots': [
+                {'hour': hour, 'label': label, 'available': hour in mask_to_hours(weekly_masks[weekday])}
+                for hour, label in TIME_SLOTS
+            ],
         })
 
     context = {
         'slots': slots,
         'date': the_date,
         'date_str': the_date.strftime('%Y-%m-%d'),
+        'colleagues': _get_college_colleagues(user),
         'summary_dates': summary_dates,
+        'summary_days': summary_days,
+        'summary_windows': SUMMARY_WINDOWS,
+        'weekly': weekly,
     }
     return render(request, 'sysadmin/availability.html', context)
 
 
+def _get_college_colleagues(user):
+    """Other active counselors with the same assigned_college as the user, as (id, name) pairs."""
+    college_key = get_counselor_profile(user).college_key
+    if not college_key:
+        return []
+
+    colleagues = User.objects.filter(
+        is_staff=True,
+        is_active=True,
+        counselor_profile__college_key=college_key,
+    ).exclude(id=user.id).order_by('last_name', 'first_name').values_list('id', 'first_name', 'last_name')
+    return [(user_id, f"{first_name} {last_name}".strip()) for user_id, first_name, last_name in colleagues]
+
+
+@login_required
+@require_POST
+@idempotent
+def reschedule_day_appointments(request):
+    """Move all of the counselor's active appointments on a date, e.g. when out sick"""
+    try:
+        the_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Please select a valid date.'})
+    if the_date < timezone.localdate():
+        return JsonResponse({'success': False, 'error': 'Past dates cannot be rescheduled.'})
+
+    target = None
+    target_id = request.POST.get('target_counselor_id')
+    if target_id:
+        colleague_ids = {colleague_id for colleague_id, name in _get_college_colleagues(request.user)}
+        try:
+            target_id = int(target_id)
+        except ValueError:
+            target_id = None
+        if target_id not in colleague_ids:
+            return JsonResponse({'success': False, 'error': 'Appointments can only move to a counselor in your college.'})
+        target = User.objects.get(id=target_id)
+
+    try:
+        outcomes = reschedule_day(request.user, the_date, target)
+    except Exception as e:
+        print(f"Error rescheduling day {the_date}: {str(e)}")
+        return JsonResponse({'success': False, 'error': f'Error rescheduling appointments: {str(e)}'})
+
+    moved = sum(1 for outcome in outcomes if outcome['moved'])
+    print(f"✅ Rescheduled {moved}/{len(outcomes)} appointment(s) of {request.user.username} on {the_date}")
+    return JsonResponse({
+        'success': True,
+        'moved': moved,
+        'unmoved': len(outcomes) - moved,
+        'outcomes': outcomes,
+    })
+
+
+@login_required
+@require_POST
+def weekly_availability(request):
+    # Checkboxes are named slot_<weekday>_<hour>; unchecked boxes are not posted
+    masks = []
+    for weekday, name in WeeklyAvailability.WEEKDAYS:
+        hours = [hour for hour in SLOT_HOURS if request.POST.get(f'slot_{weekday}_{hour}')]
+        masks.append(hours_to_mask(hours))
+
+    set_weekly_template(request.user, masks)
+    messages.success(request, 'Weekly availability saved.')
+
+    # Go back to the date the counselor was looking at
+    try:
+        the_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return redirect('sysadmin:availability')
+    return redirect(f"{reverse('sysadmin:availability')}?date={the_date.strftime('%Y-%m-%d')}")
+
+
 @login_required
 @require_POST
 def toggle_availability(request):
-    # Expect JSON or form with date and hour
-    slot_id = request.POST.get('slot_id') or request.POST.get('id')
-    if not slot_id:
-        return HttpResponseBadRequest('Missing slot id')
+    # Expect form with date, hour and available of the slot
+    date_str = request.POST.get('date')
+    hour = request.POST.get('hour')
+    if not date_str or not hour:
+        return HttpResponseBadRequest('Missing date or hour')
 
     try:
-        ts = Timeslot.objects.get(id=int(slot_id), user=request.user)
-    except Timeslot.DoesNotExist:
+        the_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        hour = int(hour)
+    except ValueError:
         return HttpResponseBadRequest('Invalid slot')
 
-    ts.available = not ts.available
-    ts.save()
-    return JsonResponse({'id': ts.id, 'available': ts.available})
+    if hour not in SLOT_HOURS:
+        return HttpResponseBadRequest('Invalid slot')
+
+    # The slot is set to `available` rather than flipped, so repeating the request is harmless
+    # and a slot held by an appointment is never reopened
+    available = request.POST.get('available')
+    if available is None:
+        return HttpResponseBadRequest('Missing available')
+
+    result = set_slots(request.user, [(the_date, hour, available.lower() in ('1', 'true', 'on'))])[0]
+    return JsonResponse(result, status=409 if 'error' in result else 200)
+
+
+# Largest number of slot changes accepted by one bulk request
+MAX_BULK_CHANGES = 500
+
+
+@login_required
+@require_POST
+def bulk_availability(request):
+    # Expect JSON: {"changes": [{"date": "YYYY-MM-DD", "hour": 9, "available": true}, ...]}
+    try:
+        payload = json.loads(request.body)
+        raw_changes = payload['changes']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Expected a JSON body with a list of changes')
+
+    if not isinstance(raw_changes, list) or not raw_changes:
+        return HttpResponseBadRequest('Expected a JSON body with a list of changes')
+    if len(raw_changes) > MAX_BULK_CHANGES:
+        return HttpResponseBadRequest(f'At most {MAX_BULK_CHANGES} changes per request')
+
+    changes = []
+    try:
+        for change in raw_changes:
+            the_date = datetime.strptime(change['date'], '%Y-%m-%d').date()
+            hour = int(change['hour'])
+            if hour not in SLOT_HOURS or not isinstance(change['available'], bool):
+                raise ValueError
+            changes.append((the_date, hour, change['available']))
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Invalid slot change')
+
+    results = set_slots(request.user, changes)
+    return JsonResponse({'results': results})
 
 
 def signup(request):
@@ -220,12 +351,12 @@ def signup(request):
             context['error'] = 'An account with this email already exists.'
             return render(request, 'sysadmin/signup.html', context)
 
-        # Validate profile picture size (2 MB limit)
+        # Validate profile picture (size, type and dimensions) before reading it
         if profile_picture:
-            max_size = 2 * 1024 * 1024  # 2 MB in bytes
-            if profile_picture.size > max_size:
-                size_mb = profile_picture.size / (1024 * 1024)
-                context['error'] = f'Profile picture is too large ({size_mb:.2f} MB). Maximum allowed size is 2 MB.'
+            try:
+                validate_profile_image(profile_picture)
+            except InvalidImageError as e:
+                context['error'] = str(e)
                 return render(request, 'sysadmin/signup.html', context)
 
         try:
@@ -235,21 +366,20 @@ def signup(request):
             user.first_name = first_name
             user.last_name = last_name
             
-            # Process profile picture if uploaded
-            image_binary = None
-            if profile_picture:
-                image_binary = profile_picture.read()
+            user.save()
             
-            # Set the new counselor fields using raw SQL since they're not in the model
-            from django.db import connection
-            from psycopg2 import Binary
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "UPDATE auth_user SET middle_initial = %s, assigned_college = %s, title = %s, bio = %s, image_data = %s WHERE id = %s",
-                    [middle_initial, assigned_college, title, bio, Binary(image_binary) if image_binary else None, user.id]
-                )
+            CounselorProfile.objects.create(
+                user=user,
+                middle_initial=middle_initial,
+                assigned_college=assigned_college,
+                title=title,
+                bio=bio,
+            )
+            invalidate_counselor_directory(assigned_college)
             
-            user.save()
+            # Process profile picture if uploaded
+            if profile_picture:
+                save_profile_image(user, profile_picture)
 
             authenticated_user = authenticate(request, username=email, password=password)
             if authenticated_user is not None:
@@ -293,10 +423,11 @@ def mark_notification_read(request, notification_id):
 
 @login_required
 @require_POST
+@idempotent
 def confirm_appointment(request, appointment_id):
     """Confirm a pending appointment"""
     from django.db import transaction
-    from public.utils import send_appointment_confirmation_email, create_counselor_notification
+    from public.utils import queue_appointment_email, create_counselor_notification, create_student_notification
     
     try:
         # Use transaction with select_for_update to prevent race conditions
@@ -317,31 +448,17 @@ def confirm_appointment(request, appointment_id):
             appointment.status = 'confirmed'
             appointment.save(update_fields=['status', 'updated_at'])
             print(f"✅ Appointment {appointment_id} status updated to 'confirmed'")
+
+            # Queued in the same transaction; send_outbox_emails delivers it
+            queue_appointment_email(appointment.student, appointment)
         
         # Refresh from database to ensure we have the latest data
         appointment.refresh_from_db()
         print(f"✅ Appointment {appointment_id} verified: Status={appointment.status}")
         
-        # Send email to student (non-blocking - don't fail if this fails)
-        email_sent = False
-        try:
-            email_sent = send_appointment_confirmation_email(appointment.student, appointment)
-            if email_sent:
-                print(f"✅ Confirmation email sent to {appointment.student.email}")
-            else:
-                print(f"⚠️ Email sending returned False for {appointment.student.email}")
-        except Exception as email_error:
-            # Log email error but don't fail the confirmation
-            import logging
-            import traceback
-            logger = logging.getLogger(__name__)
-            error_trace = traceback.format_exc()
-            logger.error(f"Failed to send confirmation email: {str(email_error)}")
-            print(f"⚠️ Email error (non-fatal): {str(email_error)}")
-            print(f"Traceback: {error_trace}")
-        
-        # Create notification for counselor (non-blocking)
+        # Create notifications for counselor and student (non-blocking)
         try:
+            create_student_notification(appointment, 'appointment_confirmed')
             notification = create_counselor_notification(appointment.counselor, appointment, 'appointment_confirmed')
             if notification:
                 print(f"✅ Notification created for counselor")
@@ -379,23 +496,27 @@ def confirm_appointment(request, appointment_id):
 
 @login_required
 @require_POST
+@idempotent
 def cancel_appointment(request, appointment_id):
     """Cancel an appointment"""
     try:
         appointment = get_object_or_404(Appointment, id=appointment_id, counselor=request.user)
         
         if appointment.status in ['pending', 'confirmed']:
-            # Mark timeslot as available again
-            appointment.timeslot.available = True
-            appointment.timeslot.save()
+            from django.db import transaction
+            with transaction.atomic():
+                # Cancel appointment
+                appointment.status = 'cancelled'
+                appointment.save()
+                
+                # Mark timeslot as available again
+                if appointment.timeslot:
+                    release_timeslot(appointment.timeslot)
             
-            # Cancel appointment
-            appointment.status = 'cancelled'
-            appointment.save()
-            
-            # Create notification for student
-            from public.utils import create_counselor_notification
+            # Create notifications for counselor and student
+            from public.utils import create_counselor_notification, create_student_notification
             create_counselor_notification(appointment.counselor, appointment, 'appointment_cancelled')
+            create_student_notification(appointment, 'appointment_cancelled')
             
             messages.success(request, 'Appointment cancelled successfully!')
         else:
@@ -409,6 +530,7 @@ def cancel_appointment(request, appointment_id):
 
 @login_required
 @require_POST
+@idempotent
 def complete_appointment(request, appointment_id):
     """Mark an appointment as completed"""
     try:
@@ -418,6 +540,9 @@ def complete_appointment(request, appointment_id):
             appointment.status = 'completed'
             appointment.save()
             
+            from public.utils import create_student_notification
+            create_student_notification(appointment, 'appointment_completed')
+            
             messages.success(request, 'Appointment marked as completed!')
         else:
             messages.error(request, 'This appointment cannot be marked as completed.')
@@ -441,43 +566,17 @@ def get_available_slots_for_date(request):
     except ValueError:
         return JsonResponse({'error': 'Invalid date format'}, status=400)
     
-    # Define time slots
-    time_slots = [
-        (8, '8:00 AM - 9:00 AM'),
-        (9, '9:00 AM - 10:00 AM'),
-        (10, '10:00 AM - 11:00 AM'),
-        (11, '11:00 AM - 12:00 PM'),
-        (13, '1:00 PM - 2:00 PM'),
-        (14, '2:00 PM - 3:00 PM'),
-        (15, '3:00 PM - 4:00 PM'),
-        (16, '4:00 PM - 5:00 PM'),
+    available_slots = [
+        {'hour': slot['hour'], 'label': slot['label']}
+        for slot in get_day_slots(request.user, selected_date)
+        if slot['available']
     ]
     
-    available_slots = []
-    for hour, label in time_slots:
-        slot_time = time(hour=hour, minute=0)
-        try:
-            ts = Timeslot.objects.get(
-                user=request.user,
-                date=selected_date,
-                start_time=slot_time
-            )
-            if ts.available:
-                available_slots.append({
-                    'hour': hour,
-                    'label': label
-                })
-        except Timeslot.DoesNotExist:
-            # If slot doesn't exist, it's available
-            available_slots.append({
-                'hour': hour,
-                'label': label
-            })
-    
     return JsonResponse({'slots': available_slots})
 
 
 @login_required
+@idempotent
 def reschedule_appointment(request, appointment_id):
     """Display reschedule form for an appointment"""
     appointment = get_object_or_404(Appointment, id=appointment_id, counselor=request.user)
@@ -491,38 +590,38 @@ def reschedule_appointment(request, appointment_id):
             if not new_date or not new_time_hour:
                 return JsonResponse({'success': False, 'error': 'Please select both date and time.'})
             
-            # Convert hour to time
+            # Convert hour and date
             hour = int(new_time_hour)
-            new_start_time = time(hour, 0)
-            
-            # Check if the new timeslot is available
-            new_timeslot, created = Timeslot.objects.get_or_create(
-                user=request.user,
-                date=new_date,
-                start_time=new_start_time,
-                defaults={'available': True}
-            )
-            
-            if not new_timeslot.available:
+            new_date = datetime.strptime(new_date, '%Y-%m-%d').date()
+            if hour not in SLOT_HOURS:
                 return JsonResponse({'success': False, 'error': 'This time slot is not available.'})
             
-            # Free up the old timeslot
-            old_timeslot = appointment.timeslot
-            old_timeslot.available = True
-            old_timeslot.save()
-            
-            # Update appointment with new timeslot
-            appointment.timeslot = new_timeslot
-            appointment.status = 'pending'  # Reset to pending for confirmation
-            appointment.save()
-            
-            # Mark new timeslot as unavailable
-            new_timeslot.available = False
-            new_timeslot.save()
+            from django.db import transaction
+            with transaction.atomic():
+                # Claim the new slot; fails if it is closed or already taken
+                if not claim_slot(request.user, new_date, hour):
+                    return JsonResponse({'success': False, 'error': 'This time slot is not available.'})
+                
+                new_timeslot, created = Timeslot.objects.get_or_create(
+                    user=request.user,
+                    date=new_date,
+                    start_time=time(hour, 0),
+                )
+                
+                # Update appointment with new timeslot
+                old_timeslot = appointment.timeslot
+                appointment.timeslot = new_timeslot
+                appointment.status = 'pending'  # Reset to pending for confirmation
+                appointment.save()
+                
+                # Free up the old timeslot
+                if old_timeslot:
+                    release_timeslot(old_timeslot)
             
-            # Create notification for student
-            from public.utils import create_counselor_notification
+            # Create notifications for counselor and student
+            from public.utils import create_counselor_notification, create_student_notification
             create_counselor_notification(appointment.counselor, appointment, 'appointment_rescheduled')
+            create_student_notification(appointment, 'appointment_rescheduled')
             
             return JsonResponse({'success': True, 'message': 'Appointment rescheduled successfully!'})
             
@@ -537,22 +636,10 @@ def reschedule_appointment(request, appointment_id):
         date = today + timedelta(days=i)
         available_dates.append(date)
     
-    # Define time slots
-    time_slots = [
-        (8, '8:00 AM - 9:00 AM'),
-        (9, '9:00 AM - 10:00 AM'),
-        (10, '10:00 AM - 11:00 AM'),
-        (11, '11:00 AM - 12:00 PM'),
-        (13, '1:00 PM - 2:00 PM'),
-        (14, '2:00 PM - 3:00 PM'),
-        (15, '3:00 PM - 4:00 PM'),
-        (16, '4:00 PM - 5:00 PM'),
-    ]
-    
     context = {
         'appointment': appointment,
         'available_dates': available_dates,
-        'time_slots': time_slots,
+        'time_slots': TIME_SLOTS,
     }
     return render(request, 'sysadmin/reschedule_modal.html', context)
 
@@ -626,13 +713,15 @@ def analytics(request):
         monthly_data.append(count)
         monthly_labels.append(month_start.strftime('%b %Y'))
     
-    # Capacity Utilization - THIS COUNSELOR ONLY
-    total_timeslots = Timeslot.objects.filter(user=request.user, date__gte=today).count()
-    available_timeslots = Timeslot.objects.filter(user=request.user, date__gte=today, available=True).count()
+    # Capacity Utilization - THIS COUNSELOR ONLY, over the next 4 weeks
+    # (weekly templates repeat forever, so an open-ended window has no total)
+    capacity_days = get_calendar_slots(request.user, today, 28)
+    available_timeslots = sum(day['available_count'] for day in capacity_days)
     booked_timeslots = all_appointments.filter(
-        timeslot__date__gte=today,
+        timeslot__date__range=(today, today + timedelta(days=27)),
         status__in=['pending', 'confirmed']
     ).count()
+    total_timeslots = available_timeslots + booked_timeslots
     utilization_rate = (booked_timeslots / total_timeslots * 100) if total_timeslots > 0 else 0
     
     # Recent activity (last 30 days)
@@ -926,48 +1015,21 @@ def export_report_pdf(request):
         return redirect('sysadmin:reports')
 
 
-def profile_picture(request, user_id):
-    """Serve profile picture from database"""
-    from django.db import connection
-    from django.http import HttpResponse, HttpResponseNotFound
-    
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT image_data FROM auth_user WHERE id = %s", [user_id])
-        row = cursor.fetchone()
-        
-        if row and row[0]:
-            image_data = bytes(row[0])
-            # Try to determine content type from image data
-            content_type = 'image/jpeg'  # default
-            if image_data.startswith(b'\x89PNG'):
-                content_type = 'image/png'
-            elif image_data.startswith(b'GIF'):
-                content_type = 'image/gif'
-            elif image_data.startswith(b'\xff\xd8\xff'):
-                content_type = 'image/jpeg'
-            
-            response = HttpResponse(image_data, content_type=content_type)
-            response['Cache-Control'] = 'public, max-age=86400'  # Cache for 1 day
-            return response
-    
-    # Return a default placeholder image or 404
-    return HttpResponseNotFound('No profile picture found')
+def profile_picture(request, user_id, version=None):
+    """Serve profile picture from database; ?size=small|medium|original picks a resized variant.
+
+    The versioned URL (with the picture's hash) is cached by browsers for good;
+    both answer conditional requests with 304 without reading the image.
+    """
+    return serve_profile_image(request, user_id, version)
 
 
 @login_required
 def profile(request):
     """Manage counselor profile"""
-    from django.db import connection
-    
     # Get current counselor information
     user = request.user
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT middle_initial, assigned_college, title, bio FROM auth_user WHERE id = %s", [user.id])
-        row = cursor.fetchone()
-        middle_initial = row[0] if row and row[0] else ''
-        assigned_college = row[1] if row and row[1] else ''
-        title = row[2] if row and row[2] else ''
-        bio = row[3] if row and row[3] else ''
+    counselor_profile = get_counselor_profile(user)
     
     if request.method == 'POST':
         # Get form data
@@ -978,6 +1040,7 @@ def profile(request):
         assigned_college_new = request.POST.get('assigned_college', '').strip()
         title_new = request.POST.get('title', '').strip()
         bio_new = request.POST.get('bio', '').strip()
+        email_digest_new = request.POST.get('email_digest', counselor_profile.email_digest)
         profile_picture = request.FILES.get('profile_picture')
         current_password = request.POST.get('current_password', '').strip()
         new_password = request.POST.get('new_password', '').strip()
@@ -991,6 +1054,8 @@ def profile(request):
             'assigned_college': assigned_college_new,
             'title': title_new,
             'bio': bio_new,
+            'email_digest': email_digest_new,
+            'email_digest_choices': CounselorProfile.EMAIL_DIGEST_CHOICES,
         }
         
         # Validation
@@ -1002,17 +1067,21 @@ def profile(request):
             context['error'] = 'Please select an assigned college.'
             return render(request, 'sysadmin/profile.html', context)
         
+        if email_digest_new not in dict(CounselorProfile.EMAIL_DIGEST_CHOICES):
+            context['error'] = 'Please select a valid notification summary option.'
+            return render(request, 'sysadmin/profile.html', context)
+        
         # Check if email is taken by another user
         if User.objects.filter(email=email).exclude(id=user.id).exists():
             context['error'] = 'This email is already taken by another user.'
             return render(request, 'sysadmin/profile.html', context)
         
-        # Validate profile picture size (2 MB limit)
+        # Validate profile picture (size, type and dimensions) before reading it
         if profile_picture:
-            max_size = 2 * 1024 * 1024  # 2 MB in bytes
-            if profile_picture.size > max_size:
-                size_mb = profile_picture.size / (1024 * 1024)
-                context['error'] = f'Profile picture is too large ({size_mb:.2f} MB). Maximum allowed size is 2 MB.'
+            try:
+                validate_profile_image(profile_picture)
+            except InvalidImageError as e:
+                context['error'] = str(e)
                 return render(request, 'sysadmin/profile.html', context)
         
         # Handle password change
@@ -1046,24 +1115,23 @@ def profile(request):
             
             user.save()
             
+            # Update counselor-specific fields
+            previous_college = counselor_profile.assigned_college
+            counselor_profile.middle_initial = middle_initial_new
+            counselor_profile.assigned_college = assigned_college_new
+            counselor_profile.title = title_new
+            counselor_profile.bio = bio_new
+            if email_digest_new != counselor_profile.email_digest:
+                # The first digest after opting in covers only notifications from then on
+                if counselor_profile.email_digest == 'off':
+                    counselor_profile.digest_sent_at = timezone.now()
+                counselor_profile.email_digest = email_digest_new
+            counselor_profile.save()
+            invalidate_counselor_directory(previous_college, assigned_college_new)
+            
             # Process profile picture if uploaded
-            image_binary = None
             if profile_picture:
-                image_binary = profile_picture.read()
-            
-            # Update counselor-specific fields using raw SQL
-            from psycopg2 import Binary
-            with connection.cursor() as cursor:
-                if profile_picture:
-                    cursor.execute(
-                        "UPDATE auth_user SET middle_initial = %s, assigned_college = %s, title = %s, bio = %s, image_data = %s WHERE id = %s",
-                        [middle_initial_new, assigned_college_new, title_new, bio_new, Binary(image_binary), user.id]
-                    )
-                else:
-                    cursor.execute(
-                        "UPDATE auth_user SET middle_initial = %s, assigned_college = %s, title = %s, bio = %s WHERE id = %s",
-                        [middle_initial_new, assigned_college_new, title_new, bio_new, user.id]
-                    )
+                save_profile_image(user, profile_picture)
             
             messages.success(request, 'Profile updated successfully!')
             
@@ -1084,9 +1152,11 @@ def profile(request):
         'email': user.email,
         'first_name': user.first_name,
         'last_name': user.last_name,
-        'middle_initial': middle_initial,
-        'assigned_college': assigned_college,
-        'title': title,
-        'bio': bio,
+        'middle_initial': counselor_profile.middle_initial,
+        'assigned_college': counselor_profile.assigned_college,
+        'title': counselor_profile.title,
+        'bio': counselor_profile.bio,
+        'email_digest': counselor_profile.email_digest,
+        'email_digest_choices': CounselorProfile.EMAIL_DIGEST_CHOICES,
     }
     return render(request, 'sysadmin/profile.html', context)
\ No newline at end of file
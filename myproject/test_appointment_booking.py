@@ -12,9 +12,9 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from public.models import Appointment, UserProfile
-from sysadmin.models import Timeslot
-from django.db import transaction
-from datetime import date, time
+from public.utils import book_timeslot, BookingError
+from sysadmin.utils import open_slots, is_slot_open
+from datetime import date
 
 User = get_user_model()
 
@@ -52,39 +52,17 @@ except UserProfile.DoesNotExist:
     program = 'Not Specified'
     print(f"⚠️ No profile found, using default program: {program}")
 
-# Create test timeslot
+# Open test timeslot
 test_date = date.today()
-test_time = time(14, 0)  # 2:00 PM
+test_hour = 14  # 2:00 PM
 
-print(f"\n📅 Creating test timeslot: {test_date} at {test_time}")
+print(f"\n📅 Opening test timeslot: {test_date} at {test_hour}:00")
 
 try:
-    timeslot, created = Timeslot.objects.get_or_create(
-        user=counselor,
-        date=test_date,
-        start_time=test_time,
-        defaults={'available': True}
-    )
-    print(f"✅ Timeslot {'created' if created else 'retrieved'}: ID={timeslot.id}, Available={timeslot.available}")
-    
-    # Reset availability if needed
-    timeslot_taken = Appointment.objects.filter(
-        timeslot=timeslot,
-        status__in=['pending', 'confirmed']
-    ).exists()
-    
-    if not timeslot_taken and not timeslot.available:
-        print(f"ℹ️ Resetting timeslot availability")
-        timeslot.available = True
-        timeslot.save()
-    
-    if not timeslot.available:
-        print(f"⚠️ Timeslot is not available, but continuing test...")
-        timeslot.available = True
-        timeslot.save()
-        
+    open_slots(counselor, test_date, [test_hour])
+    print(f"✅ Timeslot open: {is_slot_open(counselor, test_date, test_hour)}")
 except Exception as e:
-    print(f"❌ Error creating timeslot: {e}")
+    print(f"❌ Error opening timeslot: {e}")
     import traceback
     traceback.print_exc()
     exit(1)
@@ -95,26 +73,18 @@ appointment = None
 appointment_id = None
 
 try:
-    with transaction.atomic():
-        # Create appointment
-        appointment = Appointment.objects.create(
-            student=student,
-            counselor=counselor,
-            timeslot=timeslot,
-            program=program,
-            status='pending'
-        )
-        appointment_id = appointment.id
-        print(f"✅ Appointment CREATED in transaction: ID={appointment_id}")
-        print(f"   Student: {appointment.student.username}")
-        print(f"   Counselor: {appointment.counselor.username}")
-        print(f"   Status: {appointment.status}")
-        print(f"   Timeslot: {appointment.timeslot.id if appointment.timeslot else 'None'}")
-        
-        # Mark timeslot as unavailable
-        timeslot.available = False
-        timeslot.save(update_fields=['available'])
-        print(f"✅ Timeslot {timeslot.id} marked as unavailable")
+    try:
+        appointment = book_timeslot(student, counselor.id, test_date, test_hour, program)
+    except BookingError as e:
+        print(f"⚠️ Slot could not be booked ({e}), is there already an appointment on it?")
+        exit(1)
+    appointment_id = appointment.id
+    print(f"✅ Appointment CREATED: ID={appointment_id}")
+    print(f"   Student: {appointment.student.username}")
+    print(f"   Counselor: {appointment.counselor.username}")
+    print(f"   Status: {appointment.status}")
+    print(f"   Timeslot: {appointment.timeslot.id if appointment.timeslot else 'None'}")
+    print(f"✅ Timeslot closed after booking: {not is_slot_open(counselor, test_date, test_hour)}")
     
     # Verify after transaction commit
     print(f"\n🔍 Verifying appointment after transaction commit...")